@@ -0,0 +1,270 @@
+"""
+Shallow Seas benchmark suite
+
+Times map generation, field of view, fog, a full game turn, rendering, and save / load across a range of board sizes
+and entity counts, and writes the results as JSON so runs can be compared between commits.
+
+usage (from the repository root):
+
+python3 bench/run_bench.py
+python3 bench/run_bench.py --sizes 64 128 --entities 16 100 --budget 1 --output quick.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# rendering benchmarks draw to an in-memory display, so no window (or audio device) is needed
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(os.path.dirname(BENCH_DIR), 'src')
+sys.path.insert(0, SRC_DIR)
+
+import numpy as np
+import pygame
+
+from game_messages import MessageLog
+from game_states import GameStates
+from game_time import Time
+from loader_functions.initialize_new_game import get_constants, make_player
+from loader_functions.binary_loaders import load_game, save_game
+from loader_functions import json_loaders
+from map_objects.game_map import adjust_fog, make_map, place_entities, roll_fog
+from map_objects.map_generator import get_terrain_generator
+from map_objects.map_utils import get_fov
+from render_functions import PanelCompositor, SpriteCache, TerrainLayer, render_board, render_display
+from turn_engine import TurnEngine
+from weather import Weather
+
+DEFAULT_SIZES = [64, 128, 256, 512, 1024]
+DEFAULT_ENTITIES = [16, 100, 1000, 10000]
+
+
+def time_function(function, repeat, budget):
+    """
+    Call a function repeatedly and collect timings
+    Always runs at least once, then stops after repeat runs or once the time budget is used up
+    :param function: function to time (no arguments)
+    :param repeat: int maximum number of runs
+    :param budget: float maximum number of seconds to keep repeating
+    :return: dict of timing statistics in seconds
+    """
+    timings = []
+    start = time.perf_counter()
+    while len(timings) < repeat:
+        run_start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - run_start)
+        if time.perf_counter() - start > budget:
+            break
+    return {
+        'runs': len(timings),
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'mean': statistics.mean(timings),
+        'max': max(timings)
+    }
+
+
+def get_bench_constants(constants, size, entity_count):
+    """
+    Game constants for a board of the given size, scaled the same way the game scales its default board
+    :param constants: dict default game constants
+    :param size: int width and height of the board
+    :param entity_count: int number of entities to place
+    :return: dict game constants
+    """
+    bench_constants = dict(constants)
+    bench_constants['board_width'] = size
+    bench_constants['board_height'] = size
+    bench_constants['island_size'] = size // 8 * 5
+    bench_constants['island_seeds'] = size
+    bench_constants['max_entities'] = entity_count
+    return bench_constants
+
+
+def make_world(constants, game_map, entity_count):
+    """
+    Put a player and entities onto an already generated map
+    :param constants: dict game constants for this board size
+    :param game_map: generated GameMap (terrain only)
+    :param entity_count: int number of entities to place
+    :return: TurnEngine holding the game
+    """
+    game_time = Time(constants['tick'])
+    game_weather = Weather()
+    message_log = MessageLog(height=constants['log_size'], panel_size=constants['message_panel_size'], view_pointer=0)
+    player = make_player(constants=constants, rng=game_map.rng)
+    entities = [player]
+    place_entities(game_map=game_map, entities=entities, max_entities=entity_count,
+                   game_time=game_time, game_weather=game_weather)
+    return TurnEngine(player=player, entities=entities, game_map=game_map, message_log=message_log,
+                      game_state=GameStates.CURRENT_TURN, game_weather=game_weather, game_time=game_time,
+                      colors=constants['colors'])
+
+
+def bench_board(constants, display, size, entity_counts, repeat, budget, save_filename, seed):
+    """
+    Run every benchmark for one board size
+    :return: list of result dicts
+    """
+    results = []
+
+    def record(name, entity_count, function):
+        result = {'benchmark': name, 'board_size': size, 'entities': entity_count}
+        result.update(time_function(function=function, repeat=repeat, budget=budget))
+        results.append(result)
+        print('{:>16} size {:>5} entities {:>6}: median {:.6f}s over {} runs'.format(
+            name, size, entity_count, result['median'], result['runs']), file=sys.stderr)
+
+    size_constants = get_bench_constants(constants=constants, size=size, entity_count=0)
+
+    def generate():
+        return make_map(width=size, height=size, entities=[], max_entities=0,
+                        islands=size_constants['island_size'], seeds=size_constants['island_seeds'],
+                        constants=size_constants, game_time=Time(constants['tick']), game_weather=Weather(),
+                        seed=seed)
+
+    record(name='make_map', entity_count=0, function=generate)
+
+    noise_constants = dict(size_constants, terrain_generator='noise')
+    record(name='make_map_noise', entity_count=0,
+           function=lambda: make_map(width=size, height=size, entities=[], max_entities=0, islands=None, seeds=None,
+                                     constants=noise_constants, game_time=Time(constants['tick']),
+                                     game_weather=Weather(), seed=seed,
+                                     terrain_generator=get_terrain_generator(constants=noise_constants)))
+
+    for entity_count in entity_counts:
+        bench_constants = get_bench_constants(constants=constants, size=size, entity_count=entity_count)
+        game_map = generate()
+
+        spawn_start = time.perf_counter()
+        engine = make_world(constants=bench_constants, game_map=game_map, entity_count=entity_count)
+        spawn_time = time.perf_counter() - spawn_start
+        results.append({'benchmark': 'place_entities', 'board_size': size, 'entities': entity_count, 'runs': 1,
+                        'min': spawn_time, 'median': spawn_time, 'mean': spawn_time, 'max': spawn_time})
+        if game_map.wind_direction is None:
+            game_map.wind_direction = 0
+
+        # map-only benchmarks do not depend on the number of entities, so only run them once per size
+        if entity_count == entity_counts[0]:
+            record(name='get_fov', entity_count=0,
+                   function=lambda: get_fov(entity=engine.player.view, game_map=game_map,
+                                            game_time=engine.game_time, game_weather=engine.game_weather))
+            record(name='roll_fog', entity_count=0,
+                   function=lambda: roll_fog(game_map=game_map, game_time=engine.game_time,
+                                             game_weather=engine.game_weather))
+            record(name='adjust_fog', entity_count=0,
+                   function=lambda: adjust_fog(terrain=game_map.terrain, width=game_map.width,
+                                               height=game_map.height, game_time=engine.game_time,
+                                               weather=engine.game_weather, rng=game_map.rng))
+
+        record(name='turn', entity_count=entity_count, function=lambda: engine.step(action={'rowing': 1}))
+
+        record(name='render_board', entity_count=entity_count,
+               function=lambda: render_board(game_map=engine.game_map, player=engine.player,
+                                             entities=engine.entities, constants=bench_constants,
+                                             game_state=engine.game_state, game_time=engine.game_time,
+                                             game_weather=engine.game_weather))
+        # a frame drawn from the terrain layer and sprites kept between frames (only the overlays are drawn each time)
+        terrain_layer = TerrainLayer()
+        sprite_cache = SpriteCache()
+        record(name='render_board_cached', entity_count=entity_count,
+               function=lambda: render_board(game_map=engine.game_map, player=engine.player,
+                                             entities=engine.entities, constants=bench_constants,
+                                             game_state=engine.game_state, game_time=engine.game_time,
+                                             game_weather=engine.game_weather, terrain_layer=terrain_layer,
+                                             sprite_cache=sprite_cache))
+        record(name='render_display', entity_count=entity_count,
+               function=lambda: render_display(display=display, compositor=PanelCompositor(),
+                                               game_map=engine.game_map, player=engine.player,
+                                               entities=engine.entities, constants=bench_constants,
+                                               mouse_x=0, mouse_y=0, message_log=engine.message_log,
+                                               game_state=engine.game_state, game_time=engine.game_time,
+                                               game_weather=engine.game_weather))
+
+        record(name='save_game', entity_count=entity_count,
+               function=lambda: save_game(player=engine.player, entities=engine.entities,
+                                          game_map=engine.game_map, message_log=engine.message_log,
+                                          game_state=engine.game_state, game_weather=engine.game_weather,
+                                          game_time=engine.game_time, filename=save_filename + '.sav'))
+        record(name='load_game', entity_count=entity_count,
+               function=lambda: load_game(filename=save_filename + '.sav'))
+        record(name='save_json', entity_count=entity_count,
+               function=lambda: json_loaders.save_game(player=engine.player, entities=engine.entities,
+                                                       game_map=engine.game_map, message_log=engine.message_log,
+                                                       game_state=engine.game_state,
+                                                       game_weather=engine.game_weather,
+                                                       game_time=engine.game_time, filename=save_filename + '.json'))
+        record(name='load_json', entity_count=entity_count,
+               function=lambda: json_loaders.load_game(filename=save_filename + '.json'))
+
+    return results
+
+
+def get_commit():
+    """
+    Returns the current git commit of the repository, if there is one
+    :return: str commit hash, or None
+    """
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=BENCH_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Shallow Seas benchmark suite')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help='board sizes (width and height) to benchmark')
+    parser.add_argument('--entities', type=int, nargs='+', default=DEFAULT_ENTITIES,
+                        help='entity counts to benchmark')
+    parser.add_argument('--repeat', type=int, default=20, help='maximum number of runs of each benchmark')
+    parser.add_argument('--budget', type=float, default=2.0,
+                        help='seconds after which a benchmark stops repeating (it always runs at least once)')
+    parser.add_argument('--seed', type=int, default=0, help='world seed, so runs generate the same maps')
+    parser.add_argument('--output', default='bench_results.json', help='JSON file to write the results to')
+    args = parser.parse_args()
+    output_filename = os.path.abspath(args.output)
+
+    # icons and fonts are loaded relative to src
+    os.chdir(SRC_DIR)
+    pygame.init()
+    constants = get_constants()
+    display = pygame.display.set_mode((constants['display_width'], constants['display_height']))
+    constants['icons'].convert()
+
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        save_filename = os.path.join(temp_dir, 'bench_save')
+        for size in args.sizes:
+            results.extend(bench_board(constants=constants, display=display, size=size, entity_counts=args.entities,
+                                       repeat=args.repeat, budget=args.budget, save_filename=save_filename,
+                                       seed=args.seed))
+    pygame.quit()
+
+    report = {
+        'commit': get_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'pygame': pygame.version.ver,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'settings': vars(args),
+        'results': results
+    }
+    with open(output_filename, 'w') as output_file:
+        json.dump(report, output_file, indent=4)
+    print('Results written to {}'.format(output_filename), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
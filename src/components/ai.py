@@ -1,5 +1,3 @@
-from random import randint
-
 from components.mobile import can_move_direction
 from death_functions import kill_player
 from map_objects.map_utils import get_hex_neighbors, hex_to_cube, Hex, get_spatial_relation, \
@@ -33,7 +31,7 @@ class PeacefulMonster:
             if (entity.x, entity.y) in target.view.fov:
                 message_log.add_message(message="{} at {}:{} swims lazily".format(entity.name, entity.x, entity.y))
         else:
-            direction = randint(-1, 1)
+            direction = game_map.rng.randint(-1, 1)
             entity.mobile.rotate(direction)
             if (entity.x, entity.y) in target.view.fov:
                 message_log.add_message(message="{} at {}:{} wanders aimlessly".format(entity.name, entity.x, entity.y))
@@ -71,12 +69,12 @@ class MeleeMonster:  # Sea Serpent and Giant Bat
                 death_result = False
                 details = []
                 if entity.name == 'Giant Bat':
-                    hit_zone = randint(0, 10)
+                    hit_zone = game_map.rng.randint(0, 10)
                     if hit_zone < 5 and target.mast_sail.max_sails > 0:  # and target.mast_sail.current_sails > 0:
                         death_result, details = target.mast_sail.take_sail_damage(amount=damage)
                         message_log.unpack(details=details, color=colors['amber'])
                     else:
-                        death_result, details = target.crew.take_damage(amount=damage)
+                        death_result, details = target.crew.take_damage(amount=damage, rng=game_map.rng)
                         message_log.unpack(details=details, color=colors['amber'])
                 elif entity.name == 'Sea Serpent':
                     death_result, details = target.fighter.take_damage(amount=damage)
@@ -158,7 +156,7 @@ class MeleeMonster:  # Sea Serpent and Giant Bat
                     message_log.add_message(message="{} at {}:{} swims lazily".format(entity.name,
                                                                                       entity.x, entity.y))
             else:
-                direction = randint(-1, 1)
+                direction = game_map.rng.randint(-1, 1)
                 entity.mobile.rotate(direction)
                 if (entity.x, entity.y) in target.view.fov:
                     message_log.add_message(message="{} at {}:{} wanders aimlessly".format(entity.name,
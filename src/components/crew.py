@@ -1,21 +1,22 @@
-from random import choice, randint
+import random
 
 from death_functions import kill_monster
 from map_objects.map_utils import get_hex_neighbors
 
 
 class Crew:
-    def __init__(self, max_crew: int, crew_count: int = None, crew_list=None):
+    def __init__(self, max_crew: int, crew_count: int = None, crew_list=None, rng=random):
         """
         Component detailing crew
         :param max_crew: Entity Size to determine maximum number of crew
         :paramn crew_count: int size of starting crew to add to crew list
         :param crew_list: list of current crewmen
+        :param rng: WorldRandom stream the starting crew are named from (defaults to the random module)
         """
         self.max_crew = max_crew
         if crew_count is not None and crew_count > self.max_crew:
             crew_count = self.max_crew
-        self.crew_list = crew_list if crew_list is not None else self.starting_crew(crew_count)
+        self.crew_list = crew_list if crew_list is not None else self.starting_crew(crew_size=crew_count, rng=rng)
     
     def to_json(self):
         """
@@ -43,29 +44,31 @@ class Crew:
         return Crew(max_crew=max_crew, crew_list=crew_list)
     
     @staticmethod
-    def starting_crew(crew_size):
+    def starting_crew(crew_size, rng=random):
         """
         Fills ship with the number of crew given
         :param crew_size: int current number of crew
+        :param rng: WorldRandom stream to name the crew from (defaults to the random module)
         :return: list of generated crew
         """
         crew_list = []
         for i in range(0, crew_size):
-            member = Crewman()
+            member = Crewman(rng=rng)
             crew_list.append(member)
             # print('Crewman {} the {} added'.format(member.name, member.profession))
         return crew_list
     
-    def take_damage(self, amount: int):
+    def take_damage(self, amount: int, rng=random):
         """
         Kills crew members. Death if the last crewman dies
         :param amount: int number of crew to kill
+        :param rng: WorldRandom stream to pick who dies from (defaults to the random module)
         :return: True if the last crew member died, messages
         """
         details = []
         for i in range(amount):
             if len(self.crew_list) > 0:
-                dead_man = randint(0, len(self.crew_list) - 1)
+                dead_man = rng.randint(0, len(self.crew_list) - 1)
                 details.append('Crewman {} the {} has died!'.format(self.crew_list[dead_man].name,
                                                                     self.crew_list[dead_man].profession))
                 del self.crew_list[dead_man]
@@ -126,14 +129,15 @@ class Crew:
 
 
 class Crewman:
-    def __init__(self, name: str = None, profession: str = None):
+    def __init__(self, name: str = None, profession: str = None, rng=random):
         """
         container for crew member
         :param name: str name of crewman
         :param profession: str profession of crewman
+        :param rng: WorldRandom stream to generate a missing name or profession from (defaults to the random module)
         """
-        self.name = name if name else self.generate_name
-        self.profession = profession if profession else self.generate_profession
+        self.name = name if name else self.generate_name(rng=rng)
+        self.profession = profession if profession else self.generate_profession(rng=rng)
     
     def to_json(self):
         return {
@@ -148,11 +152,12 @@ class Crewman:
         
         return Crewman(name, profession)
     
-    @property
-    def generate_name(self):
+    @staticmethod
+    def generate_name(rng):
         """
         Creates a name for a crewman
         TODO: move to Factory
+        :param rng: WorldRandom stream to pick the name from
         :return: str 'firstName + lastName'
         """
         possible_names = ['James',
@@ -171,13 +176,14 @@ class Crewman:
                              'White',
                              'Black'
                              ]
-        return "{} {}".format(choice(possible_names), choice(possible_surnames))
+        return "{} {}".format(rng.choice(possible_names), rng.choice(possible_surnames))
     
-    @property
-    def generate_profession(self):
+    @staticmethod
+    def generate_profession(rng):
         """
         Assigns a profession to a crewman
         TODO: move to Generator
+        :param rng: WorldRandom stream to pick the profession from
         :return: str profession name
         """
         possible_professions = ['Sailor',
@@ -189,4 +195,4 @@ class Crewman:
                                 'Engineer',
                                 'Vagrant'
                                 ]
-        return choice(possible_professions)
+        return rng.choice(possible_professions)
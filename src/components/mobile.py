@@ -1,5 +1,4 @@
 from map_objects.map_utils import hex_directions
-from map_objects.tile import Elevation
 
 
 # from death_functions import kill_player, kill_monster
@@ -88,8 +87,7 @@ class Mobile:
                 if self.owner.mast_sail:
                     self.owner.mast_sail.current_sails = 0
                 break
-            elif game_map.in_bounds(x=new_x, y=new_y) and \
-                    game_map.terrain[new_x][new_y].elevation > Elevation.SHALLOWS \
+            elif game_map.in_bounds(x=new_x, y=new_y) and not game_map.analysis.water[new_x, new_y] \
                     and not self.owner.wings:
                 if (self.owner.x, self.owner.y) in player.view.fov:
                     message = "{} crashed into island".format(self.owner.name)
@@ -190,8 +188,6 @@ def can_move_direction(entity, neighbor, game_map):
     new_x, new_y = neighbor
     if not game_map.in_bounds(x=new_x, y=new_y, margin=1):
         return False
-    elif game_map.in_bounds(x=new_x, y=new_y) \
-            and game_map.terrain[new_x][new_y].elevation > Elevation.SHALLOWS \
-            and not entity.wings:
+    elif game_map.in_bounds(x=new_x, y=new_y) and not game_map.analysis.water[new_x, new_y] and not entity.wings:
         return False
     return True
@@ -41,4 +41,7 @@ class Size(IntEnum):
         if self.__class__ is other.__class__:
             return self.value != other.value
         return NotImplemented
-
+    
+    def __str__(self):
+        # python 3.11 changed IntEnum str() to the value, keep 'Size.NAME' (used as a key in weapon tables)
+        return 'Size.{}'.format(self.name)
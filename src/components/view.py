@@ -1,4 +1,9 @@
+from itertools import chain
+
+import numpy as np
+
 from map_objects.map_utils import get_fov
+from map_objects.tile import decoration_ids
 
 
 class View:
@@ -17,21 +22,18 @@ class View:
         :param game_weather: current map Weather conditions
         :return: Nothing - modify current map
         """
-        # get list of visible tiles
-        port = None
+        # get set of visible tiles, and their coordinates as index arrays into the terrain arrays
         visible_tiles = get_fov(self, game_map=game_map, game_time=game_time, game_weather=game_weather)
+        tiles = visible_tiles
+        if not (0 <= self.owner.x < game_map.width and 0 <= self.owner.y < game_map.height):
+            # every tile but the entity's own is on the map, and it can be off it (sailing off the edge)
+            tiles = visible_tiles - {(self.owner.x, self.owner.y)}
+        xs, ys = np.fromiter(chain.from_iterable(tiles), dtype=np.intp, count=2 * len(tiles)).reshape(-1, 2).T
         if self.owner.name == 'player':
-            for (x, y) in visible_tiles:
-                if (0 <= x < game_map.width) and (0 <= y < game_map.height) and not game_map.terrain[x][y].seen:
-                    game_map.terrain[x][y].seen = True
+            game_map.terrain.seen[xs, ys] = True
         else:  # not the player, remove port from fov
-            # print(visible_tiles, len(visible_tiles))
-            for x, y in visible_tiles:
-                if game_map.terrain[x][y].decoration and game_map.terrain[x][y].decoration.name == 'Port':
-                    port = (x, y)
-        
-        if port:
-            visible_tiles.remove(port)
+            ports = game_map.terrain.decoration[xs, ys] == decoration_ids['Port']
+            if ports.any():
+                visible_tiles.difference_update(zip(xs[ports].tolist(), ys[ports].tolist()))
         # replace old visible list
         self.fov = visible_tiles
-        # print(self.owner.name, self.fov)
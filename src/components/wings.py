@@ -22,7 +22,7 @@ class Wings:
         self.current_wing_power = current_wing_power  # current_sails
         self.catching_wind = catching_wind
         self.wing_hp_max = wing_hp_max if wing_hp_max is not None else size + 3  # sail_hp_max
-        self.wing_hp = wing_hp if wing_hp is not None else wing_hp_max  # sail_hp
+        self.wing_hp = wing_hp if wing_hp is not None else self.wing_hp_max  # sail_hp
     
     def to_json(self):
         """
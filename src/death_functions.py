@@ -1,5 +1,5 @@
 from game_states import GameStates
-from render_functions import RenderOrder
+from render_order import RenderOrder
 
 
 def kill_player(player):
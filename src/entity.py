@@ -10,7 +10,7 @@ from components.size import Size
 from components.view import View
 from components.weapon import WeaponList
 from components.wings import Wings
-from render_functions import RenderOrder
+from render_order import RenderOrder
 
 
 class Entity:
@@ -0,0 +1,67 @@
+import pygame
+
+# the window was uncovered or restored, the screen has to be redrawn from the display surface
+expose_events = (pygame.WINDOWEXPOSED, pygame.WINDOWRESTORED, pygame.VIDEOEXPOSE)
+
+
+class Scheduler:
+    def __init__(self, event_types=(pygame.QUIT, pygame.KEYDOWN, pygame.MOUSEMOTION, pygame.MOUSEBUTTONDOWN)
+                 + expose_events):
+        """
+        Blocks the main loop until user input arrives, the window needs redrawing, or a timer is due, so an idle game
+        uses no CPU
+        :param event_types: pygame event types that can wake the loop (all others are blocked)
+        """
+        self.timers = {}
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed(list(event_types))
+
+    def add_timer(self, name: str, interval: int):
+        """
+        Add a repeating timer that wakes the loop
+        :param name: str name of the timer, returned from wait when it is due
+        :param interval: int milliseconds between wake ups
+        :return: None
+        """
+        self.timers[name] = {'interval': interval, 'due': pygame.time.get_ticks() + interval}
+
+    def remove_timer(self, name: str):
+        """
+        Stop a timer from waking the loop
+        :param name: str name of the timer
+        :return: None
+        """
+        self.timers.pop(name, None)
+
+    def get_timeout(self):
+        """
+        Milliseconds until the next timer is due
+        :return: int milliseconds, or None if there are no timers
+        """
+        if not self.timers:
+            return None
+        return min(timer['due'] for timer in self.timers.values()) - pygame.time.get_ticks()
+
+    def wait(self):
+        """
+        Sleep until there is input or a timer is due
+        :return: list of pygame events, list of str names of the due timers
+        """
+        timeout = self.get_timeout()
+        if timeout is None:
+            event_list = [pygame.event.wait()]
+        elif timeout > 0:
+            event = pygame.event.wait(timeout)
+            event_list = [event] if event.type != pygame.NOEVENT else []
+        else:
+            event_list = []
+        # grab anything else that queued up while asleep (ex: a burst of mouse motion)
+        event_list.extend(pygame.event.get())
+
+        now = pygame.time.get_ticks()
+        due_timers = []
+        for name, timer in self.timers.items():
+            if timer['due'] <= now:
+                due_timers.append(name)
+                timer['due'] = now + timer['interval']
+        return event_list, due_timers
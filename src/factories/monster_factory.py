@@ -14,7 +14,7 @@ from components.size import Size
 from components.cargo import ItemCategory, Item, Cargo
 from components.view import View
 from entity import Entity
-from render_functions import RenderOrder
+from render_order import RenderOrder
 from components.fighter import Fighter
 from components.mobile import Mobile
 
@@ -0,0 +1,193 @@
+from bisect import bisect_right
+
+from components.ai import PeacefulMonster, MeleeMonster
+from components.cargo import Cargo, ItemCategory, Item
+from components.fighter import Fighter
+from components.mobile import Mobile
+from components.size import Size
+from components.view import View
+from components.wings import Wings
+from entity import Entity
+from render_order import RenderOrder
+
+
+class ItemTemplate:
+    __slots__ = ['name', 'icon', 'category', 'weight', 'volume', 'quantity', 'rolls']
+
+    def __init__(self, name: str, icon: str, category: ItemCategory, weight: float, volume: float, quantity: int = 0,
+                 rolls: tuple = ()):
+        """
+        Template of an Item in a prototype's cargo, the quantity is rolled for each entity built
+        :param name: str name of the item
+        :param icon: str name of the icon
+        :param category: ItemCategory of the item
+        :param weight: float weight of one item
+        :param volume: float volume of one item
+        :param quantity: int quantity before the rolls are added
+        :param rolls: tuple of (low, high) ranges, a random int in each range is added to the quantity
+        """
+        self.name = name
+        self.icon = icon
+        self.category = category
+        self.weight = weight
+        self.volume = volume
+        self.quantity = quantity
+        self.rolls = rolls
+
+    def make_item(self, rng):
+        quantity = 0
+        for low, high in self.rolls:
+            quantity += rng.randint(low, high)
+        return Item(name=self.name, icon=self.icon, category=self.category, weight=self.weight, volume=self.volume,
+                    quantity=quantity + self.quantity)
+
+
+class EntityPrototype:
+    def __init__(self, name: str, icon: str, render_order: RenderOrder, manifest: list, size: Size = None, ai=None,
+                 wings: bool = False):
+        """
+        Template every entity of one kind is built from, so spawning only rolls what differs between them
+        Creatures (prototypes with a size) get their view, speed, hit points and cargo space from their size,
+        anything else (chests, wrecks) is a floating cargo of 5 volume and 10 weight
+        :param name: str name of the entities
+        :param icon: str name of the icon
+        :param render_order: RenderOrder of the entities
+        :param manifest: list of ItemTemplates of the cargo
+        :param size: Size of a creature (None if not a creature)
+        :param ai: AI class of a creature
+        :param wings: bool True if a creature flies
+        """
+        self.name = name
+        self.icon = icon
+        self.render_order = render_order
+        self.manifest = manifest
+        self.size = size
+        self.ai = ai
+        self.wings = wings
+
+    def make_entity(self, x: int, y: int, rng):
+        """
+        Build a new entity from the prototype, its field of view is not set (see place_entities)
+        :param x: int x coordinate of the entity
+        :param y: int y coordinate of the entity
+        :param rng: WorldRandom stream of the map
+        :return: Entity
+        """
+        manifest = [item.make_item(rng=rng) for item in self.manifest]
+        if self.size is None:
+            return Entity(name=self.name, x=x, y=y,
+                          icon=self.icon,
+                          render_order=self.render_order,
+                          cargo=Cargo(max_volume=5, max_weight=10, manifest=manifest))
+
+        size = self.size.value
+        return Entity(name=self.name, x=x, y=y,
+                      size=self.size,
+                      icon=self.icon,
+                      render_order=self.render_order,
+                      view=View(view=size + 3),
+                      mobile=Mobile(direction=rng.randint(0, 5), max_momentum=size * 2 + 2),
+                      ai=self.ai(),
+                      wings=Wings(name="wings", wings=2, size=size) if self.wings else None,
+                      fighter=Fighter(name="body", max_hps=size * 10 + 5),
+                      cargo=Cargo(max_volume=size * 10 + 5, max_weight=size * 10 + 5, manifest=manifest))
+
+
+def meat(size: Size):
+    return ItemTemplate(name='Meat', icon='meat', category=ItemCategory.SUPPLIES, weight=.5, volume=.5,
+                        quantity=size.value + 1)
+
+
+pearls = ItemTemplate(name='Pearls', icon='pearl', category=ItemCategory.EXOTICS, weight=.01, volume=.01,
+                      rolls=((10, 20), (10, 20)))
+
+prototypes = {
+    'chest': EntityPrototype(
+        name='Chest', icon='salvage', render_order=RenderOrder.FLOATING,
+        manifest=[pearls,
+                  ItemTemplate(name='Rum', icon='rum', category=ItemCategory.EXOTICS, weight=0.1, volume=2,
+                               quantity=1, rolls=((0, 5),)),
+                  ItemTemplate(name='Fish', icon='fish', category=ItemCategory.SUPPLIES, weight=0.1, volume=2,
+                               quantity=1, rolls=((0, 5),)),
+                  ItemTemplate(name='Fruit', icon='fruit', category=ItemCategory.SUPPLIES, weight=0.1, volume=2,
+                               quantity=1, rolls=((0, 5),)),
+                  ItemTemplate(name='Water', icon='water', category=ItemCategory.SUPPLIES, weight=2, volume=2,
+                               quantity=1, rolls=((0, 5),))]),
+    'sunken_ship': EntityPrototype(
+        name='Sunken Ship', icon='sunken_ship', render_order=RenderOrder.FLOATING,
+        manifest=[pearls,
+                  ItemTemplate(name='Rope', icon='rope', category=ItemCategory.SUPPLIES, weight=1, volume=2,
+                               quantity=1, rolls=((0, 5),)),
+                  ItemTemplate(name='Wood', icon='wood', category=ItemCategory.SUPPLIES, weight=2, volume=2,
+                               quantity=1, rolls=((0, 5),)),
+                  ItemTemplate(name='Canvas', icon='canvas', category=ItemCategory.SUPPLIES, weight=1, volume=2,
+                               quantity=1, rolls=((0, 5),)),
+                  ItemTemplate(name='Tar', icon='tar', category=ItemCategory.SUPPLIES, weight=1, volume=2,
+                               quantity=1, rolls=((0, 5),))]),
+    'sea_turtle': EntityPrototype(
+        name='Sea Turtle', icon='sea_turtle', render_order=RenderOrder.FLOATING, size=Size.MEDIUM,
+        ai=PeacefulMonster,
+        manifest=[meat(size=Size.MEDIUM),
+                  ItemTemplate(name='Turtle Shell', icon='turtle_shell', category=ItemCategory.SUPPLIES,
+                               weight=2 * Size.MEDIUM.value, volume=float(Size.MEDIUM.value), quantity=1)]),
+    'giant_bat': EntityPrototype(
+        name='Giant Bat', icon='giant_bat', render_order=RenderOrder.FLYING, size=Size.TINY, ai=MeleeMonster,
+        wings=True,
+        manifest=[meat(size=Size.TINY)]),
+    'sea_serpent': EntityPrototype(
+        name='Sea Serpent', icon='sea_serpent', render_order=RenderOrder.FLOATING, size=Size.SMALL,
+        ai=MeleeMonster,
+        manifest=[meat(size=Size.SMALL),
+                  ItemTemplate(name='Serpent Scale', icon='serpent_scale', category=ItemCategory.EXOTICS,
+                               weight=.5, volume=.5, quantity=Size.SMALL.value + 1)])
+}
+
+# chance of each prototype on the first map, and how much it changes for every map the player has travelled to
+# (as in monster_factory.entity_picker: more treasure and fewer of the weaker monsters the further they sail)
+spawn_chances = (('chest', 5, 1),
+                 ('sunken_ship', 10, 1),
+                 ('sea_turtle', 25, 0),
+                 ('giant_bat', 30, -1),
+                 ('sea_serpent', 31, -1))
+
+spawn_tables = {}
+
+
+def get_spawn_table(travels: int):
+    """
+    Spawn table for a map, built once per number of travels
+    :param travels: int number of times the player has changed maps
+    :return: tuple of prototype names, tuple of the spawn roll below which each name is picked (the last name is
+             picked for any higher roll), int total of the chances (rolls are 0 - total - 1)
+    """
+    if travels not in spawn_tables:
+        names = []
+        rolls = []
+        total = 0
+        for name, chance, change in spawn_chances:
+            total += max(chance + change * travels, 0)
+            names.append(name)
+            rolls.append(total)
+        spawn_tables[travels] = (tuple(names), tuple(rolls[:-1]), total)
+    return spawn_tables[travels]
+
+
+def spawn_entities(spawn_tiles, height: int, number: int, rng, travels: int = 0):
+    """
+    Build entities from the prototypes of the spawn table, on random tiles
+    TODO: add new creatures, sunken ships, etc.
+    :param spawn_tiles: numpy array of tile numbers (x * height + y) entities can be placed on
+    :param height: int height of the map (to turn tile numbers into coordinates)
+    :param number: int number of entities to build
+    :param rng: WorldRandom stream of the map
+    :param travels: int number of times the player has changed maps (see get_spawn_table)
+    :return: list of new entities
+    """
+    randint = rng.randint
+    names, rolls, total = get_spawn_table(travels=travels)
+    entities = []
+    for i in range(number):
+        tile = int(spawn_tiles[randint(0, len(spawn_tiles) - 1)])
+        name = names[bisect_right(rolls, randint(0, total - 1))]
+        entities.append(prototypes[name].make_entity(x=tile // height, y=tile % height, rng=rng))
+    return entities
@@ -43,6 +43,7 @@ class MessageLog:
         self.height = height
         self.view_pointer = view_pointer
         self.message_panel_size = panel_size
+        self.version = 0  # bumped on every change, so the message panel only re-renders when needed
     
     def to_json(self):
         """
@@ -86,6 +87,7 @@ class MessageLog:
         :return: None
         """
         # wordwrap later if needed
+        self.version += 1
         self.messages.append(Message(message, color))
         if len(self.messages) > self.height:
             del self.messages[0]
@@ -98,6 +100,7 @@ class MessageLog:
         :param amount: int amount of scroll
         :return: None
         """
+        self.version += 1
         self.view_pointer += amount
         if self.view_pointer > self.height - self.message_panel_size:
             self.view_pointer = self.height - self.message_panel_size
@@ -109,6 +112,7 @@ class MessageLog:
         Reset the view to the last message
         :return: None
         """
+        self.version += 1
         self.view_pointer = len(self.messages) - self.message_panel_size
         if self.view_pointer < 0:
             self.view_pointer = 0
@@ -10,6 +10,10 @@ def handle_keys(event, game_state):
     :param game_state: determines which command set to forward interactions to
     :return: dict of key presses and meaning depending on state
     """
+    if event and event.type == KEYDOWN and event.key == K_F3 and game_state != GameStates.MAIN_MENU:
+        # show / hide turn phase timings
+        return {'profiler': True}
+    
     if game_state == GameStates.CURRENT_TURN:
         return handle_keys_current_turn(event)
     elif game_state == GameStates.TARGETING:
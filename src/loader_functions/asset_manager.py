@@ -0,0 +1,202 @@
+import json
+import os
+import struct
+from collections import OrderedDict
+
+import pygame
+
+# bumped whenever the layout of the atlas cache changes, caches of other versions are rebuilt
+atlas_version = 1
+atlas_width = 512  # width of the atlas in pixels (or the width of the widest icon, if wider)
+
+cache_header = struct.Struct('<I')  # length of the json header, followed by the header and the atlas pixels
+
+
+class IconAtlas:
+    def __init__(self, files: dict, lazy_files: dict = None, cache_filename: str = None):
+        """
+        The game's icons, looked up by name like a dict:  constants['icons']['sea']
+        The icons in files are packed into one atlas surface, each icon is a subsurface of it. The decoded atlas is
+        cached on disk, so later starts read one file instead of decoding every PNG (the cache is rebuilt when one of
+        the PNGs changes). The icons in lazy_files (rarely used, ex: inventory) are only loaded when first looked up.
+        Once the window exists, convert() converts the icons to the display's pixel format, so blits skip the
+        conversion
+        :param files: dict of icon name to PNG file name, packed into the atlas
+        :param lazy_files: dict of icon name to PNG file name, loaded when first used
+        :param cache_filename: str name of the decoded atlas cache file (None for no cache)
+        """
+        self.files = files
+        self.lazy_files = lazy_files if lazy_files is not None else {}
+        self.cache_filename = cache_filename
+        self.converted = False
+        self.rects = {}  # icon name: Rect of the icon in the atlas
+        self.icons = {}  # icon name: Surface, for the atlas icons and the lazy icons loaded so far
+
+        self.atlas = self.load_cache()
+        if self.atlas is None:
+            self.atlas = self.pack()
+            self.save_cache()
+        self.cut()
+
+    def __getitem__(self, name: str):
+        icon = self.icons.get(name)
+        if icon is None:
+            icon = self.load(filename=self.lazy_files[name])
+            self.icons[name] = icon
+        return icon
+
+    def __contains__(self, name: str):
+        return name in self.files or name in self.lazy_files
+
+    def load(self, filename: str):
+        image = pygame.image.load(filename)
+        return image.convert_alpha() if self.converted else image
+
+    def convert(self):
+        """
+        Convert the icons to the pixel format of the display, must be called after the display mode is set
+        :return: None
+        """
+        self.atlas = self.atlas.convert_alpha()
+        for name in self.icons:
+            if name not in self.rects:
+                self.icons[name] = self.icons[name].convert_alpha()
+        self.converted = True
+        self.cut()
+
+    def cut(self):
+        for name, rect in self.rects.items():
+            self.icons[name] = self.atlas.subsurface(rect)
+
+    def pack(self):
+        """
+        Decode the PNGs and pack them into rows (shelves) of the atlas, tallest first
+        :return: Surface of the atlas (self.rects is set to the place of each icon)
+        """
+        images = {name: pygame.image.load(filename) for name, filename in self.files.items()}
+        width = max([atlas_width] + [image.get_width() for image in images.values()])
+        x = 0
+        y = 0
+        shelf_height = 0
+        self.rects = {}
+        for name in sorted(images, key=lambda name: (images[name].get_height(), images[name].get_width()),
+                           reverse=True):
+            image_width, image_height = images[name].get_size()
+            if x + image_width > width:
+                x = 0
+                y += shelf_height
+                shelf_height = 0
+            self.rects[name] = pygame.Rect(x, y, image_width, image_height)
+            x += image_width
+            shelf_height = max(shelf_height, image_height)
+
+        atlas = pygame.Surface((width, max(y + shelf_height, 1)), pygame.SRCALPHA)
+        atlas.fill((0, 0, 0, 0))
+        for name, rect in self.rects.items():
+            # onto transparent black, max copies the icon's pixels (and alpha) exactly instead of blending them
+            atlas.blit(images[name], rect, special_flags=pygame.BLEND_RGBA_MAX)
+        return atlas
+
+    def get_signature(self):
+        """
+        :return: list of the name, file name, size and modification time of each icon in the atlas
+        """
+        signature = []
+        for name, filename in sorted(self.files.items()):
+            status = os.stat(filename)
+            signature.append([name, filename, status.st_size, status.st_mtime_ns])
+        return signature
+
+    def load_cache(self):
+        """
+        :return: Surface of the cached atlas (self.rects is set from the cache), or None if there is no valid cache
+        """
+        if self.cache_filename is None or not os.path.exists(self.cache_filename):
+            return None
+        try:
+            with open(self.cache_filename, 'rb') as cache_file:
+                data = cache_file.read()
+            header_length = cache_header.unpack_from(data, 0)[0]
+            header = json.loads(data[cache_header.size:cache_header.size + header_length].decode('utf-8'))
+            if header['version'] != atlas_version or header['signature'] != self.get_signature():
+                return None
+            atlas = pygame.image.frombytes(data[cache_header.size + header_length:], tuple(header['size']), 'RGBA')
+        except (OSError, ValueError, KeyError, struct.error, pygame.error):
+            return None
+        self.rects = {name: pygame.Rect(rect) for name, rect in header['rects'].items()}
+        return atlas
+
+    def save_cache(self):
+        if self.cache_filename is None:
+            return
+        header = json.dumps({'version': atlas_version,
+                             'signature': self.get_signature(),
+                             'size': list(self.atlas.get_size()),
+                             'rects': {name: list(rect) for name, rect in self.rects.items()}}).encode('utf-8')
+        temp_filename = self.cache_filename + '.tmp'
+        try:
+            with open(temp_filename, 'wb') as cache_file:
+                cache_file.write(cache_header.pack(len(header)))
+                cache_file.write(header)
+                cache_file.write(pygame.image.tobytes(self.atlas, 'RGBA'))
+            os.replace(temp_filename, self.cache_filename)
+        except OSError as error:
+            print("Icon Cache Error! {}".format(error))
+
+
+class TextCache:
+    def __init__(self, max_entries: int = 1024):
+        """
+        Rendered text surfaces, kept by (font, style, text, color) so labels that do not change between frames are
+        only rasterized once. The least recently used are dropped once max_entries are kept
+        The surfaces are shared between callers, so they must not be drawn on
+        :param max_entries: int maximum number of rendered texts kept
+        """
+        self.max_entries = max_entries
+        self.surfaces = OrderedDict()  # key: Surface, least recently used first
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, antialias, color, background=None):
+        """
+        :param font: CachedFont to render with (on a miss)
+        :return: Surface of the rendered text, the same as font.render
+        """
+        key = (font, font.get_bold(), font.get_italic(), font.get_underline(), text, antialias, tuple(color),
+               tuple(background) if background is not None else None)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+        self.misses += 1
+        surface = pygame.font.Font.render(font, text, antialias, color, background)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_entries:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def get_stats(self):
+        """
+        :return: dict of the number of hits, misses, rendered texts kept, and the share of hits (0 - 1)
+        """
+        lookups = self.hits + self.misses
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self.surfaces),
+                'hit_rate': self.hits / lookups if lookups else 0.0}
+
+
+class CachedFont(pygame.font.Font):
+    def __init__(self, filename: str, size: int, cache: TextCache):
+        """
+        A pygame Font whose render goes through a TextCache (everything else is the Font's own)
+        :param filename: str name of the font file
+        :param size: int size of the font
+        :param cache: TextCache shared by the game's fonts
+        """
+        super().__init__(filename, size)
+        self.cache = cache
+
+    def render(self, text, antialias, color, background=None):
+        return self.cache.render(font=self, text=text, antialias=antialias, color=color, background=background)
@@ -0,0 +1,121 @@
+import time
+from queue import Queue
+from threading import Lock, Thread
+
+from loader_functions.binary_loaders import get_save_data, write_save_data
+
+
+class Autosave:
+    def __init__(self, filename='save_game.sav', turn_interval=10, time_interval=60, journal=None):
+        """
+        Background autosave: snapshots the game every few turns (or seconds) and writes it on a worker thread
+        :param filename: str name of the save file
+        :param turn_interval: int number of turns between snapshots
+        :param time_interval: int number of seconds between snapshots
+        :param journal: ActionJournal of the actions taken between snapshots (None to not keep one)
+        """
+        self.filename = filename
+        self.journal = journal
+        self.turn_interval = turn_interval
+        self.time_interval = time_interval
+        self.turn_count = 0
+        self.last_save = time.monotonic()
+        self.error = None  # last error of the worker thread, until the game thread takes it (see take_error)
+        self.error_lock = Lock()
+
+        self.queue = Queue()
+        self.worker = Thread(target=self.write_snapshots, name='autosave', daemon=True)
+        self.worker.start()
+
+    def write_snapshots(self):
+        """
+        Worker thread loop: write each queued snapshot to disk, stop when None is queued
+        :return: None
+        """
+        while True:
+            snapshot = self.queue.get()
+            try:
+                if snapshot is None:
+                    break
+                data, journal_segment = snapshot
+                write_save_data(data=data, filename=self.filename)
+                # the snapshot has everything the older journal segments would replay
+                if journal_segment is not None:
+                    self.journal.remove_segments(segment=journal_segment)
+            except OSError as error:
+                # reported on the game thread, the worker has no message log
+                with self.error_lock:
+                    self.error = error
+            finally:
+                self.queue.task_done()
+
+    def take_error(self):
+        """
+        Take the last error of the worker thread, so it is only reported once
+        :return: OSError the last snapshot failed to be written with, or None if there was no error since the last call
+        """
+        with self.error_lock:
+            error = self.error
+            self.error = None
+        return error
+
+    @property
+    def is_due(self):
+        """
+        Returns True if enough turns or time have passed since the last snapshot
+        :return: boolean
+        """
+        return self.turn_count >= self.turn_interval or time.monotonic() - self.last_save >= self.time_interval
+
+    def turn_taken(self, player, entities, game_map, message_log, game_state, game_weather, game_time):
+        """
+        Count a processed turn, and queue a snapshot if one is due
+        :return: None
+        """
+        self.turn_count += 1
+        if self.is_due:
+            self.save(player=player, entities=entities, game_map=game_map, message_log=message_log,
+                      game_state=game_state, game_weather=game_weather, game_time=game_time)
+
+    def idle(self, player, entities, game_map, message_log, game_state, game_weather, game_time):
+        """
+        Called from the autosave timer: queue a snapshot if turns were taken but not saved for too long
+        :return: None
+        """
+        if self.turn_count > 0 and self.is_due:
+            self.save(player=player, entities=entities, game_map=game_map, message_log=message_log,
+                      game_state=game_state, game_weather=game_weather, game_time=game_time)
+
+    def save(self, player, entities, game_map, message_log, game_state, game_weather, game_time):
+        """
+        Snapshot the game now (on the calling thread) and queue it for the worker to write,
+        the actions after the snapshot are journaled to a new segment
+        :return: None
+        """
+        journal_segment = self.journal.start_segment() if self.journal is not None else None
+        data = get_save_data(player=player, entities=entities, game_map=game_map, message_log=message_log,
+                             game_state=game_state, game_weather=game_weather, game_time=game_time,
+                             journal_segment=journal_segment)
+        self.queue.put((data, journal_segment))
+        self.turn_count = 0
+        self.last_save = time.monotonic()
+
+    def flush(self):
+        """
+        Block until every queued snapshot has been written
+        :return: None
+        """
+        self.queue.join()
+
+    def stop(self, player, entities, game_map, message_log, game_state, game_weather, game_time):
+        """
+        Save the final state of the game, wait for it to be written, and shut down the worker thread
+        :return: OSError of the last snapshot that failed to be written and was not reported yet, or None
+        """
+        self.save(player=player, entities=entities, game_map=game_map, message_log=message_log,
+                  game_state=game_state, game_weather=game_weather, game_time=game_time)
+        self.queue.put(None)
+        self.worker.join()
+        if self.journal is not None:
+            self.journal.close()
+        return self.take_error()
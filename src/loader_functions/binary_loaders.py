@@ -0,0 +1,366 @@
+import os
+import struct
+import zlib
+
+import numpy as np
+
+from entity import Entity
+from game_messages import MessageLog
+from game_states import GameStates
+from game_time import Time
+from map_objects.chunked_map import ChunkedWorld
+from map_objects.game_map import GameMap
+from map_objects.tile import TerrainGrid
+from weather import Weather
+
+# bumped whenever the layout of the save file changes, saves of other versions are not loaded
+save_version = 1
+save_magic = b'SSEA'
+
+file_header = struct.Struct('<4sHH')  # magic, save version, number of sections
+section_header = struct.Struct('<BI')  # length of the section name, length of the compressed section
+
+# record value tags
+NONE, FALSE, TRUE, SMALL_INT, INT, BIG_INT, FLOAT, STRING, LIST, DICT = range(10)
+
+tag_struct = struct.Struct('<B')
+small_int_struct = struct.Struct('<Bb')
+int_struct = struct.Struct('<Bq')
+big_int_struct = struct.Struct('<BH')
+float_struct = struct.Struct('<Bd')
+id_struct = struct.Struct('<BI')
+
+
+class RecordWriter:
+    def __init__(self):
+        """
+        Packs json-like values (what the to_json methods return) into compact binary records
+        Every string is stored once in a string table, and every set of dict keys once in a key table,
+        the records only hold their ids
+        """
+        self.strings = {}  # string: id
+        self.key_sets = {}  # tuple of key string ids: id
+        self.parts = []
+
+    def get_string_id(self, text: str):
+        string_id = self.strings.get(text)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.strings[text] = string_id
+        return string_id
+
+    def write(self, value):
+        """
+        Add a value (None, bool, int, float, str, or lists and dicts of them) to the records
+        :param value: json-like value
+        :return: None
+        """
+        parts = self.parts
+        if value is None:
+            parts.append(tag_struct.pack(NONE))
+        elif value is False:
+            parts.append(tag_struct.pack(FALSE))
+        elif value is True:
+            parts.append(tag_struct.pack(TRUE))
+        elif isinstance(value, int):
+            if -128 <= value < 128:
+                parts.append(small_int_struct.pack(SMALL_INT, value))
+            elif -2 ** 63 <= value < 2 ** 63:
+                parts.append(int_struct.pack(INT, value))
+            else:
+                raw = value.to_bytes(value.bit_length() // 8 + 1, 'little', signed=True)
+                parts.append(big_int_struct.pack(BIG_INT, len(raw)))
+                parts.append(raw)
+        elif isinstance(value, float):
+            parts.append(float_struct.pack(FLOAT, value))
+        elif isinstance(value, str):
+            parts.append(id_struct.pack(STRING, self.get_string_id(text=value)))
+        elif isinstance(value, (list, tuple)):
+            parts.append(id_struct.pack(LIST, len(value)))
+            for item in value:
+                self.write(value=item)
+        elif isinstance(value, dict):
+            # keys are strings, the same as when saved as json
+            keys = tuple(self.get_string_id(text=str(key)) for key in value)
+            key_set_id = self.key_sets.get(keys)
+            if key_set_id is None:
+                key_set_id = len(self.key_sets)
+                self.key_sets[keys] = key_set_id
+            parts.append(id_struct.pack(DICT, key_set_id))
+            for item in value.values():
+                self.write(value=item)
+        else:
+            raise TypeError('can not save a {}'.format(type(value).__name__))
+
+    def get_sections(self):
+        """
+        :return: dict of section name to bytes of the string table, key table, and records
+        """
+        encoded = [text.encode('utf-8') for text in self.strings]
+        lengths = [len(encoded)] + [len(text) for text in encoded]
+        key_table = []
+        for keys in self.key_sets:
+            key_table.append(len(keys))
+            key_table.extend(keys)
+        return {
+            # number of strings, the length of each string, then the strings
+            'strings': np.array(lengths, dtype='<u4').tobytes() + b''.join(encoded),
+            # number of keys then the string id of each key, for each key set
+            'keys': np.array(key_table, dtype='<u4').tobytes(),
+            'records': b''.join(self.parts)
+        }
+
+
+class RecordReader:
+    def __init__(self, sections: dict):
+        """
+        Reads back the values packed by a RecordWriter
+        :param sections: dict of section name to bytes, with the 'strings', 'keys' and 'records' sections
+        """
+        data = sections['strings']
+        count = int(np.frombuffer(data, dtype='<u4', count=1)[0])
+        lengths = np.frombuffer(data, dtype='<u4', count=count, offset=4)
+        ends = (np.cumsum(lengths, dtype=np.int64) + 4 * (count + 1)).tolist()
+        starts = [end - length for end, length in zip(ends, lengths.tolist())]
+        self.strings = [data[start:end].decode('utf-8') for start, end in zip(starts, ends)]
+
+        key_table = np.frombuffer(sections['keys'], dtype='<u4').tolist()
+        self.key_sets = []
+        index = 0
+        while index < len(key_table):
+            count = key_table[index]
+            self.key_sets.append([self.strings[key] for key in key_table[index + 1:index + 1 + count]])
+            index += count + 1
+
+        self.data = sections['records']
+        self.offset = 0
+
+    def read(self):
+        """
+        :return: the next json-like value of the records
+        """
+        data = self.data
+        tag = data[self.offset]
+        if tag == NONE:
+            self.offset += 1
+            return None
+        elif tag == FALSE:
+            self.offset += 1
+            return False
+        elif tag == TRUE:
+            self.offset += 1
+            return True
+        elif tag == SMALL_INT:
+            value = small_int_struct.unpack_from(data, self.offset)[1]
+            self.offset += small_int_struct.size
+            return value
+        elif tag == INT:
+            value = int_struct.unpack_from(data, self.offset)[1]
+            self.offset += int_struct.size
+            return value
+        elif tag == BIG_INT:
+            length = big_int_struct.unpack_from(data, self.offset)[1]
+            self.offset += big_int_struct.size
+            value = int.from_bytes(data[self.offset:self.offset + length], 'little', signed=True)
+            self.offset += length
+            return value
+        elif tag == FLOAT:
+            value = float_struct.unpack_from(data, self.offset)[1]
+            self.offset += float_struct.size
+            return value
+
+        value_id = id_struct.unpack_from(data, self.offset)[1]
+        self.offset += id_struct.size
+        if tag == STRING:
+            return self.strings[value_id]
+        elif tag == LIST:
+            return [self.read() for i in range(value_id)]
+        elif tag == DICT:
+            return {key: self.read() for key in self.key_sets[value_id]}
+        raise ValueError('save file is damaged')
+
+
+def save_game(player, entities, game_map, message_log, game_state, game_weather, game_time,
+              filename='save_game.sav'):
+    data = get_save_data(player=player, entities=entities, game_map=game_map, message_log=message_log,
+                         game_state=game_state, game_weather=game_weather, game_time=game_time)
+    write_save_data(data=data, filename=filename)
+
+
+def get_save_data(player, entities, game_map, message_log, game_state, game_weather, game_time,
+                  journal_segment=None):
+    """
+    Snapshot the game (must be called from the thread that runs the game): everything but the tiles as json,
+    and a copy of the terrain arrays (the arrays the map was generated with never change, so are not copied)
+    On the open sea the changed chunks are staged in the chunk store instead, write_save_data writes them
+    :param journal_segment: int segment of the ActionJournal the actions after this snapshot are written to
+    :return: dict snapshot for write_save_data
+    """
+    world = game_map.world
+    chunk_snapshot = world.stage(game_map=game_map) if world is not None else None
+    return {
+        'game': get_game_data(player=player, entities=entities, game_map=game_map, message_log=message_log,
+                              game_state=game_state, game_weather=game_weather, game_time=game_time,
+                              journal_segment=journal_segment),
+        'terrain': game_map.terrain.copy() if world is None else None,
+        'base_terrain': game_map.base_terrain if world is None else None,
+        'chunk_store': world.store if world is not None else None,
+        'chunk_snapshot': chunk_snapshot
+    }
+
+
+def get_game_data(player, entities, game_map, message_log, game_state, game_weather, game_time,
+                  journal_segment=None):
+    """
+    The game as json, without the tiles (changes nothing, so can also be used to compare games)
+    :param journal_segment: int segment of the ActionJournal the actions after this snapshot are written to
+    :return: dict json of the game
+    """
+    return {
+        'player_index': entities.index(player),
+        'entities': [entity.to_json() for entity in entities],
+        'game_map': game_map.to_json(tiles=False),
+        'message_log': message_log.to_json(),
+        'game_state': game_state.value,
+        'game_weather': game_weather.to_json(),
+        'game_time': game_time.to_json(),
+        'journal_segment': journal_segment
+    }
+
+
+def write_save_data(data, filename='save_game.sav'):
+    """
+    Atomically write a save game snapshot in the binary save format: a header (magic, save version, number of
+    sections), then named sections, each compressed on its own:
+        'strings', 'keys', 'records': the json of the game as compact records (see RecordWriter)
+        'terrain.<field>', 'base_terrain.<field>': the raw terrain arrays, and the arrays as generated (if from a seed)
+    On the open sea the staged chunks are written first, and committed once the save is written
+    :param data: dict snapshot from get_save_data
+    :param filename: str name of the save file
+    :return: None
+    """
+    chunk_store = data['chunk_store']
+    if chunk_store is not None:
+        chunk_store.write(snapshot=data['chunk_snapshot'])
+
+    writer = RecordWriter()
+    writer.write(value=data['game'])
+    sections = {name: zlib.compress(section, 1) for name, section in writer.get_sections().items()}
+    for prefix in ('terrain', 'base_terrain'):
+        if data[prefix] is not None:
+            for field, packed in data[prefix].pack().items():
+                sections['{}.{}'.format(prefix, field)] = packed
+
+    temp_filename = filename + '.tmp'
+    with open(temp_filename, 'wb') as save_file:
+        save_file.write(file_header.pack(save_magic, save_version, len(sections)))
+        for name, section in sections.items():
+            encoded_name = name.encode('utf-8')
+            save_file.write(section_header.pack(len(encoded_name), len(section)))
+            save_file.write(encoded_name)
+            save_file.write(section)
+        save_file.flush()
+        os.fsync(save_file.fileno())
+    os.replace(temp_filename, filename)
+
+    if chunk_store is not None:
+        chunk_store.commit(snapshot=data['chunk_snapshot'])
+
+
+def read_sections(filename):
+    """
+    :param filename: str name of the save file
+    :return: dict of section name to compressed bytes
+    """
+    with open(filename, 'rb') as save_file:
+        data = save_file.read()
+    try:
+        magic, version, section_count = file_header.unpack_from(data, 0)
+    except struct.error:
+        raise ValueError('not a save file')
+    if magic != save_magic:
+        raise ValueError('not a save file')
+    if version != save_version:
+        raise ValueError('game was saved by a different version of the save format')
+
+    sections = {}
+    offset = file_header.size
+    try:
+        for i in range(section_count):
+            name_length, section_length = section_header.unpack_from(data, offset)
+            offset += section_header.size
+            name = data[offset:offset + name_length].decode('utf-8')
+            offset += name_length
+            sections[name] = data[offset:offset + section_length]
+            offset += section_length
+    except (struct.error, UnicodeDecodeError):
+        raise ValueError('save file is damaged')
+    return sections
+
+
+def load_game(filename='save_game.sav'):
+    data, sections = read_save(filename=filename)
+    return unpack_game(data=data, sections=sections)
+
+
+def read_save(filename):
+    """
+    :param filename: str name of the save file
+    :return: dict json of the game (without the tiles), dict of section name to compressed bytes
+    """
+    sections = read_sections(filename=filename)
+    try:
+        records = RecordReader(sections={name: zlib.decompress(sections[name]) for name in
+                                         ('strings', 'keys', 'records')})
+        return records.read(), sections
+    except (KeyError, IndexError, struct.error, zlib.error, UnicodeDecodeError):
+        raise ValueError('save file is damaged')
+
+
+def unpack_game(data, sections):
+    """
+    :param data: dict json of the game from read_save
+    :param sections: dict of section name to compressed bytes from read_save
+    :return: player, entities, game_map, message_log, game_state, game_weather, game_time
+    """
+    player_index = data['player_index']
+    entities_json = data['entities']
+    game_map_json = data['game_map']
+    message_log_json = data['message_log']
+    game_state_json = data['game_state']
+    game_weather_json = data['game_weather']
+    game_time_json = data['game_time']
+
+    entities = [Entity.from_json(json_data=entity_json) for entity_json in entities_json]
+    player = entities[player_index]
+    if game_map_json.get('world'):
+        game_map = ChunkedWorld.map_from_json(json_data=game_map_json)
+    else:
+        width = game_map_json.get('width')
+        height = game_map_json.get('height')
+        terrain = get_terrain(sections=sections, prefix='terrain', width=width, height=height)
+        base_terrain = get_terrain(sections=sections, prefix='base_terrain', width=width, height=height)
+        game_map = GameMap.from_json(json_data=game_map_json, terrain=terrain, base_terrain=base_terrain)
+    message_log = MessageLog.from_json(json_data=message_log_json)
+    game_state = GameStates(game_state_json)
+    game_weather = Weather.from_json(json_data=game_weather_json)
+    game_time = Time.from_json(json_data=game_time_json)
+
+    return player, entities, game_map, message_log, game_state, game_weather, game_time
+
+
+def get_terrain(sections, prefix, width, height):
+    """
+    :param sections: dict of section name to compressed bytes
+    :param prefix: str 'terrain' or 'base_terrain'
+    :param width: int width of the map
+    :param height: int height of the map
+    :return: TerrainGrid, or None if it was not saved
+    """
+    packed = {name.split('.', 1)[1]: section for name, section in sections.items() if name.startswith(prefix + '.')}
+    if not packed:
+        return None
+    try:
+        return TerrainGrid.unpack(width=width, height=height, packed=packed)
+    except (KeyError, ValueError, zlib.error):
+        raise ValueError('save file is damaged')
@@ -1,5 +1,4 @@
 import pygame
-from random import randint
 
 from components.cargo import Cargo, Item, ItemCategory
 from components.crew import Crew
@@ -13,9 +12,12 @@ from entity import Entity
 from game_messages import MessageLog
 from weather import Weather
 from game_time import Time
-from render_functions import RenderOrder
+from render_order import RenderOrder
 from game_states import GameStates
+from loader_functions.asset_manager import CachedFont, IconAtlas, TextCache
+from map_objects.chunked_map import make_chunked_map
 from map_objects.game_map import make_map
+from map_objects.map_generator import get_terrain_generator
 
 
 def get_constants():
@@ -25,6 +27,22 @@ def get_constants():
     """
     frames_per_second = 60  # frames per second, the general speed of the program
     tick = 5  # number of minutes of game time that pass each turn
+    autosave_turns = 10  # number of turns between autosaves
+    autosave_seconds = 60  # number of seconds between autosaves
+    journal = True  # journal every action between autosaves, so a crash loses no turns (they are replayed on load)
+    export_json = False  # also write the game to save_game.json (readable, for debugging) when quitting
+    record = None  # file name to record each new game to, for replay.py (None to not record)
+    profile = False  # time each phase of the turn from the start (F3 toggles this in game)
+    profile_window = 100  # number of recent turns used for the timing percentiles
+    profile_trace = None  # file name to append a JSON line of phase timings to each turn while profiling
+    seed = None  # world seed, the same seed always generates the same world (None for a new world each game)
+    open_sea = False  # sail an endless sea of chunks generated as you go, instead of a single board
+    chunk_size = 16  # width and height of an open sea chunk (even, and dividing the board width and height)
+    max_chunks = 64  # number of open sea chunks kept in memory, the rest are written to the chunk store
+    chunk_store = 'chunks'  # folder the open sea chunks are written to
+    pregenerated_maps = 1  # number of new game maps generated ahead in a background process (0 to generate when needed)
+    icon_cache = 'icons.cache'  # file the decoded icon atlas is cached in, for a faster start (None for no cache)
+    text_cache_size = 1024  # number of rendered texts (labels, messages, numbers) kept between frames
     
     margin = 5
     tab = 75
@@ -56,8 +74,12 @@ def get_constants():
     board_height = board_width
     island_size = board_height // 8 * 5
     island_seeds = board_height
+    terrain_generator = 'drunk_walk'  # 'drunk_walk' islands, or 'noise' (much faster on large boards)
+    noise_feature_size = 24  # width in tiles of the largest noise islands
+    noise_octaves = 4  # number of octaves of noise, each adding smaller detail
+    land_fraction = 0.1  # share of the board that is land with noise terrain
     
-    font = pygame.font.Font('freesansbold.ttf', 16)
+    font = CachedFont(filename='freesansbold.ttf', size=16, cache=TextCache(max_entries=text_cache_size))
     
     max_entities = board_width // 4
     
@@ -93,79 +115,99 @@ def get_constants():
         'amber': (200, 150, 40),
     }
     
-    icons = {
+    icon_files = {
         # misc game icons 32x32
-        'game_icon': pygame.image.load('icons/misc/Compass.png'),
-        'shade': pygame.image.load('icons/misc/Shade.png'),
-        'highlight': pygame.image.load('icons/misc/Highlight.png'),
-        'pointer': pygame.image.load('icons/misc/Pointer.png'),
-        'compass': pygame.image.load('icons/misc/Compass.png'),
-        'arrow': pygame.image.load('icons/misc/Arrow.png'),
-        'fog': pygame.image.load('icons/misc/Fog.png'),
-        'calm': pygame.image.load('icons/misc/Sky.png'),
-        'hazy': pygame.image.load('icons/misc/Haze.png'),
-        'cloudy': pygame.image.load('icons/misc/Cloud.png'),
-        'rainy': pygame.image.load('icons/misc/Rain.png'),
-        'stormy': pygame.image.load('icons/misc/Storm.png'),
+        'game_icon': 'icons/misc/Compass.png',
+        'shade': 'icons/misc/Shade.png',
+        'highlight': 'icons/misc/Highlight.png',
+        'pointer': 'icons/misc/Pointer.png',
+        'compass': 'icons/misc/Compass.png',
+        'arrow': 'icons/misc/Arrow.png',
+        'fog': 'icons/misc/Fog.png',
+        'calm': 'icons/misc/Sky.png',
+        'hazy': 'icons/misc/Haze.png',
+        'cloudy': 'icons/misc/Cloud.png',
+        'rainy': 'icons/misc/Rain.png',
+        'stormy': 'icons/misc/Storm.png',
         # misc game icons 16x16
-        'sun': pygame.image.load('icons/misc/Sun.png'),
-        'moon': pygame.image.load('icons/misc/Moon.png'),
-        'moon_shadow': pygame.image.load('icons/misc/MoonShadow.png'),
+        'sun': 'icons/misc/Sun.png',
+        'moon': 'icons/misc/Moon.png',
+        'moon_shadow': 'icons/misc/MoonShadow.png',
         # terrain icons 42x42
-        'deep_sea': pygame.image.load('icons/terrain/DeepSea.png'),
-        'sea': pygame.image.load('icons/terrain/Sea.png'),
-        'shallows': pygame.image.load('icons/terrain/Shallows.png'),
-        'dunes': pygame.image.load('icons/terrain/Dunes.png'),
-        'grassland': pygame.image.load('icons/terrain/Grassland.png'),
-        'jungle': pygame.image.load('icons/terrain/Jungle.png'),
-        'mountain': pygame.image.load('icons/terrain/Mountain.png'),
-        'volcano': pygame.image.load('icons/terrain/Volcano.png'),
+        'deep_sea': 'icons/terrain/DeepSea.png',
+        'sea': 'icons/terrain/Sea.png',
+        'shallows': 'icons/terrain/Shallows.png',
+        'dunes': 'icons/terrain/Dunes.png',
+        'grassland': 'icons/terrain/Grassland.png',
+        'jungle': 'icons/terrain/Jungle.png',
+        'mountain': 'icons/terrain/Mountain.png',
+        'volcano': 'icons/terrain/Volcano.png',
         # entity icons 32x32
-        'ship_0_mast': pygame.image.load('icons/entities/Ship_0_mast.png'),
-        'ship_1_mast': pygame.image.load('icons/entities/Ship_1_mast.png'),
-        'ship_2_mast': pygame.image.load('icons/entities/Ship_2_mast.png'),
-        'ship_3_mast': pygame.image.load('icons/entities/Ship_3_mast.png'),
-        'ship_4_mast': pygame.image.load('icons/entities/Ship_4_mast.png'),
-        'port': pygame.image.load('icons/entities/Port.png'),
-        'seaweed': pygame.image.load('icons/entities/Seaweed.png'),
-        'sandbar': pygame.image.load('icons/entities/Sandbar.png'),
-        'rocks': pygame.image.load('icons/entities/Rocks.png'),
-        'coral': pygame.image.load('icons/entities/Coral.png'),
-        'salvage': pygame.image.load('icons/entities/Salvage.png'),
-        'sea_serpent': pygame.image.load('icons/entities/SeaSerpent.png'),
-        'sea_turtle': pygame.image.load('icons/entities/SeaTurtle.png'),
-        'red_dragon': pygame.image.load('icons/entities/RedDragon.png'),
-        'wyvern': pygame.image.load('icons/entities/Wyvern.png'),
-        'giant_bat': pygame.image.load('icons/entities/GiantBat.png'),
-        'carcass': pygame.image.load('icons/entities/Carcass.png'),
-        'sunken_ship': pygame.image.load('icons/entities/SunkenShip.png'),
+        'ship_0_mast': 'icons/entities/Ship_0_mast.png',
+        'ship_1_mast': 'icons/entities/Ship_1_mast.png',
+        'ship_2_mast': 'icons/entities/Ship_2_mast.png',
+        'ship_3_mast': 'icons/entities/Ship_3_mast.png',
+        'ship_4_mast': 'icons/entities/Ship_4_mast.png',
+        'port': 'icons/entities/Port.png',
+        'seaweed': 'icons/entities/Seaweed.png',
+        'sandbar': 'icons/entities/Sandbar.png',
+        'rocks': 'icons/entities/Rocks.png',
+        'coral': 'icons/entities/Coral.png',
+        'salvage': 'icons/entities/Salvage.png',
+        'sea_serpent': 'icons/entities/SeaSerpent.png',
+        'sea_turtle': 'icons/entities/SeaTurtle.png',
+        'red_dragon': 'icons/entities/RedDragon.png',
+        'wyvern': 'icons/entities/Wyvern.png',
+        'giant_bat': 'icons/entities/GiantBat.png',
+        'carcass': 'icons/entities/Carcass.png',
+        'sunken_ship': 'icons/entities/SunkenShip.png',
+    }
+    # only shown in the cargo and port menus
+    lazy_icon_files = {
         # inventory icons 16x16
-        'bat_wing': pygame.image.load('icons/inventory/BatWing.png'),
-        'bread': pygame.image.load('icons/inventory/Breads.png'),
-        'brick': pygame.image.load('icons/inventory/Brick.png'),
-        'canvas': pygame.image.load('icons/inventory/Canvas.png'),
-        'fish': pygame.image.load('icons/inventory/Fish.png'),
-        'fruit': pygame.image.load('icons/inventory/Fruit.png'),
-        'grain': pygame.image.load('icons/inventory/Grains.png'),
-        'leather': pygame.image.load('icons/inventory/Leather.png'),
-        'meat': pygame.image.load('icons/inventory/Meat.png'),
-        'tar': pygame.image.load('icons/inventory/Tar.png'),
-        'obsidian': pygame.image.load('icons/inventory/Obsidian.png'),
-        'pearl': pygame.image.load('icons/inventory/Pearl.png'),
-        'rope': pygame.image.load('icons/inventory/Rope.png'),
-        'rum': pygame.image.load('icons/inventory/Rum.png'),
-        'salt': pygame.image.load('icons/inventory/Salt.png'),
-        'serpent_scale': pygame.image.load('icons/inventory/SerpentScale.png'),
-        'skins': pygame.image.load('icons/inventory/Skins.png'),
-        'stone': pygame.image.load('icons/inventory/Stone.png'),
-        'turtle_shell': pygame.image.load('icons/inventory/TurtleShell.png'),
-        'water': pygame.image.load('icons/inventory/Water.png'),
-        'wood': pygame.image.load('icons/inventory/wood.png'),
+        'bat_wing': 'icons/inventory/BatWing.png',
+        'bread': 'icons/inventory/Breads.png',
+        'brick': 'icons/inventory/Brick.png',
+        'canvas': 'icons/inventory/Canvas.png',
+        'fish': 'icons/inventory/Fish.png',
+        'fruit': 'icons/inventory/Fruit.png',
+        'grain': 'icons/inventory/Grains.png',
+        'leather': 'icons/inventory/Leather.png',
+        'meat': 'icons/inventory/Meat.png',
+        'tar': 'icons/inventory/Tar.png',
+        'obsidian': 'icons/inventory/Obsidian.png',
+        'pearl': 'icons/inventory/Pearl.png',
+        'rope': 'icons/inventory/Rope.png',
+        'rum': 'icons/inventory/Rum.png',
+        'salt': 'icons/inventory/Salt.png',
+        'serpent_scale': 'icons/inventory/SerpentScale.png',
+        'skins': 'icons/inventory/Skins.png',
+        'stone': 'icons/inventory/Stone.png',
+        'turtle_shell': 'icons/inventory/TurtleShell.png',
+        'water': 'icons/inventory/Water.png',
+        'wood': 'icons/inventory/wood.png',
     }
+    icons = IconAtlas(files=icon_files, lazy_files=lazy_icon_files, cache_filename=icon_cache)
     
     constants = {
         'FPS': frames_per_second,
         'tick': tick,
+        'autosave_turns': autosave_turns,
+        'autosave_seconds': autosave_seconds,
+        'journal': journal,
+        'export_json': export_json,
+        'record': record,
+        'profile': profile,
+        'profile_window': profile_window,
+        'profile_trace': profile_trace,
+        'seed': seed,
+        'open_sea': open_sea,
+        'chunk_size': chunk_size,
+        'max_chunks': max_chunks,
+        'chunk_store': chunk_store,
+        'pregenerated_maps': pregenerated_maps,
+        'icon_cache': icon_cache,
+        'text_cache_size': text_cache_size,
         'display_title': display_title,
         'display_width': display_width,
         'display_height': display_height,
@@ -184,6 +226,10 @@ def get_constants():
         'board_height': board_height,
         'island_size': island_size,
         'island_seeds': island_seeds,
+        'terrain_generator': terrain_generator,
+        'noise_feature_size': noise_feature_size,
+        'noise_octaves': noise_octaves,
+        'land_fraction': land_fraction,
         'view_width': view_width,
         'view_height': view_height,
         'map_width': map_width,
@@ -200,13 +246,56 @@ def get_constants():
     return constants
 
 
-def get_game_variables(constants):
+def get_game_variables(constants, map_pipeline=None):
 
     game_time = Time(constants['tick'])
     game_weather = Weather()
 
     message_log = MessageLog(height=constants['log_size'], panel_size=constants['message_panel_size'], view_pointer=0)
 
+    entities = []
+
+    if constants['open_sea']:
+        game_map = make_chunked_map(width=constants['board_width'],
+                                    height=constants['board_height'],
+                                    entities=entities,
+                                    max_entities=constants['max_entities'],
+                                    constants=constants,
+                                    game_time=game_time,
+                                    game_weather=game_weather,
+                                    seed=constants['seed'])
+    elif map_pipeline is not None:
+        # pre-generated in the background
+        game_map, entities = map_pipeline.next_map()
+    else:
+        game_map = make_map(width=constants['board_width'],
+                            height=constants['board_height'],
+                            entities=entities,
+                            max_entities=constants['max_entities'],
+                            islands=constants['island_size'],
+                            seeds=constants['island_seeds'],
+                            constants=constants,
+                            game_time=game_time,
+                            game_weather=game_weather,
+                            seed=constants['seed'],
+                            terrain_generator=get_terrain_generator(constants=constants))
+
+    player = make_player(constants=constants, rng=game_map.rng)
+    entities.insert(0, player)
+
+    player.view.set_fov(game_map=game_map, game_time=game_time, game_weather=game_weather)
+    game_state = GameStates.CURRENT_TURN
+
+    return player, entities, game_map, message_log, game_state, game_weather, game_time
+
+
+def make_player(constants, rng):
+    """
+    Create the player's starting ship, placed somewhere along the bottom of the board
+    :param constants: dict game constants
+    :param rng: WorldRandom stream of the map the player starts on
+    :return: player Entity
+    """
     player_icon = 'ship_1_mast'
     size_component = Size.SMALL
     manifest = []
@@ -240,25 +329,9 @@ def get_game_variables(constants):
     mast_component = Masts(name="Mast", masts=size_component.value, size=size_component.value,
                            sail_repair_with=["Canvas", "Rope"], mast_repair_with=["Wood", "Rope"])
     mobile_component = Mobile(direction=0, max_momentum=int(size_component.value) * 2 + 2)
-    crew_component = Crew(max_crew=size_component.value * 10 + 5, crew_count=50)
-    player = Entity(name='player', x=randint(constants['board_width'] // 4, constants['board_width'] * 3 // 4),
+    crew_component = Crew(max_crew=size_component.value * 10 + 5, crew_count=50, rng=rng)
+    player = Entity(name='player', x=rng.randint(constants['board_width'] // 4, constants['board_width'] * 3 // 4),
                     y=constants['board_height'] - 1, icon=player_icon, render_order=RenderOrder.PLAYER,
                     view=view_component, size=size_component, mast_sail=mast_component, mobile=mobile_component,
                     weapons=weapons_component, fighter=fighter_component, crew=crew_component, cargo=cargo_component)
-
-    entities = [player]
-
-    game_map = make_map(width=constants['board_width'],
-                        height=constants['board_height'],
-                        entities=entities,
-                        max_entities=constants['max_entities'],
-                        islands=constants['island_size'],
-                        seeds=constants['island_seeds'],
-                        constants=constants,
-                        game_time=game_time,
-                        game_weather=game_weather)
-
-    player.view.set_fov(game_map=game_map, game_time=game_time, game_weather=game_weather)
-    game_state = GameStates.CURRENT_TURN
-
-    return player, entities, game_map, message_log, game_state, game_weather, game_time
+    return player
@@ -0,0 +1,139 @@
+import json
+import os
+import zlib
+
+from loader_functions.binary_loaders import read_save, unpack_game
+from turn_engine import TurnEngine
+
+
+class ActionJournal:
+    def __init__(self, filename='save_game.journal'):
+        """
+        Append-only log of every player action (the dict from handle_keys) that changed the game in the TurnEngine,
+        each with a checkpoint of the map's random stream after the action. The log is split into segments: each
+        autosave snapshot starts a new segment (and records its number), and the older segments are removed once the
+        snapshot is written. After a crash the game is recovered by loading the snapshot and replaying its segments
+        (see recover_game), so no turns are lost between snapshots
+        :param filename: str name of the journal, segments are written to <filename>.<segment number>
+        """
+        self.filename = filename
+        segments = self.get_segments()
+        # never append to the segments of an earlier game, they are removed after the first snapshot
+        self.segment = segments[-1] + 1 if segments else 0
+        self.journal_file = None
+
+    def get_segment_filename(self, segment: int):
+        return '{}.{}'.format(self.filename, segment)
+
+    def get_segments(self):
+        """
+        :return: sorted list of the numbers of the segments on disk
+        """
+        directory, name = os.path.split(os.path.abspath(self.filename))
+        segments = []
+        if os.path.isdir(directory):
+            for filename in os.listdir(directory):
+                prefix, _, suffix = filename.rpartition('.')
+                if prefix == name and suffix.isdigit():
+                    segments.append(int(suffix))
+        return sorted(segments)
+
+    def append(self, action: dict, game_map):
+        """
+        Write an action to the current segment, flushed to disk before the next action is handled
+        :param action: dict of translated commands that was given to TurnEngine.step
+        :param game_map: GameMap after the action (for the checkpoint of its random stream)
+        :return: None
+        """
+        if self.journal_file is None:
+            self.journal_file = open(self.get_segment_filename(segment=self.segment), 'a')
+        self.journal_file.write(json.dumps({'action': action, 'checkpoint': get_checkpoint(rng=game_map.rng)}))
+        self.journal_file.write('\n')
+        self.journal_file.flush()
+        os.fsync(self.journal_file.fileno())
+
+    def start_segment(self):
+        """
+        Start a new segment, called when a snapshot is taken: the actions after it go to the new segment
+        :return: int number of the new segment
+        """
+        self.close()
+        self.segment += 1
+        return self.segment
+
+    def remove_segments(self, segment: int):
+        """
+        Remove the segments before a segment, once a snapshot that starts at that segment has been written
+        (may be called from the autosave thread, the segments before the current one are no longer written to)
+        :param segment: int segment number recorded in the snapshot
+        :return: None
+        """
+        for old_segment in self.get_segments():
+            if old_segment < segment:
+                try:
+                    os.remove(self.get_segment_filename(segment=old_segment))
+                except OSError as error:
+                    print("Journal Error! {}".format(error))
+
+    def read_actions(self, segment: int):
+        """
+        The journaled actions from a segment on, oldest first (a last line cut short by a crash is skipped)
+        :param segment: int first segment to read
+        :return: list of dicts of 'action' and 'checkpoint'
+        """
+        entries = []
+        for journal_segment in self.get_segments():
+            if journal_segment < segment:
+                continue
+            with open(self.get_segment_filename(segment=journal_segment)) as journal_file:
+                for line in journal_file:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        break
+        return entries
+
+    def close(self):
+        if self.journal_file is not None:
+            self.journal_file.close()
+            self.journal_file = None
+
+
+def get_checkpoint(rng):
+    """
+    Checksum of the state of a WorldRandom (both its python and numpy streams), so a replay can tell if it has
+    drifted from the game that was played
+    :param rng: WorldRandom
+    :return: int crc32 checksum
+    """
+    return zlib.crc32(repr((rng.getstate(), rng.array.bit_generator.state)).encode('utf-8'))
+
+
+def recover_game(colors: dict, filename='save_game.sav', journal_filename='save_game.journal', map_pipeline=None):
+    """
+    Load the last snapshot, then replay the actions journaled after it through the TurnEngine
+    Replaying stops early if a checkpoint does not match (the replay has drifted from the game that was played,
+    ex: the journal belongs to a different snapshot)
+    :param colors: dict of color values for the message log
+    :param filename: str name of the save file
+    :param journal_filename: str name of the journal
+    :param map_pipeline: MapPipeline the next map is taken from, if the player sailed off the board after the snapshot
+    :return: player, entities, game_map, message_log, game_state, game_weather, game_time
+    """
+    data, sections = read_save(filename=filename)
+    player, entities, game_map, message_log, game_state, game_weather, game_time = unpack_game(data=data,
+                                                                                               sections=sections)
+    segment = data.get('journal_segment')
+    if segment is None:
+        return player, entities, game_map, message_log, game_state, game_weather, game_time
+
+    turn_engine = TurnEngine(player=player, entities=entities, game_map=game_map, message_log=message_log,
+                             game_state=game_state, game_weather=game_weather, game_time=game_time, colors=colors,
+                             map_pipeline=map_pipeline)
+    for entry in ActionJournal(filename=journal_filename).read_actions(segment=segment):
+        turn_engine.step(action=entry['action'])
+        if get_checkpoint(rng=turn_engine.game_map.rng) != entry['checkpoint']:
+            print("Journal Error! replay does not match the journal, stopping")
+            break
+    return turn_engine.player, turn_engine.entities, turn_engine.game_map, turn_engine.message_log, \
+        turn_engine.game_state, turn_engine.game_weather, turn_engine.game_time
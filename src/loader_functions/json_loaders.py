@@ -1,15 +1,35 @@
 import json
+import os
 
 from entity import Entity
 from game_messages import MessageLog
 from game_states import GameStates
 from game_time import Time
+from map_objects.chunked_map import ChunkedWorld
 from map_objects.game_map import GameMap
 from weather import Weather
 
 
-def save_game(player, entities, game_map, message_log, game_state, game_weather, game_time):
-    data = {
+def save_game(player, entities, game_map, message_log, game_state, game_weather, game_time,
+              filename='save_game.json'):
+    # on the open sea the changed chunks are written before the save that needs them, and committed after it
+    world = game_map.world
+    chunk_snapshot = world.stage(game_map=game_map) if world is not None else None
+    data = get_save_data(player=player, entities=entities, game_map=game_map, message_log=message_log,
+                         game_state=game_state, game_weather=game_weather, game_time=game_time)
+    if world is not None:
+        world.store.write(snapshot=chunk_snapshot)
+    write_save_data(data=data, filename=filename)
+    if world is not None:
+        world.store.commit(snapshot=chunk_snapshot)
+
+
+def get_save_data(player, entities, game_map, message_log, game_state, game_weather, game_time):
+    """
+    Snapshot the game into a json serializable dict (must be called from the thread that runs the game)
+    :return: dict of serialized game objects
+    """
+    return {
         'player_index': entities.index(player),
         'entities': [entity.to_json() for entity in entities],
         'game_map': game_map.to_json(),
@@ -18,13 +38,25 @@ def save_game(player, entities, game_map, message_log, game_state, game_weather,
         'game_weather': game_weather.to_json(),
         'game_time': game_time.to_json()
     }
-    
-    with open('save_game.json', 'w') as save_file:
+
+
+def write_save_data(data, filename='save_game.json'):
+    """
+    Atomically write a save game snapshot: dump to a temp file, then rename it over the old save
+    :param data: dict snapshot from get_save_data
+    :param filename: str name of the save file
+    :return: None
+    """
+    temp_filename = filename + '.tmp'
+    with open(temp_filename, 'w') as save_file:
         json.dump(data, save_file, indent=4)
+        save_file.flush()
+        os.fsync(save_file.fileno())
+    os.replace(temp_filename, filename)
 
 
-def load_game():
-    with open('save_game.json') as save_file:
+def load_game(filename='save_game.json'):
+    with open(filename) as save_file:
         data = json.load(save_file)
     
     player_index = data['player_index']
@@ -37,7 +69,10 @@ def load_game():
     
     entities = [Entity.from_json(json_data=entity_json) for entity_json in entities_json]
     player = entities[player_index]
-    game_map = GameMap.from_json(json_data=game_map_json)
+    if game_map_json.get('world'):
+        game_map = ChunkedWorld.map_from_json(json_data=game_map_json)
+    else:
+        game_map = GameMap.from_json(json_data=game_map_json)
     message_log = MessageLog.from_json(json_data=message_log_json)
     game_state = GameStates(game_state_json)
     game_weather = Weather.from_json(json_data=game_weather_json)
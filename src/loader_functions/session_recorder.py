@@ -0,0 +1,100 @@
+import hashlib
+import json
+
+from loader_functions.binary_loaders import get_game_data
+from loader_functions.journal import get_checkpoint
+from map_objects.tile import terrain_fields
+
+# bumped whenever the layout of the recording changes, recordings of other versions are not replayed
+recording_version = 2
+
+# the constants a new game is built from, recorded so a replay builds the same world
+recorded_constants = ('tick', 'board_width', 'board_height', 'island_size', 'island_seeds', 'max_entities',
+                      'terrain_generator', 'noise_feature_size', 'noise_octaves', 'land_fraction', 'open_sea',
+                      'chunk_size', 'max_chunks')
+
+
+class SessionRecorder:
+    def __init__(self, filename: str, constants: dict, seed: int):
+        """
+        Records a new game as its world seed, the constants it was built with, and every action (the dict from
+        handle_keys) that changed the game in the TurnEngine, so replay.py can play the session again without a display
+        The recording is JSON lines: a header, one line per action (with a checkpoint of the map's random stream,
+        so a replay can tell where it drifted), and the hash of the final state once the game is closed
+        :param filename: str name of the recording (overwritten)
+        :param constants: dict game constants the new game was built with
+        :param seed: int world seed of the new game's map
+        """
+        self.filename = filename
+        self.record_file = open(filename, 'w')
+        self.write(line={'version': recording_version,
+                         'seed': seed,
+                         'constants': {name: constants[name] for name in recorded_constants}})
+
+    def write(self, line: dict):
+        # flushed so a recording of a session that crashed can still be replayed up to the crash
+        self.record_file.write(json.dumps(line))
+        self.record_file.write('\n')
+        self.record_file.flush()
+
+    def record(self, action: dict, game_map):
+        """
+        :param action: dict of translated commands that was given to TurnEngine.step
+        :param game_map: GameMap after the action (for the checkpoint of its random stream)
+        :return: None
+        """
+        self.write(line={'action': action, 'checkpoint': get_checkpoint(rng=game_map.rng)})
+
+    def close(self, state_hash: str = None):
+        """
+        :param state_hash: str hash of the game when it was closed (see get_state_hash)
+        :return: None
+        """
+        if self.record_file is not None:
+            self.write(line={'state_hash': state_hash})
+            self.record_file.close()
+            self.record_file = None
+
+
+def read_recording(filename: str):
+    """
+    :param filename: str name of the recording
+    :return: dict header (version, seed, constants), list of dicts of 'action' and 'checkpoint',
+             str hash of the final state (None if the session did not close)
+    """
+    with open(filename) as record_file:
+        lines = []
+        for line in record_file:
+            try:
+                lines.append(json.loads(line))
+            except ValueError:
+                # cut short by a crash
+                break
+    if not lines or lines[0].get('version') != recording_version:
+        raise ValueError('not a recording of this version of the game')
+
+    header = lines[0]
+    entries = [line for line in lines[1:] if 'action' in line]
+    state_hash = lines[-1].get('state_hash') if len(lines) > 1 else None
+    return header, entries, state_hash
+
+
+def get_state_hash(player, entities, game_map, message_log, game_state, game_weather, game_time):
+    """
+    Hash of everything the simulation decides (entities, map, terrain, random streams, log, weather and time), two
+    runs of the same actions on the same seed hash the same
+    Left out are the message log's scroll position (moved by the mouse, not by actions), and the open sea chunk store
+    folder and snapshot count (which depend on how often the game was saved). Nothing is saved or changed
+    :return: str hex sha256 of the game
+    """
+    game = get_game_data(player=player, entities=entities, game_map=game_map, message_log=message_log,
+                         game_state=game_state, game_weather=game_weather, game_time=game_time)
+    del game['message_log']['view_pointer']
+    if 'world' in game['game_map']:
+        del game['game_map']['world']['store']
+        del game['game_map']['world']['snapshot']
+
+    digest = hashlib.sha256(json.dumps(game, sort_keys=True).encode('utf-8'))
+    for field in terrain_fields:
+        digest.update(getattr(game_map.terrain, field).tobytes())
+    return digest.hexdigest()
@@ -0,0 +1,507 @@
+import json
+import os
+from collections import OrderedDict
+from threading import Lock
+
+import numpy as np
+
+from entity import Entity
+from map_objects.game_map import GameMap, generate_world, place_entities
+from map_objects.map_generator import DrunkWalkGenerator
+from map_objects.tile import TerrainGrid, terrain_fields
+from random_utils import WorldRandom, new_seed
+
+
+class ChunkStore:
+    def __init__(self, directory: str):
+        """
+        Folder of chunks that have been evicted from memory, one numpy .npz file per chunk: its terrain arrays, and
+        the entities left in it (as json, with coordinates inside the chunk)
+        Chunks evicted between saves are written to a 'pending' folder inside it. When the game is saved, the pending
+        folder and a copy of the changed chunks in memory are staged as a numbered snapshot, and only join the saved
+        chunks once the save game has been written, so the folder always matches the last save game (which is what
+        the action journal is replayed from)
+        Staging happens on the thread that runs the game, writing and committing on the autosave worker, so the
+        store is guarded by a lock
+        :param directory: str path of the folder (created when the first chunk is saved)
+        """
+        self.directory = directory
+        self.pending_directory = os.path.join(directory, 'pending')
+        # snapshot number: {(chunk_x, chunk_y): (TerrainGrid, list of entity json)}, not yet committed
+        self.staged = OrderedDict()
+        self.lock = Lock()
+
+    def get_snapshot_directory(self, snapshot: int):
+        return os.path.join(self.directory, 'snapshot_{}'.format(snapshot))
+
+    def get_filename(self, chunk_x: int, chunk_y: int, directory: str = None):
+        return os.path.join(directory if directory is not None else self.directory,
+                            'chunk_{}_{}.npz'.format(chunk_x, chunk_y))
+
+    def find(self, chunk_x: int, chunk_y: int):
+        """
+        Find the newest copy of a chunk (the store's lock must be held): pending, then the staged snapshots from
+        newest to oldest, then saved
+        :param chunk_x: int x coordinate of the chunk
+        :param chunk_y: int y coordinate of the chunk
+        :return: tuple (TerrainGrid, list of entity json) of a staged chunk that is not written yet,
+                 or str file name of the chunk, or None if the chunk has never been saved
+        """
+        filename = self.get_filename(chunk_x=chunk_x, chunk_y=chunk_y, directory=self.pending_directory)
+        if os.path.exists(filename):
+            return filename
+        for snapshot in reversed(self.staged):
+            staged = self.staged[snapshot].get((chunk_x, chunk_y))
+            if staged is not None:
+                return staged
+            filename = self.get_filename(chunk_x=chunk_x, chunk_y=chunk_y,
+                                         directory=self.get_snapshot_directory(snapshot=snapshot))
+            if os.path.exists(filename):
+                return filename
+        filename = self.get_filename(chunk_x=chunk_x, chunk_y=chunk_y)
+        if os.path.exists(filename):
+            return filename
+        return None
+
+    def has(self, chunk_x: int, chunk_y: int):
+        """
+        :param chunk_x: int x coordinate of the chunk
+        :param chunk_y: int y coordinate of the chunk
+        :return: boolean True if the chunk has been saved
+        """
+        with self.lock:
+            return self.find(chunk_x=chunk_x, chunk_y=chunk_y) is not None
+
+    def save(self, chunk_x: int, chunk_y: int, chunk, entities: list, directory: str):
+        """
+        Atomically write a chunk: dump to a temp file, then rename it over the old chunk
+        :param chunk_x: int x coordinate of the chunk
+        :param chunk_y: int y coordinate of the chunk
+        :param chunk: TerrainGrid of the chunk
+        :param entities: list of json of the entities in the chunk
+        :param directory: str folder the chunk is written to (pending, or a staged snapshot)
+        :return: None
+        """
+        os.makedirs(directory, exist_ok=True)
+        filename = self.get_filename(chunk_x=chunk_x, chunk_y=chunk_y, directory=directory)
+        temp_filename = filename + '.tmp'
+        with open(temp_filename, 'wb') as chunk_file:
+            np.savez(chunk_file, entities=np.array(json.dumps(entities)),
+                     **{field: getattr(chunk, field) for field in terrain_fields})
+        os.replace(temp_filename, filename)
+
+    def evict(self, chunk_x: int, chunk_y: int, chunk, entities: list):
+        """
+        Write a changed chunk that is dropped from memory to the pending folder
+        :param chunk_x: int x coordinate of the chunk
+        :param chunk_y: int y coordinate of the chunk
+        :param chunk: TerrainGrid of the chunk
+        :param entities: list of json of the entities in the chunk
+        :return: None
+        """
+        self.save(chunk_x=chunk_x, chunk_y=chunk_y, chunk=chunk, entities=entities, directory=self.pending_directory)
+
+    def load(self, chunk_x: int, chunk_y: int):
+        """
+        :param chunk_x: int x coordinate of the chunk
+        :param chunk_y: int y coordinate of the chunk
+        :return: TerrainGrid of the chunk, list of json of the entities in the chunk
+        """
+        with self.lock:
+            found = self.find(chunk_x=chunk_x, chunk_y=chunk_y)
+            if isinstance(found, tuple):
+                # the staged copy is written by the autosave worker, so it must not change
+                chunk, entities = found
+                return chunk.copy(), list(entities)
+            with np.load(found) as arrays:
+                width, height = arrays['elevation'].shape
+                entities = json.loads(str(arrays['entities'])) if 'entities' in arrays.files else []
+                return TerrainGrid(width=width, height=height,
+                                   **{field: arrays[field] for field in terrain_fields}), entities
+
+    def stage(self, snapshot: int, chunks: dict):
+        """
+        Stage a snapshot of the store when the game is saved (on the thread that runs the game, no chunk is written):
+        the pending folder is renamed to the snapshot's folder, and the changed chunks in memory are kept with it
+        :param snapshot: int number of the snapshot
+        :param chunks: dict of (chunk_x, chunk_y): (TerrainGrid copy, list of entity json) of the changed chunks
+        :return: None
+        """
+        with self.lock:
+            if os.path.isdir(self.pending_directory):
+                os.replace(self.pending_directory, self.get_snapshot_directory(snapshot=snapshot))
+            self.staged[snapshot] = chunks
+
+    def get_staged(self, snapshot: int):
+        """
+        :param snapshot: int number of a staged snapshot
+        :return: list of (snapshot number, dict of chunks) of the staged snapshots up to it, oldest first
+                 (older snapshots are still staged if writing their save game failed)
+        """
+        with self.lock:
+            return [(number, chunks) for number, chunks in self.staged.items() if number <= snapshot]
+
+    def write(self, snapshot: int):
+        """
+        Write the changed chunks of a staged snapshot (and of any older snapshot still staged) to their folders,
+        before the save game that needs them is written
+        :param snapshot: int number of the snapshot
+        :return: None
+        """
+        for number, chunks in self.get_staged(snapshot=snapshot):
+            directory = self.get_snapshot_directory(snapshot=number)
+            for (chunk_x, chunk_y), (chunk, entities) in chunks.items():
+                self.save(chunk_x=chunk_x, chunk_y=chunk_y, chunk=chunk, entities=entities, directory=directory)
+
+    def commit(self, snapshot: int):
+        """
+        Move the chunks of a written snapshot (and of any older snapshot still staged) over the saved chunks, once
+        its save game has been written
+        :param snapshot: int number of the snapshot
+        :return: None
+        """
+        for number, chunks in self.get_staged(snapshot=snapshot):
+            with self.lock:
+                self.move_chunks(directory=self.get_snapshot_directory(snapshot=number), destination=self.directory)
+                del self.staged[number]
+
+    def move_chunks(self, directory: str, destination: str = None):
+        """
+        Move (or delete, if destination is None) every chunk in a folder, and remove the folder
+        :param directory: str folder of the chunks
+        :param destination: str folder the chunks are moved to
+        :return: None
+        """
+        if not os.path.isdir(directory):
+            return
+        for filename in os.listdir(directory):
+            if destination is not None and filename.startswith('chunk_') and filename.endswith('.npz'):
+                os.replace(os.path.join(directory, filename), os.path.join(destination, filename))
+            else:
+                os.remove(os.path.join(directory, filename))
+        os.rmdir(directory)
+
+    def recover(self, snapshot: int):
+        """
+        When a game is loaded: commit the snapshots up to the loaded save's if the game stopped before they were
+        committed (their chunks are written before the save is), and delete the pending chunks and the newer
+        snapshots, they are newer than the save game
+        (if the actions after the save are replayed from the journal, the chunks are generated or changed again)
+        :param snapshot: int number of the snapshot the save game was written with (None to delete every snapshot)
+        :return: None
+        """
+        with self.lock:
+            self.staged.clear()
+            self.move_chunks(directory=self.pending_directory)
+            if not os.path.isdir(self.directory):
+                return
+            numbers = sorted(int(filename[len('snapshot_'):]) for filename in os.listdir(self.directory)
+                             if filename.startswith('snapshot_'))
+            for number in numbers:
+                saved = snapshot is not None and number <= snapshot
+                self.move_chunks(directory=self.get_snapshot_directory(snapshot=number),
+                                 destination=self.directory if saved else None)
+
+    def clear(self):
+        """
+        Delete every saved chunk (ex: when a new world is started with the seed of an old one)
+        :return: None
+        """
+        self.recover(snapshot=None)
+        if os.path.isdir(self.directory):
+            for filename in os.listdir(self.directory):
+                if filename.startswith('chunk_'):
+                    os.remove(os.path.join(self.directory, filename))
+
+
+class ChunkedWorld:
+    def __init__(self, seed: int, chunk_size: int, island_size: int, max_seeds: int, max_chunks: int, store,
+                 entities_per_chunk: int = 0, origin_x: int = 0, origin_y: int = 0, snapshot: int = 0):
+        """
+        An open sea without edges, made of square chunks that are generated from the world seed the first time they
+        come near the player. The GameMap is a window onto the chunks around the player, which slides a chunk at a
+        time as the player sails (entities are moved with it, and those left behind are kept with their chunk). At most
+        max_chunks chunks are kept in memory, the least recently used are written to the chunk store and loaded back
+        from it when the player returns.
+        :param seed: int world seed
+        :param chunk_size: int width and height of a chunk in tiles (even, so sliding keeps the hex columns lined up)
+        :param island_size: maximum number of steps for each island of a chunk
+        :param max_seeds: maximum number of islands of a chunk
+        :param max_chunks: int maximum number of chunks kept in memory (at least the chunks of the window)
+        :param store: ChunkStore the evicted chunks are written to
+        :param entities_per_chunk: int number of entities placed in each newly generated chunk
+        :param origin_x: int chunk x coordinate of the top left chunk of the window
+        :param origin_y: int chunk y coordinate of the top left chunk of the window
+        :param snapshot: int number of the last snapshot of the chunk store (see stage)
+        """
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.island_size = island_size
+        self.max_seeds = max_seeds
+        self.max_chunks = max_chunks
+        self.store = store
+        self.entities_per_chunk = entities_per_chunk
+        self.origin_x = origin_x
+        self.origin_y = origin_y
+        self.snapshot = snapshot
+        self.chunks = OrderedDict()  # (chunk_x, chunk_y): TerrainGrid, least recently used first
+        self.chunk_entities = {}  # (chunk_x, chunk_y): list of json of the entities left in a chunk outside the window
+        self.dirty = set()  # chunks in memory that have changed since they were last saved
+
+    def to_json(self):
+        """
+        Serialize the world to json (the chunks themselves are saved by stage)
+        :return: json serialized ChunkedWorld
+        """
+        return {
+            'seed': self.seed,
+            'chunk_size': self.chunk_size,
+            'island_size': self.island_size,
+            'max_seeds': self.max_seeds,
+            'max_chunks': self.max_chunks,
+            'store': self.store.directory,
+            'entities_per_chunk': self.entities_per_chunk,
+            'origin_x': self.origin_x,
+            'origin_y': self.origin_y,
+            'snapshot': self.snapshot
+        }
+
+    @staticmethod
+    def from_json(json_data):
+        """
+        Convert ChunkedWorld object from serialized json
+        :param json_data: ChunkedWorld serialized json object
+        :return: ChunkedWorld object
+        """
+        return ChunkedWorld(seed=json_data.get('seed'),
+                            chunk_size=json_data.get('chunk_size'),
+                            island_size=json_data.get('island_size'),
+                            max_seeds=json_data.get('max_seeds'),
+                            max_chunks=json_data.get('max_chunks'),
+                            store=ChunkStore(directory=json_data.get('store')),
+                            entities_per_chunk=json_data.get('entities_per_chunk'),
+                            origin_x=json_data.get('origin_x'),
+                            origin_y=json_data.get('origin_y'),
+                            snapshot=json_data.get('snapshot', 0))
+
+    def get_chunk(self, chunk_x: int, chunk_y: int):
+        """
+        Get a chunk from memory, the chunk store, or generate it if it has never been visited,
+        evicting the least recently used chunks if there are too many in memory
+        :param chunk_x: int x coordinate of the chunk
+        :param chunk_y: int y coordinate of the chunk
+        :return: TerrainGrid of the chunk, boolean True if the chunk was just generated
+        """
+        key = (chunk_x, chunk_y)
+        generated = False
+        if key in self.chunks:
+            self.chunks.move_to_end(key)
+            return self.chunks[key], generated
+
+        if self.store.has(chunk_x=chunk_x, chunk_y=chunk_y):
+            chunk, entities = self.store.load(chunk_x=chunk_x, chunk_y=chunk_y)
+            if entities:
+                self.chunk_entities[key] = entities
+        else:
+            chunk = self.generate_chunk(chunk_x=chunk_x, chunk_y=chunk_y)
+            generated = True
+            self.dirty.add(key)
+        self.chunks[key] = chunk
+
+        while len(self.chunks) > self.max_chunks:
+            old_key, old_chunk = self.chunks.popitem(last=False)
+            old_entities = self.chunk_entities.pop(old_key, [])
+            if old_key in self.dirty:
+                self.store.evict(chunk_x=old_key[0], chunk_y=old_key[1], chunk=old_chunk, entities=old_entities)
+                self.dirty.discard(old_key)
+        return chunk, generated
+
+    def generate_chunk(self, chunk_x: int, chunk_y: int):
+        """
+        Generate the terrain, decorations and starting fog of a chunk, from its own seed drawn from the world seed
+        :param chunk_x: int x coordinate of the chunk
+        :param chunk_y: int y coordinate of the chunk
+        :return: TerrainGrid of the chunk
+        """
+        chunk_seed = WorldRandom(seed=self.seed, stream='chunk {} {}'.format(chunk_x, chunk_y)).getrandbits(32)
+        chunk_map = GameMap(width=self.chunk_size, height=self.chunk_size, wind_dir=None, seed=chunk_seed)
+        # drunk-walk islands stay inside their chunk, noise would not line up across the chunk borders
+        generate_world(game_map=chunk_map,
+                       terrain_generator=DrunkWalkGenerator(island_size=self.island_size, max_seeds=self.max_seeds))
+        return chunk_map.terrain
+
+    def load_window(self, game_map):
+        """
+        Copy the chunks under the window into the GameMap terrain, and take back the entities that were left in them
+        :param game_map: GameMap window onto the world
+        :return: list of (x, y) window tile coordinates of the top left corner of each newly generated chunk,
+                 list of the Entities that were kept with the chunks (at their window coordinates)
+        """
+        game_map.world = self
+        game_map.map_analysis = None
+        size = self.chunk_size
+        new_chunks = []
+        entities = []
+        # the window's chunks are needed together, so the cache must be able to hold all of them
+        self.max_chunks = max(self.max_chunks, (game_map.width // size) * (game_map.height // size))
+        for window_x in range(0, game_map.width, size):
+            for window_y in range(0, game_map.height, size):
+                key = (self.origin_x + window_x // size, self.origin_y + window_y // size)
+                chunk, generated = self.get_chunk(chunk_x=key[0], chunk_y=key[1])
+                for field in terrain_fields:
+                    getattr(game_map.terrain, field)[window_x:window_x + size, window_y:window_y + size] = \
+                        getattr(chunk, field)
+                if generated:
+                    new_chunks.append((window_x, window_y))
+                if key in self.chunk_entities:
+                    for entity_json in self.chunk_entities.pop(key):
+                        entity = Entity.from_json(json_data=entity_json)
+                        entity.x += window_x
+                        entity.y += window_y
+                        entities.append(entity)
+                    # the entities now live on the GameMap, the chunk's saved copy of them is stale
+                    self.dirty.add(key)
+        return new_chunks, entities
+
+    def store_window(self, game_map):
+        """
+        Copy the GameMap terrain back into the chunks under the window
+        :param game_map: GameMap window onto the world
+        :return: None
+        """
+        size = self.chunk_size
+        for window_x in range(0, game_map.width, size):
+            for window_y in range(0, game_map.height, size):
+                key = (self.origin_x + window_x // size, self.origin_y + window_y // size)
+                chunk, generated = self.get_chunk(chunk_x=key[0], chunk_y=key[1])
+                for field in terrain_fields:
+                    getattr(chunk, field)[:, :] = \
+                        getattr(game_map.terrain, field)[window_x:window_x + size, window_y:window_y + size]
+                self.dirty.add(key)
+
+    def stage(self, game_map):
+        """
+        Stage every changed chunk, including the window, in the chunk store when the game is saved (on the thread that
+        runs the game): the chunks are copied, not written, the save game's writer writes and commits them
+        :param game_map: GameMap window onto the world
+        :return: int number of the staged snapshot
+        """
+        self.store_window(game_map=game_map)
+        self.snapshot += 1
+        self.store.stage(snapshot=self.snapshot,
+                         chunks={key: (self.chunks[key].copy(), list(self.chunk_entities.get(key, [])))
+                                 for key in self.dirty})
+        self.dirty.clear()
+        return self.snapshot
+
+    def follow(self, game_map, entities: list, player, game_time, game_weather):
+        """
+        Slide the window so the player stays at least a chunk away from its edges. Entities move with the window,
+        entities left outside it are kept with the chunk they are in (and come back with it), and newly generated
+        chunks are stocked with new entities
+        :param game_map: GameMap window onto the world
+        :param entities: list of Entities on the GameMap
+        :param player: the player Entity
+        :param game_time: current game Time
+        :param game_weather: current map Weather
+        :return: boolean True if the window moved
+        """
+        size = self.chunk_size
+        window_chunks_x = game_map.width // size
+        window_chunks_y = game_map.height // size
+        player_chunk_x = player.x // size
+        player_chunk_y = player.y // size
+        shift_x = 0
+        shift_y = 0
+        if not 1 <= player_chunk_x < window_chunks_x - 1:
+            shift_x = player_chunk_x - window_chunks_x // 2
+        if not 1 <= player_chunk_y < window_chunks_y - 1:
+            shift_y = player_chunk_y - window_chunks_y // 2
+        if not (shift_x or shift_y):
+            return False
+
+        self.store_window(game_map=game_map)
+        self.origin_x += shift_x
+        self.origin_y += shift_y
+
+        for entity in entities[:]:
+            entity.x -= shift_x * size
+            entity.y -= shift_y * size
+            if entity is not player and not (0 <= entity.x < game_map.width and 0 <= entity.y < game_map.height):
+                # the old window's chunks are still in memory, unless the entity had strayed off the window
+                key = (self.origin_x + entity.x // size, self.origin_y + entity.y // size)
+                self.get_chunk(chunk_x=key[0], chunk_y=key[1])
+                entity_json = entity.to_json()
+                entity_json['x'] = entity.x % size
+                entity_json['y'] = entity.y % size
+                self.chunk_entities.setdefault(key, []).append(entity_json)
+                self.dirty.add(key)
+                entities.remove(entity)
+
+        new_chunks, returning = self.load_window(game_map=game_map)
+        entities.extend(returning)
+
+        for (window_x, window_y) in new_chunks:
+            place_entities(game_map=game_map, entities=entities, max_entities=self.entities_per_chunk,
+                           game_time=game_time, game_weather=game_weather,
+                           area=(max(window_x, 1), max(window_y, 1),
+                                 min(window_x + size - 1, game_map.width - 2),
+                                 min(window_y + size - 1, game_map.height - 2)))
+        return True
+
+    @staticmethod
+    def map_from_json(json_data):
+        """
+        Convert a GameMap window (and its world) from serialized json
+        :param json_data: GameMap serialized json object, with a 'world'
+        :return: GameMap object
+        """
+        world = ChunkedWorld.from_json(json_data=json_data.get('world'))
+        world.store.recover(snapshot=world.snapshot)
+        game_map = GameMap(width=json_data.get('width'),
+                           height=json_data.get('height'),
+                           wind_turn_count=json_data.get('wind_turn_count'),
+                           max_wind_count=json_data.get('max_wind_count'),
+                           wind_dir=json_data.get('wind_direction'),
+                           seed=world.seed,
+                           rng=WorldRandom.from_json(json_data=json_data.get('rng')))
+        # the window's entities are in the save game, its chunks were staged without them
+        world.load_window(game_map=game_map)
+        return game_map
+
+
+def make_chunked_map(width: int, height: int, entities: list, max_entities: int, constants: dict, game_time,
+                     game_weather, seed: int = None):
+    """
+    Start a new open sea world (see ChunkedWorld), islands are as dense as on a board of the same size
+    :param width: int width of the window onto the world (a multiple of the chunk size)
+    :param height: int height of the window onto the world (a multiple of the chunk size)
+    :param entities: list of entities
+    :param max_entities: Maximum number of entities placed in the window, newly generated chunks get their share
+    :param constants: game constants, with the chunk settings
+    :param game_time: current game Time
+    :param game_weather: current map weather
+    :param seed: int world seed (if None a new seed is picked)
+    :return: the GameMap window onto the new world
+    """
+    chunk_size = constants['chunk_size']
+    if chunk_size % 2 or width % chunk_size or height % chunk_size:
+        raise ValueError('chunk size must be even, and divide the board width and height')
+    if seed is None:
+        seed = new_seed()
+    chunks_per_board = (width // chunk_size) * (height // chunk_size)
+
+    world = ChunkedWorld(seed=seed,
+                         chunk_size=chunk_size,
+                         island_size=constants['island_size'] * chunk_size // width,
+                         max_seeds=max(constants['island_seeds'] // chunks_per_board, 1),
+                         max_chunks=constants['max_chunks'],
+                         store=ChunkStore(directory=os.path.join(constants['chunk_store'], str(seed))),
+                         entities_per_chunk=max_entities // chunks_per_board)
+    world.store.clear()
+
+    game_map = GameMap(width=width, height=height, seed=seed)
+    world.load_window(game_map=game_map)
+    place_entities(game_map=game_map, entities=entities, max_entities=max_entities,
+                   game_time=game_time, game_weather=game_weather)
+    return game_map
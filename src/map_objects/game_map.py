@@ -1,43 +1,57 @@
-from random import randint
+import numpy as np
 
-from components.ai import PeacefulMonster, MeleeMonster
-from components.cargo import Cargo, ItemCategory, Item
-from components.fighter import Fighter
-from components.mobile import Mobile
-from components.size import Size
-from components.view import View
-from components.wings import Wings
-from entity import Entity
-from map_objects.map_generator import generate_terrain
-from map_objects.map_utils import hex_directions, hex_to_cube, Hex, cube_to_hex, cube_directions, cube_add
-from map_objects.tile import Decoration, Elevation, Terrain
-from render_functions import RenderOrder
+from factories.spawn_factory import spawn_entities
+from map_objects.map_analysis import MapAnalysis
+from map_objects.map_generator import DrunkWalkGenerator, generate_terrain, generator_version, \
+    terrain_generator_from_json
+from map_objects.map_utils import hex_directions, get_neighbor_table, shift_hex_grid
+from map_objects.tile import Elevation, TerrainGrid, decoration_ids
+from random_utils import WorldRandom, new_seed
 from weather import weather_effects
 
 
 class GameMap:
-    def __init__(self, width, height, wind_turn_count=0, max_wind_count=50, terrain=None, wind_dir=6):
+    def __init__(self, width, height, wind_turn_count=0, max_wind_count=50, terrain=None, wind_dir=6, seed=None,
+                 rng=None, travels=0):
         """
         The GameMap object, which holds the game map, map width, map height, wind information, fog map, elevation map
         :param width: width of the game map
         :param height: height of the game map
         :param wind_turn_count: int current count of turns since last wind change
         :param max_wind_count: int maximum turn count before wind change
-        :param terrain: list of lists of Terrain tiles
+        :param terrain: TerrainGrid of the map tiles
         :param wind_dir: direction of wind; if 6+ run starting wind function
-        :param fog: list of lists of Booleans; if None run starting fog function TODO: Move to Tile Class
+        :param seed: int world seed the terrain is generated from (None if the terrain was not generated from a seed)
+        :param rng: WorldRandom stream used by everything that happens on the map after generation (entities, wind,
+                    fog, weather, AI); if None a new 'world' stream of the seed
+        :param travels: int number of times the player has changed maps to reach this one
         """
         self.width = width
         self.height = height
         self.wind_turn_count = wind_turn_count
         self.max_wind_count = max_wind_count
+        self.seed = seed
+        self.travels = travels
+        if rng is not None:
+            self.rng = rng
+        else:
+            self.rng = WorldRandom(seed=seed if seed is not None else new_seed())
+        
+        # set by generate_world: the generator the terrain was generated with, and the terrain as it was generated
+        # (saves only store the tiles that have changed since)
+        self.terrain_generator = None
+        self.base_terrain = None
+        # set by ChunkedWorld when the map is a window onto an open sea world
+        self.world = None
+        # MapAnalysis of the terrain, worked out when first needed (reset to None whenever the elevation changes)
+        self.map_analysis = None
         
-        if terrain:
+        if terrain is not None:
             self.terrain = terrain
         else:
-            self.terrain = [[None for y in range(height)] for x in range(width)]
+            self.terrain = TerrainGrid(width=width, height=height)
         
-        if wind_dir:
+        if wind_dir is not None:
             if wind_dir < 6:
                 self.wind_direction = wind_dir
             else:
@@ -45,25 +59,43 @@ class GameMap:
         else:
             self.wind_direction = None
    
-    def to_json(self):
+    def to_json(self, tiles=True):
         """
         Serialize GameMap to json
+        A map generated from a seed is saved as the seed plus the tiles that changed since it was generated,
+        a window onto an open sea world saves its world (its chunks are staged in the chunk store by the save),
+        any other map is saved tile by tile
+        :param tiles: bool False to leave out the tiles (the binary save stores the terrain arrays themselves)
         :return: json serialized GameMap
         """
-        return {
+        json_data = {
             'width': self.width,
             'height': self.height,
             'wind_direction': self.wind_direction,
             'wind_turn_count': self.wind_turn_count,
             'max_wind_count': self.max_wind_count,
-            'terrain': [[terrain.to_json() for terrain in terrain_rows] for terrain_rows in self.terrain]
+            'rng': self.rng.to_json(),
+            'travels': self.travels
         }
+        if self.world is not None:
+            json_data['world'] = self.world.to_json()
+        elif self.base_terrain is not None:
+            json_data['seed'] = self.seed
+            json_data['generator_version'] = generator_version
+            json_data['terrain_generator'] = self.terrain_generator.to_json()
+            if tiles:
+                json_data['terrain_diff'] = self.terrain.get_diff(base=self.base_terrain)
+        elif tiles:
+            json_data['terrain'] = self.terrain.to_json()
+        return json_data
     
     @staticmethod
-    def from_json(json_data):
+    def from_json(json_data, terrain=None, base_terrain=None):
         """
         Convert GameMap object from serialized json
         :param json_data: GameMap serialized json object
+        :param terrain: TerrainGrid of the map, if the tiles were saved outside the json (binary save)
+        :param base_terrain: TerrainGrid of the map as generated from its seed, if saved with the terrain
         :return: GameMap object
         """
         width = json_data.get('width')
@@ -71,16 +103,55 @@ class GameMap:
         wind_dir = json_data.get('wind_direction')
         wind_turn_count = json_data.get('wind_turn_count')
         max_wind_count = json_data.get('max_wind_count')
+        rng_json = json_data.get('rng')
         terrain_json = json_data.get('terrain')
+        travels = json_data.get('travels', 0)
         
-        terrain = [[Terrain.from_json(json_tile=tile) for tile in tile_list] for tile_list in terrain_json]
+        rng = WorldRandom.from_json(json_data=rng_json) if rng_json else None
         
-        return GameMap(width=width,
-                       height=height,
-                       wind_turn_count=wind_turn_count,
-                       max_wind_count=max_wind_count,
-                       terrain=terrain,
-                       wind_dir=wind_dir)
+        if terrain_json is not None:
+            terrain = TerrainGrid.from_json(json_terrain=terrain_json)
+        if terrain is not None:
+            game_map = GameMap(width=width,
+                               height=height,
+                               wind_turn_count=wind_turn_count,
+                               max_wind_count=max_wind_count,
+                               terrain=terrain,
+                               wind_dir=wind_dir,
+                               seed=json_data.get('seed'),
+                               rng=rng,
+                               travels=travels)
+            if base_terrain is not None:
+                game_map.base_terrain = base_terrain
+                game_map.terrain_generator = GameMap.get_saved_generator(json_data=json_data)
+            return game_map
+        
+        # regenerate the terrain from the seed, then put back the tiles that changed
+        if json_data.get('generator_version') != generator_version:
+            raise ValueError('map was saved by a different version of the map generator')
+        game_map = GameMap(width=width,
+                           height=height,
+                           wind_turn_count=wind_turn_count,
+                           max_wind_count=max_wind_count,
+                           wind_dir=wind_dir,
+                           seed=json_data.get('seed'),
+                           rng=rng,
+                           travels=travels)
+        generate_world(game_map=game_map, terrain_generator=GameMap.get_saved_generator(json_data=json_data))
+        game_map.terrain.apply_diff(diff=json_data.get('terrain_diff'))
+        return game_map
+    
+    @staticmethod
+    def get_saved_generator(json_data):
+        """
+        :param json_data: GameMap serialized json object of a map generated from a seed
+        :return: the terrain generator the map was generated with
+        """
+        generator_json = json_data.get('terrain_generator')
+        if generator_json is not None:
+            return terrain_generator_from_json(json_data=generator_json)
+        # saved before there was a choice of generator
+        return DrunkWalkGenerator(island_size=json_data.get('island_size'), max_seeds=json_data.get('max_seeds'))
     
     @property
     def starting_wind(self):
@@ -96,12 +167,30 @@ class GameMap:
             5: Northeast
         :return: int wind direction
         """
-        wind = randint(0, len(hex_directions))
+        wind = self.rng.randint(0, len(hex_directions))
         if wind == len(hex_directions):
             return None
         else:
             return wind
     
+    @property
+    def neighbors(self):
+        """
+        Table of the six neighbors of each tile, shared by every map of the same size (see get_neighbor_table)
+        :return: numpy array of neighbor tile numbers, -1 where the neighbor is off the map
+        """
+        return get_neighbor_table(width=self.width, height=self.height)
+    
+    @property
+    def analysis(self):
+        """
+        Water, ocean and coastline of the map (see MapAnalysis)
+        :return: MapAnalysis
+        """
+        if self.map_analysis is None:
+            self.map_analysis = MapAnalysis(elevation=self.terrain.elevation, neighbors=self.neighbors)
+        return self.map_analysis
+    
     def in_bounds(self, x: int, y: int, margin=0):
         """
         Makes sure a tile (x, y) coordinate is not outside of the map width and height
@@ -117,7 +206,7 @@ class GameMap:
 
 
 def make_map(width: int, height: int, entities: list, max_entities: int, islands: int, seeds: int,
-             constants: dict, game_time, game_weather):
+             constants: dict, game_time, game_weather, seed: int = None, terrain_generator=None, travels: int = 0):
     """
     Generate map with islands and port
     :param width: int with of game map
@@ -129,29 +218,48 @@ def make_map(width: int, height: int, entities: list, max_entities: int, islands
     :param constants: icons, colors, etc.
     :param game_time: current game Time
     :param game_weather: current map weather
+    :param seed: int world seed, the same seed always generates the same map (if None a new seed is picked)
+    :param terrain_generator: DrunkWalkGenerator or NoiseGenerator (if None drunk-walk islands and seeds)
+    :param travels: int number of times the player has changed maps to reach this one
     :return: the generated GameMap object
     """
-    game_map = GameMap(width=width, height=height)
-    generate_terrain(game_map=game_map, island_size=islands, max_seeds=seeds)
-    decorate(game_map=game_map)
-    starting_fog(game_map=game_map)
+    if seed is None:
+        seed = new_seed()
+    if terrain_generator is None:
+        terrain_generator = DrunkWalkGenerator(island_size=islands, max_seeds=seeds)
+    game_map = GameMap(width=width, height=height, seed=seed, travels=travels)
+    generate_world(game_map=game_map, terrain_generator=terrain_generator)
     place_entities(game_map=game_map, entities=entities, max_entities=max_entities,
-                   game_time=game_time, game_weather=game_weather)
+                   game_time=game_time, game_weather=game_weather, travels=travels)
     return game_map
 
 
-def starting_fog(game_map):
+def generate_world(game_map: GameMap, terrain_generator):
+    """
+    Generate the terrain, decorations and starting fog of a map from its seed
+    They are drawn from their own 'terrain' stream of the seed, so regenerating a saved map gives back exactly the
+    same tiles, no matter what has been drawn from the map's other streams
+    :param game_map: GameMap with a seed and blank terrain
+    :param terrain_generator: DrunkWalkGenerator or NoiseGenerator
+    :return: None - modifies game map terrain directly
+    """
+    rng = WorldRandom(seed=game_map.seed, stream='terrain')
+    generate_terrain(game_map=game_map, terrain_generator=terrain_generator, rng=rng)
+    decorate(game_map=game_map, rng=rng)
+    starting_fog(game_map=game_map, rng=rng)
+    game_map.terrain_generator = terrain_generator
+    game_map.base_terrain = game_map.terrain.copy()
+
+
+def starting_fog(game_map, rng):
     """
     Determine starting fog map, with a 5% chance for each tile to contain fog
-    :return: fog grid of booleans - True where fog is placed
+    :param game_map: the game map
+    :param rng: WorldRandom terrain stream of the map's seed
+    :return: None - modifies fog array directly
     """
-    # grid = [[False for y in range(game_map.height)] for x in range(game_map.width)]
     base_fog = 5
-    for x in range(game_map.width):
-        for y in range(game_map.height):
-            fog_chance = randint(0, 99)
-            if fog_chance < base_fog:
-                game_map.terrain[x][y].fog = True
+    game_map.terrain.fog |= rng.array.integers(0, 100, size=(game_map.width, game_map.height)) < base_fog
 
 
 def roll_fog(game_map, game_time, game_weather):
@@ -160,22 +268,11 @@ def roll_fog(game_map, game_time, game_weather):
     :param game_map: current GameMap
     :param game_time: current time of day (effects amount of fog)
     :param game_weather: current weather (effects amount of fog)
-    :return: None - modifies list of lists object directly
+    :return: None - modifies fog array directly
     """
-    # move fog with wind direction:
-    grid = [[False for y in range(game_map.height)] for x in range(game_map.width)]
+    # move fog with wind direction (fog blown off the map is gone):
     if game_map.wind_direction is not None:
-        for x in range(game_map.width):
-            for y in range(game_map.height):
-                if game_map.terrain[x][y].fog:
-                    start_cube = hex_to_cube(Hex(x, y))
-                    neighbor_cube = cube_directions[game_map.wind_direction]
-                    neighbor_hex = cube_to_hex(cube_add(start_cube, neighbor_cube))
-                    if game_map.in_bounds(neighbor_hex.col, neighbor_hex.row, margin=-1):
-                        grid[neighbor_hex.col][neighbor_hex.row] = True
-        for x in range(game_map.width):
-            for y in range(game_map.height):
-                game_map.terrain[x][y].fog = grid[x][y]
+        game_map.terrain.fog = shift_hex_grid(grid=game_map.terrain.fog, direction=game_map.wind_direction)
 
         add_fog_at_border(game_map=game_map, game_time=game_time, game_weather=game_weather)
 
@@ -186,13 +283,15 @@ def add_fog_at_border(game_map, game_time, game_weather):
     :param game_map: current GameMap
     :param game_time: current Time of day
     :param game_weather: current Weather conditions
-    :return: None - modifies list of lists object directly
+    :return: None - modifies fog array directly
     """
     north = False
     south = False
     west = False
     east = False
     base_fog = get_base_fog(game_time=game_time, weather=game_weather)
+    fog = game_map.terrain.fog
+    draw = game_map.rng.array.integers
 
     if game_map.wind_direction in [0, 1, 5]:  # wind blowing north, add fog to bottom border
         north = True
@@ -203,78 +302,63 @@ def add_fog_at_border(game_map, game_time, game_weather):
     if game_map.wind_direction in [4, 5]:
         east = True
     if north:
-        for x in range(game_map.width):
-            fog_chance = randint(0, 99)
-            if fog_chance < base_fog:
-                game_map.terrain[x][game_map.height - 1].fog = True
+        fog[:, game_map.height - 1] |= draw(0, 100, size=game_map.width) < base_fog
     if south:
-        for x in range(game_map.width):
-            fog_chance = randint(0, 99)
-            if fog_chance < base_fog:
-                game_map.terrain[x][0].fog = True
+        fog[:, 0] |= draw(0, 100, size=game_map.width) < base_fog
     if west:
-        for y in range(game_map.height):
-            fog_chance = randint(0, 99)
-            if fog_chance < base_fog:
-                game_map.terrain[game_map.width - 1][y].fog = True
+        fog[game_map.width - 1, :] |= draw(0, 100, size=game_map.height) < base_fog
     if east:
-        for y in range(game_map.height):
-            fog_chance = randint(0, 99)
-            if fog_chance < base_fog:
-                game_map.terrain[0][y].fog = True
+        fog[0, :] |= draw(0, 100, size=game_map.height) < base_fog
 
 
-def remove_fog(terrain, fog_list, width, height):
+def remove_fog(terrain, fog_list, width, height, rng):
     """
     randomly removes ~0.5% of fog from the fog map
-    :param terrain: terrain map of GameMap Tiles
-    :param fog_list: list of tiles containing fog
+    :param terrain: TerrainGrid of GameMap Tiles
+    :param fog_list: array of (x, y) tiles containing fog
     :param width: width of the fog map
     :param height: height of the fog map
+    :param rng: WorldRandom stream of the map
     :return: None - modifies fog map directly
     """
-    removal_list = []
     removal_count = (width * height) // 200
-    for count in range(removal_count):
-        target = randint(0, len(fog_list) - 1)
-        removal_list.append(fog_list[target])
-    for (x, y) in removal_list:
-        terrain[x][y].fog = False
+    removal_list = fog_list[rng.array.integers(0, len(fog_list), size=removal_count)]
+    terrain.fog[removal_list[:, 0], removal_list[:, 1]] = False
 
 
-def add_fog(terrain, width, height):
+def add_fog(terrain, width, height, rng):
     """
     randomly add ~ .5 % of fog to the fog map
-    :param terrain: terrain map of GameMap Tiles
+    :param terrain: TerrainGrid of GameMap Tiles
     :param width: width of the fog map
     :param height: height of the fog map
+    :param rng: WorldRandom stream of the map
     :return: None - modifies fog map directly
     """
-    fog_add_list = []
     fog_add_count = (width * height) // 200
-    for count in range(fog_add_count):
-        fog_add_list.append((randint(0, width - 1), randint(0, height - 1)))
-    for (x, y) in fog_add_list:
-        terrain[x][y].fog = True
+    add_x = rng.array.integers(0, width, size=fog_add_count)
+    add_y = rng.array.integers(0, height, size=fog_add_count)
+    terrain.fog[add_x, add_y] = True
 
 
-def adjust_fog(terrain, width, height, game_time, weather):
+def adjust_fog(terrain, width, height, game_time, weather, rng):
     """
     Determines if fog should be added or removed from the map depending on Time of day and current Weather conditions
-    :param terrain: terrain map of GameMap Tiles
+    :param terrain: TerrainGrid of GameMap Tiles
     :param width: width of fog map
     :param height: height of fog map
     :param game_time: current Time of day
     :param weather: current map Weather
+    :param rng: WorldRandom stream of the map
     :return: None - simply directs fog map to correct add/remove method
     """
     target_fog_pct = get_base_fog(game_time=game_time, weather=weather)
-    fog_list = [(x, y) for x in range(width) for y in range(height) if terrain[x][y].fog]
-    fog_pct = 100 * len(fog_list) // (width * height)
+    fog_count = np.count_nonzero(terrain.fog)
+    fog_pct = 100 * fog_count // (width * height)
     if target_fog_pct < fog_pct:
-        remove_fog(terrain=terrain, fog_list=fog_list, width=width, height=height)
+        remove_fog(terrain=terrain, fog_list=np.argwhere(terrain.fog), width=width, height=height, rng=rng)
     elif target_fog_pct > fog_pct:
-        add_fog(terrain=terrain, width=width, height=height)
+        add_fog(terrain=terrain, width=width, height=height, rng=rng)
 
 
 def get_base_fog(game_time, weather):
@@ -303,7 +387,7 @@ def change_wind(game_map: GameMap, message_log, color):
     :return: None
     """
     delay = 10  # leave wind for at least this many turns
-    change_chance = randint(0, game_map.max_wind_count)
+    change_chance = game_map.rng.randint(0, game_map.max_wind_count)
     if change_chance + delay < game_map.wind_turn_count:
         # change wind 0: dies down / picks up
         #             1: rotate left
@@ -311,12 +395,12 @@ def change_wind(game_map: GameMap, message_log, color):
         game_map.wind_turn_count = 0
         if game_map.wind_direction is None:
             # if no wind, wind starts in random direction
-            game_map.wind_direction = randint(0, len(hex_directions) - 1)
+            game_map.wind_direction = game_map.rng.randint(0, len(hex_directions) - 1)
             game_map.wind_turn_count = 0
             message_log.add_message('Wind picks up.', color)
         else:
             # if wind, 0=die down, 1 = rotate left, 2 = rotate right
-            change = randint(0, 4)
+            change = game_map.rng.randint(0, 4)
             if change == 0:
                 # wind dies down
                 message_log.add_message('Wind dies down.', color)
@@ -337,164 +421,54 @@ def change_wind(game_map: GameMap, message_log, color):
         game_map.wind_turn_count += 1
 
 
-def decorate(game_map: GameMap):
+# decoration id for each roll of 0 - 500 when decorating: rocks 0-1, coral 2-3, sandbar 4-6, seaweed 7-10
+decoration_rolls = np.zeros(501, dtype=np.uint8)
+decoration_rolls[0:2] = decoration_ids['Rocks']
+decoration_rolls[2:4] = decoration_ids['Coral']
+decoration_rolls[4:7] = decoration_ids['Sandbar']
+decoration_rolls[7:11] = decoration_ids['Seaweed']
+
+
+def decorate(game_map: GameMap, rng):
     """
     Add decorations to the water tiles of the game map
     TODO: make these do something (turtles swim toward seaweed, rocks damage ships in darkness/storm, etc.)
     :param game_map: the game map
+    :param rng: WorldRandom terrain stream of the map's seed
     :return: None - modifies game map terrain decoration field directly
     """
-    for x in range(2, game_map.width - 3):
-        for y in range(2, game_map.height - 3):
-            decor = randint(0, 500)
-            if game_map.terrain[x][y].elevation < Elevation.DUNES:
-                if 0 <= decor <= 1:
-                    game_map.terrain[x][y].decoration = Decoration('Rocks')
-                elif 2 <= decor <= 3:
-                    game_map.terrain[x][y].decoration = Decoration('Coral')
-                elif 4 <= decor <= 6:
-                    game_map.terrain[x][y].decoration = Decoration('Sandbar')
-                elif 7 <= decor <= 10:
-                    game_map.terrain[x][y].decoration = Decoration('Seaweed')
+    # roll 0 - 500 for each tile (less a border), and look up the decoration id of each roll
+    rolls = rng.array.integers(0, len(decoration_rolls), size=(game_map.width - 5, game_map.height - 5))
+    new_decorations = decoration_rolls[rolls]
+    water = game_map.terrain.elevation[2:game_map.width - 3, 2:game_map.height - 3] < Elevation.DUNES.value
+    np.copyto(game_map.terrain.decoration[2:game_map.width - 3, 2:game_map.height - 3], new_decorations,
+              where=water & (new_decorations > 0))
 
 
-def place_entities(game_map: GameMap, entities: list, max_entities: int, game_time, game_weather):
+def place_entities(game_map: GameMap, entities: list, max_entities: int, game_time, game_weather, area=None,
+                   travels: int = 0):
     """
-    Adds entities to the game map
-    TODO: add sunken ships, new creatures, etc.
-    TODO: move entity creation to appropriate factory
+    Adds entities built from the spawn prototypes (see spawn_entities) to the open sea of the game map
+    Their field of view is not set here: every entity's fov is set at once by the TurnEngine (when it is made, and
+    after every turn), so spawning does not trace rays for entities that may never see anything
     :param game_map: the current game map
     :param entities: current list of entities
     :param max_entities: maximum number of entities to add
     :param game_time: current game Time
     :param game_weather: current map Weather
+    :param area: tuple (min_x, min_y, max_x, max_y) of the tiles to place entities on
+                 (if None the whole map, less a 1 tile border)
+    :param travels: int number of times the player has changed maps, each adds an entity and shifts the spawn
+                    chances (see get_spawn_table)
     :return: None - modify entity list directly
     """
-    # Get a the number of entities
-    number_of_monsters = max_entities  # randint(2 * max_entities // 3, max_entities)
-    
-    # This should be
-    # 1 choose monster / item
-    # 2 then place - if flying, no location checks, if swimming, try to place until not on land
+    if area is None:
+        area = (1, 1, game_map.width - 2, game_map.height - 2)
+    spawn_tiles = game_map.analysis.get_ocean_tiles(area=area)
+    if len(spawn_tiles) == 0:
+        return
     
-    for i in range(number_of_monsters):
-        placed = False
-        # Choose a random location
-        while not placed:
-            x = randint(1, game_map.width - 2)
-            y = randint(1, game_map.height - 2)
-            if game_map.terrain[x][y].elevation < Elevation.DUNES:
-                placed = True
-                random_val = randint(0, 100)
-                if random_val < 5:
-                    print("chest")
-                    manifest = []
-                    manifest.append(Item(name='Pearls', icon='pearl', category=ItemCategory.EXOTICS, weight=.01,
-                                         volume=.01, quantity=randint(10, 20) + randint(10, 20)))
-                    manifest.append(Item(name='Rum', icon='rum', category=ItemCategory.EXOTICS,
-                                         weight=0.1, volume=2, quantity=randint(0, 5) + 1))
-                    manifest.append(Item(name='Fish', icon='fish', category=ItemCategory.SUPPLIES,
-                                         weight=0.1, volume=2, quantity=randint(0, 5) + 1))
-                    manifest.append(Item(name='Fruit', icon='fruit', category=ItemCategory.SUPPLIES,
-                                         weight=0.1, volume=2, quantity=randint(0, 5) + 1))
-                    manifest.append(Item(name='Water', icon='water', category=ItemCategory.SUPPLIES,
-                                         weight=2, volume=2, quantity=randint(0, 5) + 1))
-                    cargo_component = Cargo(max_volume=5, max_weight=10, manifest=manifest)
-                    npc_icon = 'salvage'
-                    npc = Entity(name='Chest', x=x, y=y,
-                                 icon=npc_icon,
-                                 render_order=RenderOrder.FLOATING,
-                                 cargo=cargo_component)
-                elif random_val < 15:
-                    print("sunken ship")
-                    manifest = []
-                    manifest.append(Item(name='Pearls', icon='pearl', category=ItemCategory.EXOTICS, weight=.01,
-                                         volume=.01, quantity=randint(10, 20) + randint(10, 20)))
-                    manifest.append(Item(name='Rope', icon='rope', category=ItemCategory.SUPPLIES, weight=1,
-                                         volume=2, quantity=randint(0, 5) + 1))
-                    manifest.append(Item(name='Wood', icon='wood', category=ItemCategory.SUPPLIES, weight=2,
-                                         volume=2, quantity=randint(0, 5) + 1))
-                    manifest.append(Item(name='Canvas', icon='canvas', category=ItemCategory.SUPPLIES, weight=1,
-                                         volume=2, quantity=randint(0, 5) + 1))
-                    manifest.append(Item(name='Tar', icon='tar', category=ItemCategory.SUPPLIES, weight=1,
-                                         volume=2, quantity=randint(0, 5) + 1))
-                    cargo_component = Cargo(max_volume=5, max_weight=10, manifest=manifest)
-                    npc_icon = 'sunken_ship'
-                    npc = Entity(name='Sunken Ship', x=x, y=y,
-                                 icon=npc_icon,
-                                 render_order=RenderOrder.FLOATING,
-                                 cargo=cargo_component)
-                elif random_val < 40:
-                    size_component = Size.MEDIUM
-                    manifest = []
-                    manifest.append(Item(name='Meat', icon='meat', category=ItemCategory.SUPPLIES, weight=.5,
-                                         volume=.5, quantity=size_component.value + 1))
-                    manifest.append(Item(name='Turtle Shell', icon='turtle_shell', category=ItemCategory.SUPPLIES,
-                                         weight=2 * size_component.value, volume=float(size_component.value),
-                                         quantity=1))
-                    cargo_component = Cargo(max_volume=size_component.value * 10 + 5,
-                                            max_weight=size_component.value * 10 + 5, manifest=manifest)
-                    view_component = View(view=size_component.value + 3)
-                    mobile_component = Mobile(direction=randint(0, 5), max_momentum=size_component.value * 2 + 2)
-                    fighter_component = Fighter(name="body", max_hps=size_component.value * 10 + 5)
-                    ai_component = PeacefulMonster()
-                    npc_icon = 'sea_turtle'
-                    npc = Entity(name='Sea Turtle', x=x, y=y,
-                                 size=size_component,
-                                 icon=npc_icon,
-                                 render_order=RenderOrder.FLOATING,
-                                 view=view_component,
-                                 mobile=mobile_component,
-                                 ai=ai_component,
-                                 fighter=fighter_component,
-                                 cargo=cargo_component)
-                    npc.view.set_fov(game_map=game_map, game_time=game_time, game_weather=game_weather)
-                elif random_val < 70:
-                    size_component = Size.TINY
-                    manifest = []
-                    manifest.append(Item(name='Meat', icon='meat', category=ItemCategory.SUPPLIES, weight=.5,
-                                         volume=.5, quantity=size_component.value + 1))
-                    cargo_component = Cargo(max_volume=size_component.value * 10 + 5,
-                                            max_weight=size_component.value * 10 + 5, manifest=manifest)
-                    view_component = View(view=size_component.value + 3)
-                    mobile_component = Mobile(direction=randint(0, 5), max_momentum=size_component.value * 2 + 2)
-                    fighter_component = Fighter(name="body", max_hps=size_component.value * 10 + 5)
-                    wing_component = Wings(name="wings", wings=2, size=size_component.value)
-                    ai_component = MeleeMonster()
-                    npc_icon = 'giant_bat'
-                    npc = Entity(name='Giant Bat', x=x, y=y,
-                                 size=size_component,
-                                 icon=npc_icon,
-                                 render_order=RenderOrder.FLYING,
-                                 view=view_component,
-                                 mobile=mobile_component,
-                                 ai=ai_component,
-                                 wings=wing_component,
-                                 fighter=fighter_component,
-                                 cargo=cargo_component)
-                    npc.view.set_fov(game_map=game_map, game_time=game_time, game_weather=game_weather)
-                else:
-                    size_component = Size.SMALL
-                    manifest = []
-                    manifest.append(Item(name='Meat', icon='meat', category=ItemCategory.SUPPLIES, weight=.5,
-                                         volume=.5, quantity=size_component.value + 1))
-                    manifest.append(Item(name='Serpent Scale', icon='serpent_scale', category=ItemCategory.EXOTICS,
-                                         weight=.5, volume=.5, quantity=size_component.value + 1))
-                    cargo_component = Cargo(max_volume=size_component.value * 10 + 5,
-                                            max_weight=size_component.value * 10 + 5, manifest=manifest)
-                    view_component = View(view=size_component.value + 3)
-                    mobile_component = Mobile(direction=randint(0, 5), max_momentum=size_component.value * 2 + 2)
-                    fighter_component = Fighter(name="body", max_hps=size_component.value * 10 + 5)
-                    ai_component = MeleeMonster()
-                    npc_icon = 'sea_serpent'
-                    npc = Entity(name='Sea Serpent', x=x, y=y,
-                                 size=size_component,
-                                 icon=npc_icon,
-                                 render_order=RenderOrder.FLOATING,
-                                 view=view_component,
-                                 mobile=mobile_component,
-                                 ai=ai_component,
-                                 fighter=fighter_component,
-                                 cargo=cargo_component)
-                    npc.view.set_fov(game_map=game_map, game_time=game_time, game_weather=game_weather)
-                entities.append(npc)
+    # Get a the number of entities
+    number_of_monsters = max_entities + travels  # randint(2 * max_entities // 3, max_entities)
+    entities.extend(spawn_entities(spawn_tiles=spawn_tiles, height=game_map.height, number=number_of_monsters,
+                                   rng=game_map.rng, travels=travels))
@@ -0,0 +1,96 @@
+import numpy as np
+
+from map_objects.tile import Elevation
+
+
+class MapAnalysis:
+    def __init__(self, elevation, neighbors):
+        """
+        Water, ocean and coastline of a map, worked out once from the elevation (which does not change during play)
+        so port placement, spawning and movement look them up instead of scanning the neighbors of each tile
+        :param elevation: numpy array of int elevation values, indexed [x, y]
+        :param neighbors: neighbor table of the map (see get_neighbor_table)
+        """
+        width, height = elevation.shape
+        self.width = width
+        self.height = height
+
+        # water can be sailed (elevation up to shallows), everything else is land
+        self.water = elevation < Elevation.DUNES.value
+        land = ~self.water.ravel()
+
+        # number of land neighbors of each tile (off the map does not count)
+        on_map = neighbors >= 0
+        self.land_neighbors = np.count_nonzero(land[neighbors] & on_map, axis=1).astype(np.uint8).reshape(width, height)
+
+        # ocean: water connected to the edge of the map (not an inland lake)
+        labels, count = label_regions(mask=self.water.ravel(), neighbors=neighbors)
+        labels = labels.reshape(width, height)
+        edge_labels = np.unique(np.concatenate([labels[0, :], labels[-1, :], labels[:, 0], labels[:, -1]]))
+        self.ocean = np.isin(labels, edge_labels[edge_labels > 0])
+
+        # coast: land tiles with at least one ocean neighbor (where a port can be reached from the sea)
+        flat_ocean = self.ocean.ravel()
+        ocean_neighbors = np.count_nonzero(flat_ocean[neighbors] & on_map, axis=1).reshape(width, height)
+        self.coast = ~self.water & (ocean_neighbors > 0)
+
+        # tile numbers (x * height + y) of every ocean tile, to spawn sea creatures on
+        self.ocean_tiles = np.flatnonzero(flat_ocean)
+
+    def get_ocean_tiles(self, area=None):
+        """
+        Tile numbers of the ocean tiles inside an area
+        :param area: tuple (min_x, min_y, max_x, max_y) of tiles, inclusive (if None the whole map)
+        :return: numpy array of tile numbers (x * height + y)
+        """
+        if area is None:
+            return self.ocean_tiles
+        min_x, min_y, max_x, max_y = area
+        x = self.ocean_tiles // self.height
+        y = self.ocean_tiles % self.height
+        return self.ocean_tiles[(min_x <= x) & (x <= max_x) & (min_y <= y) & (y <= max_y)]
+
+
+def label_regions(mask, neighbors):
+    """
+    Labels the connected regions of a mask in a single pass with union-find: every pair of neighboring tiles in the
+    mask is joined, all pairs at once, until each region has a single root tile
+    :param mask: flat numpy array of booleans, True for tiles in a region (tiles numbered x * height + y)
+    :param neighbors: neighbor table of the map (see get_neighbor_table)
+    :return: flat numpy array of int region labels (0 outside the mask, regions numbered from 1 in map order),
+             int number of regions
+    """
+    tiles = np.flatnonzero(mask)
+
+    # every in-mask edge (directions 0-2 are the opposites of 3-5, so each edge is only listed once)
+    edge_starts = []
+    edge_ends = []
+    for direction in range(3):
+        ends = neighbors[tiles, direction]
+        joined = (ends >= 0) & mask[ends]
+        edge_starts.append(tiles[joined])
+        edge_ends.append(ends[joined])
+    edge_starts = np.concatenate(edge_starts)
+    edge_ends = np.concatenate(edge_ends)
+
+    # union-find: hook the larger root of each edge onto the smaller root, then compress paths, until every edge
+    # joins two tiles with the same root
+    parent = np.arange(len(mask))
+    while True:
+        start_roots = parent[edge_starts]
+        end_roots = parent[edge_ends]
+        split = start_roots != end_roots
+        if not split.any():
+            break
+        np.minimum.at(parent, np.maximum(start_roots[split], end_roots[split]),
+                      np.minimum(start_roots[split], end_roots[split]))
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+
+    roots, region_labels = np.unique(parent[tiles], return_inverse=True)
+    labels = np.zeros(len(mask), dtype=np.int32)
+    labels[tiles] = region_labels + 1
+    return labels, len(roots)
@@ -1,166 +1,295 @@
-from queue import Queue
-from random import randint
+import numpy as np
 
-from map_objects.map_utils import get_hex_land_neighbors, cube_directions, hex_to_cube, cube_to_hex, \
-    cube_add, Hex
-from map_objects.tile import Terrain, Decoration, Elevation
+from map_objects.map_analysis import MapAnalysis, label_regions
+from map_objects.map_utils import cube_directions, hex_to_cube, cube_to_hex, Hex
+from map_objects.tile import Elevation, decoration_ids
 
+# bumped whenever the same seed starts generating a different map, so saves of seeded maps (which are regenerated
+# from the seed when loaded) from older versions are recognized
+generator_version = 3
 
-def generate_terrain(game_map, island_size: int, max_seeds: int):
+
+class DrunkWalkGenerator:
+    def __init__(self, island_size: int, max_seeds: int):
+        """
+        Terrain generator that drunk-walks from random seed tiles, raising every tile it steps on by one, so islands
+        grow highest where the walk crossed itself most
+        :param island_size: int - maximum steps for walking
+        :param max_seeds: maximum number of paths that will be drunk-walked to create island chains
+        """
+        self.island_size = island_size
+        self.max_seeds = max_seeds
+    
+    @staticmethod
+    def get_generator_name():
+        return 'DrunkWalkGenerator'
+    
+    def to_json(self):
+        return {
+            'name': self.get_generator_name(),
+            'island_size': self.island_size,
+            'max_seeds': self.max_seeds
+        }
+    
+    def make_height_map(self, game_map, rng):
+        """
+        :param game_map: GameMap - the map being generated
+        :param rng: WorldRandom terrain stream of the map's seed
+        :return: numpy array of int "elevation" values, indexed [x, y]
+        """
+        num_seeds = rng.randint(self.max_seeds // 2, self.max_seeds)
+        seeds = get_seed_locations(width=game_map.width, height=game_map.height, num=num_seeds, rng=rng)
+        height_map = [[0 for y in range(game_map.height)] for x in range(game_map.width)]
+        
+        for seed in seeds:
+            size = rng.randint(self.island_size // 2, self.island_size)
+            x, y = seed
+            cube_seed = hex_to_cube(Hex(column=x, row=y))
+            for i in range(size):
+                direction = rng.randint(0, len(cube_directions))
+                if direction == len(cube_directions):
+                    new_cube = cube_seed
+                else:
+                    new_cube = cube_directions[direction]
+                # make sure direction is not out of bounds (leaving a 1 tile margin around map)
+                new_hex = cube_to_hex(new_cube)
+                dx = new_hex.col
+                dy = new_hex.row
+                if game_map.in_bounds(x=x + dx, y=y + dy, margin=1):
+                    x = x + dx
+                    y = y + dy
+                    height_map[x][y] += 1
+        return np.array(height_map)
+
+
+class NoiseGenerator:
+    # elevation of each band of the noise, from the lowest noise values to the highest
+    band_elevations = np.array([Elevation.DEEPS.value, Elevation.WATER.value, Elevation.DUNES.value,
+                                Elevation.GRASSLAND.value, Elevation.JUNGLE.value, Elevation.MOUNTAIN.value,
+                                Elevation.VOLCANO.value])
+    # share of the land at or above grassland, jungle, mountain and volcano (the rest is dunes), close to the
+    # share the drunk-walk makes
+    land_bands = (0.4, 0.18, 0.08, 0.03)
+    
+    def __init__(self, feature_size: int, octaves: int, land_fraction: float):
+        """
+        Terrain generator that thresholds fractal value noise into elevation bands, working on the whole map at once
+        so its cost only grows with the number of tiles (not with the number or size of the islands)
+        :param feature_size: int width in tiles of the largest islands and bays (the first octave of noise)
+        :param octaves: int number of octaves of noise, each with half the feature size and half the weight
+        :param land_fraction: float share of the tiles (inside the 1 tile margin around the map) that are land
+        """
+        self.feature_size = feature_size
+        self.octaves = octaves
+        self.land_fraction = land_fraction
+    
+    @staticmethod
+    def get_generator_name():
+        return 'NoiseGenerator'
+    
+    def to_json(self):
+        return {
+            'name': self.get_generator_name(),
+            'feature_size': self.feature_size,
+            'octaves': self.octaves,
+            'land_fraction': self.land_fraction
+        }
+    
+    def make_height_map(self, game_map, rng):
+        """
+        :param game_map: GameMap - the map being generated
+        :param rng: WorldRandom terrain stream of the map's seed
+        :return: numpy array of int "elevation" values, indexed [x, y]
+        """
+        width = game_map.width
+        height = game_map.height
+        noise = fractal_noise(width=width, height=height, feature_size=self.feature_size, octaves=self.octaves,
+                              rng=rng)
+        
+        # noise levels splitting the tiles into bands, so the share of land (and of each elevation) is the same on
+        # every map, water just below sea level is sea, the rest deep sea
+        shares = [2 * self.land_fraction, self.land_fraction] + [self.land_fraction * share
+                                                                 for share in self.land_bands]
+        levels = np.quantile(noise[1:width - 2, 1:height - 2], [1 - share for share in shares])
+        height_map = self.band_elevations[np.searchsorted(levels, noise, side='right')]
+        
+        # leave the same margin around the map as the drunk-walk (see GameMap.in_bounds)
+        height_map[0, :] = Elevation.DEEPS.value
+        height_map[width - 2:, :] = Elevation.DEEPS.value
+        height_map[:, 0] = Elevation.DEEPS.value
+        height_map[:, height - 2:] = Elevation.DEEPS.value
+        return height_map
+
+
+def terrain_generator_from_json(json_data):
+    name = json_data.get('name')
+    if name == 'DrunkWalkGenerator':
+        return DrunkWalkGenerator(island_size=json_data.get('island_size'), max_seeds=json_data.get('max_seeds'))
+    elif name == 'NoiseGenerator':
+        return NoiseGenerator(feature_size=json_data.get('feature_size'), octaves=json_data.get('octaves'),
+                              land_fraction=json_data.get('land_fraction'))
+    else:
+        return None
+
+
+def get_terrain_generator(constants: dict):
+    """
+    The terrain generator picked in the game constants
+    :param constants: dict game constants
+    :return: DrunkWalkGenerator or NoiseGenerator
+    """
+    if constants['terrain_generator'] == 'noise':
+        return NoiseGenerator(feature_size=constants['noise_feature_size'], octaves=constants['noise_octaves'],
+                              land_fraction=constants['land_fraction'])
+    return DrunkWalkGenerator(island_size=constants['island_size'], max_seeds=constants['island_seeds'])
+
+
+def generate_terrain(game_map, terrain_generator, rng):
     """
     Generates the terrain on the map, and add the location of the port
     :param game_map: GameMap - the current map
-    :param island_size: int - maximum steps for walking
-    :param max_seeds: maximum number of paths that will be drunk-walked to create island chains
+    :param terrain_generator: DrunkWalkGenerator or NoiseGenerator - makes the raw height map of the islands
+    :param rng: WorldRandom terrain stream of the map's seed
     :return: None - elevation map modified directly
     """
-    num_seeds = randint(max_seeds // 2, max_seeds)
-    seeds = get_seed_locations(width=game_map.width, height=game_map.height, num=num_seeds)
-    height_map = [[0 for y in range(game_map.height)] for x in range(game_map.width)]
+    height_map = terrain_generator.make_height_map(game_map=game_map, rng=rng)
     
-    for seed in seeds:
-        size = randint(island_size // 2, island_size)
-        x, y = seed
-        cube_seed = hex_to_cube(Hex(column=x, row=y))
-        for i in range(size):
-            direction = randint(0, len(cube_directions))
-            if direction == len(cube_directions):
-                new_cube = cube_seed
-            else:
-                new_cube = cube_directions[direction]
-            # make sure direction is not out of bounds (leaving a 1 tile margin around map)
-            new_hex = cube_to_hex(new_cube)
-            dx = new_hex.col
-            dy = new_hex.row
-            if game_map.in_bounds(x=x + dx, y=y + dy, margin=1):
-                x = x + dx
-                y = y + dy
-                height_map[x][y] += 1
+    height_map = np.minimum(height_map, Elevation.VOLCANO.value)
+    labels, islands = label_islands(height_map=height_map, neighbors=game_map.neighbors)
     
-    islands = find_all_islands(height_map=height_map, width=game_map.width, height=game_map.height)
-    largest, largest_islands = get_largest_islands(islands=islands)
+    # surround each island tile with at least elevation 2 (shallows)
+    land_tiles = np.flatnonzero(labels.ravel())
+    flat_height_map = height_map.ravel()
+    for direction in range(len(cube_directions)):
+        coast_tiles = game_map.neighbors[land_tiles, direction]
+        coast_tiles = coast_tiles[coast_tiles >= 0]
+        x = coast_tiles // game_map.height
+        y = coast_tiles % game_map.height
+        coast_tiles = coast_tiles[(x < game_map.width - 1) & (y < game_map.height - 1)]
+        flat_height_map[coast_tiles] = np.maximum(flat_height_map[coast_tiles], Elevation.SHALLOWS.value)
+    
+    analysis = MapAnalysis(elevation=height_map, neighbors=game_map.neighbors)
     
     port_x = None
     port_y = None
-    for island in islands:
-        # print(island)
-        for tile in island:
-            tile_x, tile_y = tile
-            cube_tile = hex_to_cube(Hex(column=tile_x, row=tile_y))
-            # surround each island tile with at least elevation 1
-            for direction in cube_directions:
-                new_hex = cube_to_hex(cube_add(cube_tile, direction))
-                x = new_hex.col
-                y = new_hex.row
-                if game_map.in_bounds(x=x, y=y) and height_map[x][y] < Elevation.SHALLOWS.value:
-                    height_map[x][y] = Elevation.SHALLOWS.value
-        
-        if len(island) == largest and not (port_x or port_y):
-            valid_tiles = remove_bad_tiles(height_map, island)
-            port_x, port_y = valid_tiles[randint(0, len(valid_tiles) - 1)]
-            print(port_x, port_y)
+    if islands:
+        largest = max(islands, key=lambda island: island['size'])
+        valid_tiles = get_port_tiles(height_map=height_map, island=labels == largest['label'], analysis=analysis)
+        if valid_tiles:
+            port_x, port_y = valid_tiles[rng.randint(0, len(valid_tiles) - 1)]
     
-    for x in range(game_map.width):
-        for y in range(game_map.height):
-            if height_map[x][y] > Elevation.VOLCANO.value:
-                height_map[x][y] = Elevation.VOLCANO.value
-            game_map.terrain[x][y] = Terrain(elevation=Elevation(height_map[x][y]))
-            if x == port_x and y == port_y:
-                game_map.terrain[port_x][port_y].decoration = Decoration('Port')
+    game_map.terrain.elevation[:, :] = height_map
+    game_map.map_analysis = analysis
+    if port_x is not None and port_y is not None:
+        game_map.terrain.decoration[port_x, port_y] = decoration_ids['Port']
 
 
-def remove_bad_tiles(height_map, island):
+def get_port_tiles(height_map, island, analysis):
     """
-    Used to remove tiles from an island coordinate list for placement of the Port (not on mountain or volcano),
-    with at least 1 water neighbor TODO: this should probably be two so port not placed next to inaccessible "lake"
-    :param height_map: elevation
-    :param island: list of coordinates
+    Tiles of an island a Port can be placed on: sand, grass, or jungle (not mountain or volcano),
+    on the coast of the open sea (not only next to an inland lake)
+    :param height_map: numpy array of elevation values, indexed [x, y]
+    :param island: numpy array of booleans, True for the tiles of the island
+    :param analysis: MapAnalysis of the map
     :return: list of valid coordinates a port can be placed on
     """
-    choices = []
-    for (x, y) in island:
-        # make sure elevation is sand, grass, or jungle, and make sure there is at least 1 water next to tile
-        if (Elevation.DUNES.value <= height_map[x][y] <= Elevation.JUNGLE.value) \
-                and len(get_hex_land_neighbors(height_map, x, y)) < 6:  # not surrounded by 6 land tiles
-            choices.append((x, y))
-    return choices
+    valid = island & analysis.coast \
+        & (Elevation.DUNES.value <= height_map) & (height_map <= Elevation.JUNGLE.value)
+    return [(int(x), int(y)) for (x, y) in np.argwhere(valid)]
 
 
-def get_seed_locations(width: int, height: int, num: int):
+def get_seed_locations(width: int, height: int, num: int, rng):
     """
     Returns list of tile coordinate seeds for map generation
     :param width: int width of map
     :param height: int height of map
     :param num: int number of seed locations wanted
+    :param rng: WorldRandom terrain stream of the map's seed
     :return: list of seed coordinates
     """
     seeds = []
     for i in range(num):
-        x = randint(4, width - 5)
-        y = randint(4, height - 5)
+        x = rng.randint(4, width - 5)
+        y = rng.randint(4, height - 5)
         seeds.append((x, y))
     return seeds
 
 
-def get_largest_islands(islands):
+def label_islands(height_map, neighbors):
     """
-    Returns a list of the largest lists of connected tile coordinates, as well as that size
-    :param islands: list of lists of coordinates (islands - connected land elevation tiles)
-    :return: int size of the largest island,
-             list of lists of the largest islands
+    Labels every "island" (connected land tiles, elevation > 2) of the map (see label_regions)
+    :param height_map: numpy array of int "elevation" values, indexed [x, y]
+    :param neighbors: neighbor table of the map (see get_neighbor_table)
+    :return: numpy array of int island labels indexed [x, y] (0 for water, islands numbered from 1),
+             list of dicts of each island's 'label', 'size' (number of tiles),
+             and bounding box 'min_x', 'min_y', 'max_x', 'max_y'
     """
-    largest_islands = []
-    largest_length = 0
-    for island in islands:
-        if len(island) > largest_length:
-            largest_length = len(island)
-    for island in islands:
-        if len(island) == largest_length:
-            largest_islands.append(island)
-    print(largest_islands)
-    return largest_length, largest_islands
-
-
-def find_all_islands(height_map, width, height):
+    width, height = height_map.shape
+    labels, count = label_regions(mask=height_map.ravel() >= Elevation.DUNES.value, neighbors=neighbors)
+    land_tiles = np.flatnonzero(labels)
+    island_labels = labels[land_tiles] - 1
+    sizes = np.bincount(island_labels, minlength=count)
+    
+    x = land_tiles // height
+    y = land_tiles % height
+    min_x = np.full(count, width)
+    min_y = np.full(count, height)
+    max_x = np.full(count, -1)
+    max_y = np.full(count, -1)
+    np.minimum.at(min_x, island_labels, x)
+    np.minimum.at(min_y, island_labels, y)
+    np.maximum.at(max_x, island_labels, x)
+    np.maximum.at(max_y, island_labels, y)
+    
+    islands = [{'label': label + 1,
+                'size': int(sizes[label]),
+                'min_x': int(min_x[label]),
+                'min_y': int(min_y[label]),
+                'max_x': int(max_x[label]),
+                'max_y': int(max_y[label])} for label in range(count)]
+    return labels.reshape(width, height), islands
+
+
+def fractal_noise(width: int, height: int, feature_size: int, octaves: int, rng):
     """
-    Returns a list of lists of tuple coordinates of adjacent "land" tiles (elevation > 2)
-    :param height_map: list of lists of int "elevation" values
-    :param width: width of the game map
-    :param height: height of the game map
-    :return: list of lists of coordinates
+    Sum of octaves of value noise, each with half the feature size and half the weight of the one before
+    :param width: int width of map
+    :param height: int height of map
+    :param feature_size: int cell size in tiles of the first octave
+    :param octaves: int number of octaves
+    :param rng: WorldRandom terrain stream of the map's seed
+    :return: numpy array of float noise values, indexed [x, y]
     """
-    island_tiles = []  # holds set of all coordinates in island found so far
-    explored = []
-    island_list = []
-    for x in range(1, width - 2):
-        for y in range(1, height - 2):
-            if (x, y) not in island_tiles and (x, y) not in explored and height_map[x][y] >= Elevation.DUNES.value:
-                # found a land tile, so...
-                #  get all tiles in this island
-                new_island_tiles = explore_hex_island_iterative(height_map=height_map, x=x, y=y)
-                explored.extend(new_island_tiles)
-                island_list.append(new_island_tiles)
-                # print(island_list)
-    return island_list
-
-
-def explore_hex_island_iterative(height_map, x, y):
+    noise = np.zeros((width, height))
+    weight = 1.0
+    cell_size = feature_size
+    for octave in range(octaves):
+        noise += weight * value_noise(width=width, height=height, cell_size=cell_size, rng=rng)
+        weight /= 2
+        cell_size = max(cell_size / 2, 1)
+    return noise
+
+
+def value_noise(width: int, height: int, cell_size: float, rng):
     """
-    Finds all "islands" on the game map. "islands" are sets of adjacent land tiles. "land tiles" have elevation > 2
-    :param height_map: list of lists of int "elevation" values
-    :param x: int x coordinate
-    :param y: int y coordinate
-    :return: list of tile coordinates
+    Random values on the corners of a grid of cells, smoothly interpolated across each cell
+    :param width: int width of map
+    :param height: int height of map
+    :param cell_size: float width and height of a cell in tiles
+    :param rng: WorldRandom terrain stream of the map's seed
+    :return: numpy array of float noise values between 0 and 1, indexed [x, y]
     """
-    frontier = Queue()
-    frontier.put((x, y))
-    visited = [(x, y)]
+    corners = rng.array.random((int(width / cell_size) + 2, int(height / cell_size) + 2))
+    x = np.arange(width) / cell_size
+    y = np.arange(height) / cell_size
+    x0 = x.astype(int)
+    y0 = y.astype(int)
+    # smoothstep, so the noise has no creases along the cell borders
+    tx = x - x0
+    tx = (tx * tx * (3 - 2 * tx))[:, np.newaxis]
+    ty = y - y0
+    ty = (ty * ty * (3 - 2 * ty))[np.newaxis, :]
     
-    while not frontier.empty():
-        current = frontier.get()
-        x, y = current
-        for neighbor in get_hex_land_neighbors(height_map=height_map, x=x, y=y):
-            if neighbor not in visited:
-                frontier.put(neighbor)
-                visited.append(neighbor)
-    return visited
+    # interpolate down the (few) columns of corners first, then across them
+    columns = corners[:, y0] * (1 - ty) + corners[:, y0 + 1] * ty
+    return columns[x0] * (1 - tx) + columns[x0 + 1] * tx
@@ -0,0 +1,209 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from entity import Entity
+from game_time import Time
+from map_objects.game_map import GameMap, make_map
+from map_objects.map_generator import get_terrain_generator, terrain_generator_from_json
+from map_objects.tile import TerrainGrid
+from random_utils import WorldRandom
+from weather import Weather
+
+
+def get_next_seed(game_map):
+    """
+    Seed of the map the player reaches by sailing off the edge of a map, drawn from its own stream of the map's seed
+    (so it is known as soon as the map is, and a replay travels to the same maps)
+    :param game_map: GameMap the player sails off
+    :return: int world seed of the next map
+    """
+    seed = game_map.seed if game_map.seed is not None else 0
+    return WorldRandom(seed=seed, stream='next map').getrandbits(32)
+
+
+def generate_map_payload(width: int, height: int, terrain_generator, max_entities: int, tick: int,
+                         seed: int = None, travels: int = 0):
+    """
+    Generate a map with its entities (run in a worker process) and pack it into a small picklable payload:
+    the terrain as compressed raw bytes and the entities as json, so nothing has to be regenerated when it is unpacked
+    :param width: int width of game map
+    :param height: int height of game map
+    :param terrain_generator: DrunkWalkGenerator or NoiseGenerator
+    :param max_entities: int number of entities to place
+    :param tick: int minutes of game time per turn (for the starting time of day)
+    :param seed: int world seed (if None a new seed is picked)
+    :param travels: int number of times the player has changed maps to reach this one (see place_entities)
+    :return: dict payload for map_from_payload
+    """
+    entities = []
+    game_map = make_map(width=width, height=height, entities=entities, max_entities=max_entities, islands=None,
+                        seeds=None, constants=None, game_time=Time(tick), game_weather=Weather(), seed=seed,
+                        terrain_generator=terrain_generator, travels=travels)
+    return {
+        'width': width,
+        'height': height,
+        'seed': game_map.seed,
+        'terrain_generator': game_map.terrain_generator.to_json(),
+        'wind_direction': game_map.wind_direction,
+        'rng': game_map.rng.to_json(),
+        'travels': travels,
+        # nothing has changed the terrain since it was generated, so it is also the base terrain
+        'terrain': game_map.terrain.pack(),
+        'entities': [entity.to_json() for entity in entities]
+    }
+
+
+def map_from_payload(payload):
+    """
+    Unpack a map generated by generate_map_payload
+    :param payload: dict payload
+    :return: GameMap, list of entities
+    """
+    game_map = GameMap(width=payload['width'],
+                       height=payload['height'],
+                       terrain=TerrainGrid.unpack(width=payload['width'], height=payload['height'],
+                                                  packed=payload['terrain']),
+                       wind_dir=payload['wind_direction'],
+                       seed=payload['seed'],
+                       rng=WorldRandom.from_json(json_data=payload['rng']),
+                       travels=payload['travels'])
+    game_map.terrain_generator = terrain_generator_from_json(json_data=payload['terrain_generator'])
+    game_map.base_terrain = game_map.terrain.copy()
+    entities = [Entity.from_json(json_data=entity_json) for entity_json in payload['entities']]
+    return game_map, entities
+
+
+class MapPipeline:
+    def __init__(self, constants: dict, candidates: int = 1, workers: int = 1):
+        """
+        Generates the next maps in worker processes ahead of time, so starting on a new map only has to unpack a
+        finished one: candidates for new games (while the player is in the menu), and the map the player reaches
+        by sailing off the edge of the current one (while they are at sea, see prepare and travel)
+        If the worker processes can not be started or die, maps are generated in this process instead
+        :param constants: dict game constants (board size, islands, entities, seed)
+        :param candidates: int number of new game maps kept generated (or generating) ahead
+        :param workers: int number of worker processes
+        """
+        self.constants = constants
+        self.candidates = candidates
+        self.workers = workers
+        self.executor = None
+        self.pending = deque()
+        self.upcoming = None  # (seed, travels, future) of the map after the current one
+
+    def get_arguments(self, seed: int = None, travels: int = 0):
+        """
+        :param seed: int world seed of the map (if None the seed of the constants, for a new game)
+        :param travels: int number of times the player has changed maps to reach it
+        :return: dict of the arguments of generate_map_payload
+        """
+        constants = self.constants
+        return {
+            'width': constants['board_width'],
+            'height': constants['board_height'],
+            'terrain_generator': get_terrain_generator(constants=constants),
+            'max_entities': constants['max_entities'],
+            'tick': constants['tick'],
+            'seed': seed if seed is not None else constants['seed'],
+            'travels': travels
+        }
+
+    def submit(self, arguments: dict):
+        """
+        Start generating a map in a worker process
+        :param arguments: dict of the arguments of generate_map_payload
+        :return: Future of the payload, or None if the worker processes can not be used
+        """
+        try:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self.executor.submit(generate_map_payload, **arguments)
+        except (OSError, BrokenProcessPool, RuntimeError):
+            self.shutdown()
+            return None
+
+    def get_payload(self, future, arguments: dict):
+        """
+        :param future: Future of a payload (None if it was never started)
+        :param arguments: dict of the arguments it was started with, to generate it here if it failed
+        :return: dict payload (waiting for it, if it is not finished yet)
+        """
+        payload = None
+        if future is not None:
+            try:
+                payload = future.result()
+            except (OSError, BrokenProcessPool):
+                self.shutdown()
+        if payload is None:
+            payload = generate_map_payload(**arguments)
+        return payload
+
+    def fill(self):
+        """
+        Start generating new game maps until there are enough candidates
+        :return: None
+        """
+        while len(self.pending) < self.candidates:
+            future = self.submit(arguments=self.get_arguments())
+            if future is None:
+                return
+            self.pending.append(future)
+
+    def next_map(self):
+        """
+        Take the oldest new game candidate map (waiting for it, if it is not finished yet) and start generating another
+        :return: GameMap, list of entities
+        """
+        future = self.pending.popleft() if self.pending else None
+        payload = self.get_payload(future=future, arguments=self.get_arguments())
+        self.fill()
+        return map_from_payload(payload=payload)
+
+    def prepare(self, game_map):
+        """
+        Start generating the map the player reaches by sailing off the edge of game_map (if not already started)
+        :param game_map: GameMap the player is on
+        :return: None
+        """
+        seed = get_next_seed(game_map=game_map)
+        travels = game_map.travels + 1
+        if self.upcoming is not None:
+            if self.upcoming[:2] == (seed, travels):
+                return
+            self.upcoming[2].cancel()
+        future = self.submit(arguments=self.get_arguments(seed=seed, travels=travels))
+        self.upcoming = (seed, travels, future) if future is not None else None
+
+    def travel(self, game_map):
+        """
+        Take the map the player reaches by sailing off the edge of game_map (waiting for it, if it is not finished
+        yet, or generating it here if it was not prepared), and start generating the one after it
+        :param game_map: GameMap the player sailed off
+        :return: GameMap, list of entities
+        """
+        seed = get_next_seed(game_map=game_map)
+        travels = game_map.travels + 1
+        future = None
+        if self.upcoming is not None and self.upcoming[:2] == (seed, travels):
+            future = self.upcoming[2]
+            self.upcoming = None
+        payload = self.get_payload(future=future, arguments=self.get_arguments(seed=seed, travels=travels))
+        next_map, entities = map_from_payload(payload=payload)
+        self.prepare(game_map=next_map)
+        return next_map, entities
+
+    def shutdown(self):
+        """
+        Stop the worker processes, dropping any unfinished maps
+        :return: None
+        """
+        for future in self.pending:
+            future.cancel()
+        self.pending.clear()
+        if self.upcoming is not None:
+            self.upcoming[2].cancel()
+            self.upcoming = None
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
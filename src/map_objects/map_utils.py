@@ -1,28 +1,46 @@
+from operator import itemgetter
+
+import numpy as np
+
 from map_objects.tile import Elevation
 
 
-class Cube:
-    def __init__(self, x, y, z):
+class Cube(tuple):
+    __slots__ = ()
+    
+    def __new__(cls, x, y, z):
         """
-        Container to hold cubic values in an (x, y, z) coordinate system
+        Immutable container to hold cubic values in an (x, y, z) coordinate system (hashable, can be used in sets)
         :param x: int x value of an (x, y, z) coordinate system
         :param y: int y value of an (x, y, z) coordinate system
         :param z: int z value of an (x, y, z) coordinate system
         """
-        self.x = x
-        self.y = y
-        self.z = z
+        return tuple.__new__(cls, (x, y, z))
+    
+    def __repr__(self):
+        return 'Cube(x={}, y={}, z={})'.format(*self)
+    
+    x = property(itemgetter(0))
+    y = property(itemgetter(1))
+    z = property(itemgetter(2))
 
 
-class Hex:
-    def __init__(self, column, row):
+class Hex(tuple):
+    __slots__ = ()
+    
+    def __new__(cls, column, row):
         """
-        Container to hold a tile (x, y) coordinate
+        Immutable container to hold a tile (x, y) coordinate (hashable, and equal to the (x, y) tuple)
         :param column: int x value of an (x, y) coordinate system
         :param row: int y value of an (x, y) coordinate system
         """
-        self.col = column
-        self.row = row
+        return tuple.__new__(cls, (column, row))
+    
+    def __repr__(self):
+        return 'Hex(column={}, row={})'.format(*self)
+    
+    col = property(itemgetter(0))
+    row = property(itemgetter(1))
 
 
 """
@@ -69,13 +87,8 @@ def get_hex_land_neighbors(height_map, x, y):
     :param y: int y of the game map coordinate
     :return: list of tile coordinate (x, y) tuples
     """
-    neighbors = []
-    for direction in cube_directions:
-        start_cube = hex_to_cube(hexagon=Hex(column=x, row=y))
-        neighbor_hex = cube_to_hex(cube=cube_add(cube1=start_cube, cube2=direction))
-        if height_map[neighbor_hex.col][neighbor_hex.row] >= Elevation.DUNES.value:
-            neighbors.append((neighbor_hex.col, neighbor_hex.row))
-    return neighbors
+    return [(x + dx, y + dy) for (dx, dy) in offset_directions[x % 2]
+            if height_map[x + dx][y + dy] >= Elevation.DUNES.value]
 
 
 def get_hex_water_neighbors(height_map, x, y):
@@ -86,13 +99,8 @@ def get_hex_water_neighbors(height_map, x, y):
     :param y: int y of the game map coordinate
     :return: list of tile coordinate (x, y) tuples
     """
-    neighbors = []
-    for direction in cube_directions:
-        start_cube = hex_to_cube(hexagon=Hex(column=x, row=y))
-        neighbor_hex = cube_to_hex(cube=cube_add(cube1=start_cube, cube2=direction))
-        if height_map[neighbor_hex.col][neighbor_hex.row] < Elevation.DUNES.value:
-            neighbors.append((neighbor_hex.col, neighbor_hex.row))
-    return neighbors
+    return [(x + dx, y + dy) for (dx, dy) in offset_directions[x % 2]
+            if height_map[x + dx][y + dy] < Elevation.DUNES.value]
 
 
 def get_hex_neighbors(x, y):
@@ -102,12 +110,34 @@ def get_hex_neighbors(x, y):
     :param y: int y of the game map coordinate
     :return: list of tile coordinate (x, y) tuples
     """
-    neighbors = []
-    for direction in cube_directions:
-        start_cube = hex_to_cube(hexagon=Hex(column=x, row=y))
-        neighbor_hex = cube_to_hex(cube=cube_add(cube1=start_cube, cube2=direction))
-        neighbors.append((neighbor_hex.col, neighbor_hex.row))
-    return neighbors
+    return [(x + dx, y + dy) for (dx, dy) in offset_directions[x % 2]]
+
+
+neighbor_tables = {}
+
+
+def get_neighbor_table(width, height):
+    """
+    Returns the neighbors of every tile of a map of the given size, built once per map size and shared
+    Tiles are numbered x * height + y (the same order as a flattened [x, y] array)
+    :param width: int width of the map
+    :param height: int height of the map
+    :return: numpy array of shape (width * height, 6) of neighbor tile numbers by direction, -1 if off the map
+    """
+    if (width, height) not in neighbor_tables:
+        columns, rows = np.meshgrid(np.arange(width), np.arange(height), indexing='ij')
+        parity = columns % 2
+        table = np.empty((width, height, len(cube_directions)), dtype=np.int32)
+        for direction in range(len(cube_directions)):
+            dx = np.where(parity, offset_directions[1][direction][0], offset_directions[0][direction][0])
+            dy = np.where(parity, offset_directions[1][direction][1], offset_directions[0][direction][1])
+            x = columns + dx
+            y = rows + dy
+            on_map = (0 <= x) & (x < width) & (0 <= y) & (y < height)
+            table[:, :, direction] = np.where(on_map, x * height + y, -1)
+        table.setflags(write=False)
+        neighbor_tables[(width, height)] = table.reshape(width * height, len(cube_directions))
+    return neighbor_tables[(width, height)]
 
 
 # Thanks Amit @redblobgames !!
@@ -262,6 +292,48 @@ def cube_rotate_cc(cube):
     return Cube(x=new_x, y=new_y, z=new_z)
 
 
+def get_offset_directions():
+    """
+    Returns the (x, y) change to the neighbor in each direction, which depends on whether the column is even or odd
+    :return: list [even column, odd column] of lists of (dx, dy) tuples, indexed by direction
+    """
+    offsets = []
+    for column in (0, 1):
+        start_cube = hex_to_cube(hexagon=Hex(column=column, row=0))
+        directions = []
+        for direction in cube_directions:
+            neighbor_hex = cube_to_hex(cube=cube_add(cube1=start_cube, cube2=direction))
+            directions.append((neighbor_hex.col - column, neighbor_hex.row))
+        offsets.append(directions)
+    return offsets
+
+
+offset_directions = get_offset_directions()
+
+
+def shift_hex_grid(grid, direction):
+    """
+    Moves every value of an [x, y] grid one hex in the given direction with whole-array operations
+    Values moved off the edge of the map are dropped, and the emptied edge is filled with zeros (False)
+    :param grid: numpy array indexed [x, y]
+    :param direction: int direction to move values
+    :return: new shifted numpy array
+    """
+    width, height = grid.shape
+    shifted = np.zeros_like(grid)
+    for parity in (0, 1):
+        dx, dy = offset_directions[parity][direction]
+        # every other column, skipping any column that would move off the map
+        first_column = parity if parity + dx >= 0 else parity + 2
+        last_column = width - max(dx, 0)
+        source_columns = slice(first_column, last_column, 2)
+        target_columns = slice(first_column + dx, last_column + dx, 2)
+        source_rows = slice(max(-dy, 0), height - max(dy, 0))
+        target_rows = slice(max(dy, 0), height - max(-dy, 0))
+        shifted[target_columns, target_rows] = grid[source_columns, source_rows]
+    return shifted
+
+
 def get_fov(entity, game_map, game_time, game_weather, fog_view=0):
     """
     Returns the list of tiles that can be viewed by the given entity
@@ -270,7 +342,7 @@ def get_fov(entity, game_map, game_time, game_weather, fog_view=0):
     :param game_time: current game Time (darkness effects view distance)
     :param game_weather: current map Weather (bad weather effects view distance)
     :param fog_view: int value of how many fog banks it takes to block line of sight
-    :return: list of tiles in view
+    :return: set of (x, y) tiles in view
     """
     view = entity.view
     view += game_time.get_time_of_day_info['view']
@@ -290,41 +362,68 @@ def get_fov(entity, game_map, game_time, game_weather, fog_view=0):
     if view < 1:
         view = 1
     
-    viewed_hexes = []
-    center_coords = hex_to_cube(hexagon=Hex(column=entity.owner.x, row=entity.owner.y))
-    viewed_hexes.append(Hex(column=entity.owner.x, row=entity.owner.y))
-    current = center_coords
-    
-    for k in range(0, view):
-        current = cube_neighbor(cube=current, direction=4)
+    x = entity.owner.x
+    y = entity.owner.y
+    # copy the part of the map in view out of the arrays once, so the rays only touch plain lists
+    left = max(x - view, 0)
+    top = max(y - view, 0)
+    right = min(x + view + 1, game_map.width)
+    bottom = min(y + view + 1, game_map.height)
+    fog = game_map.terrain.fog[left:right, top:bottom].tolist()
+    if entity.owner.wings:
+        blocked = [[False] * (bottom - top)] * (right - left)
+    else:
+        blocked = (game_map.terrain.elevation[left:right, top:bottom] > Elevation.SHALLOWS.value).tolist()
     
-    for i in range(0, 6):
-        for j in range(0, view):
-            cube_line = cube_line_draw(cube1=center_coords, cube2=current)
-            fog = 0
-            for cube in cube_line:
-                hx = cube_to_hex(cube)
-                if game_map.in_bounds(hx.col, hx.row) and game_map.terrain[hx.col][hx.row].fog:
-                    fog += 1
-                if hx not in viewed_hexes[1:]:
-                    viewed_hexes.append(hx)
-                if game_map.in_bounds(hx.col, hx.row) \
-                        and ((Elevation.SHALLOWS < game_map.terrain[hx.col][hx.row].elevation
-                              and not entity.owner.wings)
-                             or fog > fog_view):
+    view_set = {(x, y)}
+    for ray in get_fov_rays(radius=view)[x % 2]:
+        fog_count = 0
+        for dx, dy in ray:
+            tile_x = x + dx
+            tile_y = y + dy
+            # rays keep going past the edge of the map
+            if left <= tile_x < right and top <= tile_y < bottom:
+                view_set.add((tile_x, tile_y))
+                if fog[tile_x - left][tile_y - top]:
+                    fog_count += 1
+                if blocked[tile_x - left][tile_y - top] or fog_count > fog_view:
                     break
-            
-            current = cube_neighbor(current, i)
-    
-    viewed = []
-    for tile in viewed_hexes:
-        if (0 <= tile.col < game_map.width) and (0 <= tile.row < game_map.height):
-            viewed.append((tile.col, tile.row))
-    view_set = set(viewed)
     
     return view_set
 
 
+fov_rays = {}
+
+
+def get_fov_rays(radius):
+    """
+    Returns the lines of sight from a tile to every tile on the ring at the given distance, as (dx, dy) offsets
+    Rays are only drawn once per distance (for tiles in even and odd columns), then reused for every view
+    :param radius: int view distance
+    :return: list [even column, odd column] of lists of rays (tuples of (dx, dy) offsets, nearest first)
+    """
+    if radius not in fov_rays:
+        rays = []
+        for column in (0, 1):
+            center = hex_to_cube(hexagon=Hex(column=column, row=0))
+            current = center
+            for k in range(0, radius):
+                current = cube_neighbor(cube=current, direction=4)
+            
+            column_rays = []
+            for i in range(0, 6):
+                for j in range(0, radius):
+                    ray = []
+                    for cube in cube_line_draw(cube1=center, cube2=current):
+                        hx = cube_to_hex(cube=cube)
+                        ray.append((hx.col - column, hx.row))
+                    column_rays.append(tuple(ray))
+                    current = cube_neighbor(cube=current, direction=i)
+            rays.append(column_rays)
+        fov_rays[radius] = rays
+    return fov_rays[radius]
+
+
 def get_target_hexes(player):
     """
     Returns target hexes for each weapon in an entities' weapon list
@@ -1,80 +1,85 @@
+import zlib
 from enum import Enum
 
+import numpy as np
+
 
 class Decoration:
-    def __init__(self, name: str, icon: str = None, color: str = None):
+    __slots__ = ['name', 'icon', 'color']
+    
+    def __init__(self, name: str, icon: str, color: str):
         """
         Decoration name, icon, and mini-map color
-        :param name: determines the icon and mini-map color
+        There is a single Decoration of each kind, shared by every tile it is on (see decorations),
+        tiles only store its id
+        :param name: str name of the decoration
+        :param icon: str name of the icon
+        :param color: str name of the mini-map color
         """
         self.name = name
         self.icon = icon
         self.color = color
-        
-        if self.name == 'Rocks':
-            self.icon = 'rocks'
-            self.color = 'text'
-        elif self.name == 'Coral':
-            self.icon = 'coral'
-            self.color = 'carnation'
-        elif self.name == 'Sandbar':
-            self.icon = 'sandbar'
-            self.color = 'cantaloupe'
-        elif self.name == 'Seaweed':
-            self.icon = 'seaweed'
-            self.color = 'medium_green'
-        elif self.name == 'Port':
-            self.icon = 'port'
-            self.color = 'white'
 
 
 class Terrain:
-    def __init__(self, elevation: int, seen: bool=False, decoration: str=None, fog: bool=None):
+    __slots__ = ['grid', 'x', 'y']
+    
+    def __init__(self, grid, x: int, y: int):
         """
+        View of a single tile of a TerrainGrid, so tiles can still be used as terrain[x][y].elevation etc.
         Height of terrain determines the terrain Enum value, name, mini-map color, and icon
         This class will also track if the tile has been seen, contains fog, or contains a decoration
-        :param elevation: int elevation height
-        :param seen: boolean if tile has been in player's fov
-        :param decoration: Decoration
-        :param fog: int elevation height
-        """
-        self.elevation = Elevation(elevation)
-        self.seen = seen
-        self.decoration = decoration
-        self.fog = fog
-        
-        if self.elevation == Elevation.DEEPS:
-            self.name = 'Deep Sea'
-            self.icon = 'deep_sea'
-            self.color = 'light_blue'
-        elif self.elevation == Elevation.WATER:
-            self.name = 'Sea'
-            self.icon = 'sea'
-            self.color = 'blue'
-        elif self.elevation == Elevation.SHALLOWS:
-            self.name = 'Shallows'
-            self.icon = 'shallows'
-            self.color = 'aqua'
-        elif self.elevation == Elevation.DUNES:
-            self.name = 'Dunes'
-            self.icon = 'dunes'
-            self.color = 'cantaloupe'
-        elif self.elevation == Elevation.GRASSLAND:
-            self.name = 'Grassland'
-            self.icon = 'grassland'
-            self.color = 'light_green'
-        elif self.elevation == Elevation.JUNGLE:
-            self.name = 'Jungle'
-            self.icon = 'jungle'
-            self.color = 'medium_green'
-        elif self.elevation == Elevation.MOUNTAIN:
-            self.name = 'Mountain'
-            self.icon = 'mountain'
-            self.color = 'text'
-        elif self.elevation == Elevation.VOLCANO:
-            self.name = 'Volcano'
-            self.icon = 'volcano'
-            self.color = 'light_red'
+        :param grid: TerrainGrid holding the tile values
+        :param x: int x coordinate of tile
+        :param y: int y coordinate of tile
+        """
+        self.grid = grid
+        self.x = x
+        self.y = y
+    
+    @property
+    def elevation(self):
+        return elevations[self.grid.elevation[self.x, self.y]]
+    
+    @elevation.setter
+    def elevation(self, elevation):
+        self.grid.elevation[self.x, self.y] = Elevation(elevation).value
+    
+    @property
+    def name(self):
+        return terrain_names[self.grid.elevation[self.x, self.y]]
+    
+    @property
+    def icon(self):
+        return terrain_icons[self.grid.elevation[self.x, self.y]]
+    
+    @property
+    def color(self):
+        return terrain_colors[self.grid.elevation[self.x, self.y]]
+    
+    @property
+    def seen(self):
+        return bool(self.grid.seen[self.x, self.y])
+    
+    @seen.setter
+    def seen(self, seen):
+        self.grid.seen[self.x, self.y] = seen
+    
+    @property
+    def fog(self):
+        return bool(self.grid.fog[self.x, self.y])
+    
+    @fog.setter
+    def fog(self, fog):
+        self.grid.fog[self.x, self.y] = bool(fog)
+    
+    @property
+    def decoration(self):
+        return decorations[self.grid.decoration[self.x, self.y]]
+    
+    @decoration.setter
+    def decoration(self, decoration):
+        self.grid.decoration[self.x, self.y] = decoration_ids[decoration.name] if decoration else 0
     
     def to_json(self):
         return {
@@ -83,15 +88,130 @@ class Terrain:
             'decoration': self.decoration.name if self.decoration else None,
             'fog': self.fog
         }
+
+
+class TerrainColumn:
+    __slots__ = ['grid', 'x']
+    
+    def __init__(self, grid, x: int):
+        """
+        A single column of a TerrainGrid, returned by terrain[x] so terrain[x][y] returns a Terrain view
+        :param grid: TerrainGrid holding the tile values
+        :param x: int x coordinate of the column
+        """
+        self.grid = grid
+        self.x = x
+    
+    def __getitem__(self, y: int):
+        return Terrain(grid=self.grid, x=self.x, y=y)
+    
+    def __len__(self):
+        return self.grid.height
+    
+    def __iter__(self):
+        for y in range(self.grid.height):
+            yield Terrain(grid=self.grid, x=self.x, y=y)
+
+
+class TerrainGrid:
+    def __init__(self, width: int, height: int, elevation=None, seen=None, fog=None, decoration=None):
+        """
+        Terrain of the map stored as one array per field (indexed [x, y]) instead of one object per tile
+        Terrain name, icon and color are looked up from the elevation, decorations are stored as ids
+        :param width: int width of the map
+        :param height: int height of the map
+        :param elevation: uint8 array of Elevation values
+        :param seen: bool array, True if tile has been in player's fov
+        :param fog: bool array, True if tile contains fog
+        :param decoration: uint8 array of decoration ids (0 for no decoration)
+        """
+        self.width = width
+        self.height = height
+        self.elevation = elevation if elevation is not None else np.zeros((width, height), dtype=np.uint8)
+        self.seen = seen if seen is not None else np.zeros((width, height), dtype=bool)
+        self.fog = fog if fog is not None else np.zeros((width, height), dtype=bool)
+        self.decoration = decoration if decoration is not None else np.zeros((width, height), dtype=np.uint8)
     
+    def __getitem__(self, x: int):
+        return TerrainColumn(grid=self, x=x)
+    
+    def __len__(self):
+        return self.width
+    
+    def __iter__(self):
+        for x in range(self.width):
+            yield TerrainColumn(grid=self, x=x)
+    
+    def to_json(self):
+        return [[terrain.to_json() for terrain in terrain_rows] for terrain_rows in self]
+    
+    @staticmethod
+    def from_json(json_terrain):
+        width = len(json_terrain)
+        height = len(json_terrain[0])
+        grid = TerrainGrid(width=width, height=height)
+        for x, tile_list in enumerate(json_terrain):
+            for y, json_tile in enumerate(tile_list):
+                grid.elevation[x, y] = json_tile.get('elevation')
+                grid.seen[x, y] = bool(json_tile.get('seen'))
+                grid.fog[x, y] = bool(json_tile.get('fog'))
+                grid.decoration[x, y] = decoration_ids[json_tile.get('decoration')]
+        return grid
+
+    def copy(self):
+        """
+        Copy of the grid that shares no arrays with it
+        :return: TerrainGrid
+        """
+        return TerrainGrid(width=self.width, height=self.height, elevation=self.elevation.copy(),
+                           seen=self.seen.copy(), fog=self.fog.copy(), decoration=self.decoration.copy())
+
+    def pack(self):
+        """
+        The tile arrays as compressed raw bytes, for the binary save and for maps made in other processes
+        :return: dict of field name to compressed bytes
+        """
+        return {field: zlib.compress(getattr(self, field).tobytes(), 1) for field in terrain_fields}
+
     @staticmethod
-    def from_json(json_tile):
-        elevation = json_tile.get('elevation')
-        seen = json_tile.get('seen')
-        decoration = Decoration(json_tile.get('decoration')) if json_tile.get('decoration') else None
-        fog = json_tile.get('fog')
-        
-        return Terrain(elevation=elevation, seen=seen, decoration=decoration, fog=fog)
+    def unpack(width: int, height: int, packed):
+        """
+        :param width: int width of the terrain
+        :param height: int height of the terrain
+        :param packed: dict of field name to compressed bytes from pack
+        :return: TerrainGrid
+        """
+        grid = TerrainGrid(width=width, height=height)
+        for field in terrain_fields:
+            array = getattr(grid, field)
+            array[:, :] = np.frombuffer(zlib.decompress(packed[field]), dtype=array.dtype).reshape(width, height)
+        return grid
+
+    def get_diff(self, base):
+        """
+        The tiles that differ from a base grid of the same size, as json: for each field, the tile numbers
+        (x * height + y) that changed and their values in this grid
+        :param base: TerrainGrid to compare against (ex: the map as it was generated from its seed)
+        :return: dict of field name to dict of 'tiles' and 'values' lists
+        """
+        diff = {}
+        for field in terrain_fields:
+            values = getattr(self, field).ravel()
+            tiles = np.flatnonzero(values != getattr(base, field).ravel())
+            diff[field] = {'tiles': tiles.tolist(), 'values': values[tiles].tolist()}
+        return diff
+
+    def apply_diff(self, diff):
+        """
+        Set the tiles listed in a diff from get_diff
+        :param diff: dict of field name to dict of 'tiles' and 'values' lists
+        :return: None - modifies the grid directly
+        """
+        for field in terrain_fields:
+            field_diff = diff.get(field)
+            if field_diff and field_diff['tiles']:
+                tiles = np.array(field_diff['tiles'])
+                getattr(self, field)[tiles // self.height, tiles % self.height] = field_diff['values']
 
 
 class Elevation(Enum):
@@ -136,3 +256,23 @@ class Elevation(Enum):
         if self.__class__ is other.__class__:
             return self.value != other.value
         return NotImplemented
+
+
+elevations = tuple(Elevation)
+
+# the per tile arrays of a TerrainGrid
+terrain_fields = ('elevation', 'seen', 'fog', 'decoration')
+
+terrain_names = ('Deep Sea', 'Sea', 'Shallows', 'Dunes', 'Grassland', 'Jungle', 'Mountain', 'Volcano')
+terrain_icons = ('deep_sea', 'sea', 'shallows', 'dunes', 'grassland', 'jungle', 'mountain', 'volcano')
+terrain_colors = ('light_blue', 'blue', 'aqua', 'cantaloupe', 'light_green', 'medium_green', 'text', 'light_red')
+
+# decoration id 0 is no decoration, each decoration is shared by every tile it is on
+decorations = (None,
+               Decoration(name='Rocks', icon='rocks', color='text'),
+               Decoration(name='Coral', icon='coral', color='carnation'),
+               Decoration(name='Sandbar', icon='sandbar', color='cantaloupe'),
+               Decoration(name='Seaweed', icon='seaweed', color='medium_green'),
+               Decoration(name='Port', icon='port', color='white'))
+decoration_ids = {decoration.name if decoration else None: decoration_id
+                  for decoration_id, decoration in enumerate(decorations)}
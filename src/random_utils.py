@@ -1,13 +1,66 @@
-from random import randint
+import random
+import zlib
 
+import numpy as np
 
-def random_choice_index(chances):
+
+class WorldRandom(random.Random):
+    def __init__(self, seed: int, stream: str = 'world'):
+        """
+        Random number stream of one world, so the same seed always builds (and plays out) the same world
+        Works like random.Random for single draws, with a numpy Generator (array) for drawing whole arrays at once
+        Each stream of a seed is independent: drawing from the 'world' stream never changes the 'terrain' stream
+        :param seed: int world seed
+        :param stream: str name of the stream
+        """
+        super().__init__('{}:{}'.format(seed, stream))
+        self.world_seed = seed
+        self.stream = stream
+        self.array = np.random.default_rng([seed, zlib.crc32(stream.encode())])
+    
+    def to_json(self):
+        """
+        Serialize the stream, including its current position, to json
+        :return: json representation of WorldRandom
+        """
+        version, internal_state, gauss_next = self.getstate()
+        return {
+            'seed': self.world_seed,
+            'stream': self.stream,
+            'state': [version, list(internal_state), gauss_next],
+            'array_state': self.array.bit_generator.state
+        }
+    
+    @staticmethod
+    def from_json(json_data):
+        """
+        Convert json representation of WorldRandom to WorldRandom, continuing from where it was saved
+        :param json_data: json representation of WorldRandom
+        :return: WorldRandom object
+        """
+        rng = WorldRandom(seed=json_data.get('seed'), stream=json_data.get('stream'))
+        version, internal_state, gauss_next = json_data.get('state')
+        rng.setstate((version, tuple(internal_state), gauss_next))
+        rng.array.bit_generator.state = json_data.get('array_state')
+        return rng
+
+
+def new_seed():
+    """
+    Pick a seed for a new world
+    :return: int seed
+    """
+    return random.randrange(2 ** 32)
+
+
+def random_choice_index(chances, rng=random):
     """
     Sum positive chances, pick random number between 1 and the sum, then return the index of the choice
     :param chances: list of positive chances
+    :param rng: WorldRandom stream to draw from (defaults to the random module)
     :return: int index of choice
     """
-    random_chance = randint(1, sum(chances))
+    random_chance = rng.randint(1, sum(chances))
     
     running_sum = 0
     choice = 0
@@ -18,14 +71,15 @@ def random_choice_index(chances):
         choice += 1
 
 
-def random_choice_from_dict(choice_dict):
+def random_choice_from_dict(choice_dict, rng=random):
     """
 
     :param choice_dict: dict containing key:choice value: chance to show up
+    :param rng: WorldRandom stream to draw from (defaults to the random module)
     :return: str choice from choice_dict keys
     """
     choices = list(choice_dict.keys())
     positive_choices = [choice for choice in choices if choice_dict[choice] > 0]
     positive_chances = [choice_dict[choice] for choice in choices if choice_dict[choice] > 0]
     
-    return positive_choices[random_choice_index(positive_chances)]
+    return positive_choices[random_choice_index(chances=positive_chances, rng=rng)]
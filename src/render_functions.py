@@ -1,29 +1,295 @@
 import math
-from enum import Enum
+from collections import OrderedDict
 
+import numpy as np
 import pygame
 
 from game_states import GameStates
 from map_objects.map_utils import direction_angle, get_grid_from_coords, get_target_hexes, get_hex_neighbors
-from map_objects.tile import Elevation
+from map_objects.tile import Elevation, decorations, terrain_icons
+from turn_profiler import TurnProfiler
 
 
-class RenderOrder(Enum):
-    TERRAIN = 0
-    DECORATION = 1
-    CORPSE = 2
-    FLOATING = 3
-    SWIMMING = 4
-    PLAYER = 5
-    FLYING = 6
-    FOG = 7
+class PanelCompositor:
+    def __init__(self, profiler=None):
+        """
+        Retained-mode compositor for the main display: keeps each rendered panel along with the inputs it was rendered
+        from, only re-renders a panel when its inputs change, and only pushes the changed areas to the screen
+        :param profiler: TurnProfiler timing each panel render (a disabled one is made if None)
+        """
+        self.panels = {}
+        self.overlays = {}
+        self.dirty_rects = []
+        self.full_update = False
+        self.profiler = profiler if profiler else TurnProfiler()
+        self.terrain_layer = TerrainLayer()
+        self.sprite_cache = SpriteCache()
+    
+    def update(self, display, name, position, inputs, render):
+        """
+        Blit a panel to the display, re-rendering it only if its inputs have changed since the last frame
+        :param display: the main display window surface
+        :param name: str name of the panel
+        :param position: tuple (x, y) pixel location of the panel on the display
+        :param inputs: hashable values the panel is drawn from
+        :param render: function that returns the rendered panel Surface
+        :return: boolean True if the panel was re-rendered
+        """
+        panel = self.panels.get(name)
+        if panel is not None and panel['inputs'] == inputs and panel['position'] == position:
+            return False
+        with self.profiler.phase('render_' + name):
+            surface = render()
+        self.panels[name] = {'inputs': inputs, 'position': position, 'surface': surface}
+        display.blit(surface, position)
+        self.dirty_rects.append(pygame.Rect(position, surface.get_size()))
+        return True
+    
+    def restore(self, display, name, rect):
+        """
+        Redraw part of a cached panel (used to erase an overlay drawn on top of it)
+        :param display: the main display window surface
+        :param name: str name of the panel
+        :param rect: Rect area of the display to restore
+        :return: None
+        """
+        panel = self.panels[name]
+        x, y = panel['position']
+        display.blit(panel['surface'], rect.topleft, rect.move(-x, -y))
+        self.dirty_rects.append(rect)
+    
+    def clear_overlays(self, display, name):
+        """
+        Erase every overlay by redrawing the panel underneath them
+        :param display: the main display window surface
+        :param name: str name of the panel the overlays were drawn on
+        :return: None
+        """
+        for rect in self.overlays.values():
+            self.restore(display=display, name=name, rect=rect)
+        self.overlays = {}
+    
+    def set_overlay(self, display, name, surface, position):
+        """
+        Draw an overlay (ex: info under mouse) on top of the panels
+        :param display: the main display window surface
+        :param name: str name of the overlay
+        :param surface: Surface of the overlay, or None for no overlay
+        :param position: tuple (x, y) pixel location of the overlay
+        :return: None
+        """
+        if surface:
+            self.overlays[name] = display.blit(surface, position)
+            self.dirty_rects.append(self.overlays[name])
+    
+    def invalidate(self):
+        """
+        Mark every panel dirty, so the next frame redraws the whole display and pushes all of it to the screen (ex:
+        when the window is uncovered or restored, and the screen no longer shows what was last pushed)
+        :return: None
+        """
+        self.panels = {}
+        self.overlays = {}
+        self.full_update = True
+    
+    def present(self):
+        """
+        Push only the changed areas of the display to the screen (all of it after invalidate)
+        :return: None
+        """
+        if self.full_update:
+            pygame.display.update()
+            self.full_update = False
+        elif self.dirty_rects:
+            pygame.display.update(self.dirty_rects)
+        self.dirty_rects = []
 
 
-def render_display(display, game_map, player, entities,
+class TerrainLayer:
+    def __init__(self, chunk_size: int = 8, max_chunks: int = 128):
+        """
+        The terrain and decoration icons of the board, pre-rendered in square chunks of tiles that are kept between
+        frames, so drawing the board is a few chunk blits (plus the overlays: shade, fog, entities)
+        A chunk is only re-drawn when the elevation, decoration or seen of one of its tiles changes (or of a tile next
+        to it, the icons are bigger than the tiles and overlap their neighbors)
+        :param chunk_size: int width and height of a chunk in tiles
+        :param max_chunks: int maximum number of chunks kept, the least recently drawn are dropped
+        """
+        self.chunk_size = chunk_size
+        self.max_chunks = max_chunks
+        self.chunks = OrderedDict()  # (chunk_x, chunk_y): Surface, least recently drawn first
+        self.drawn = None  # copies of the (elevation, decoration, seen) arrays the chunks were rendered from
+    
+    def draw(self, surface, game_map, constants, origin):
+        """
+        Blit the chunks that cover the surface's clip area
+        :param surface: Surface to draw on
+        :param game_map: the GameMap object
+        :param constants: dict game constants
+        :param origin: tuple (x, y) pixel location on the surface of the board's top left corner
+        :return: None
+        """
+        span = self.chunk_size * constants['tile_size']
+        area = surface.get_clip().move(-origin[0], -origin[1])
+        chunk_x0 = max(area.left // span, 0)
+        chunk_x1 = min((area.right - 1) // span, (game_map.width - 1) // self.chunk_size)
+        chunk_y0 = max(area.top // span, 0)
+        chunk_y1 = min((area.bottom - 1) // span, (game_map.height - 1) // self.chunk_size)
+        if chunk_x1 < chunk_x0 or chunk_y1 < chunk_y0:
+            return
+        
+        self.update(terrain=game_map.terrain,
+                    x_slice=slice(max(chunk_x0 * self.chunk_size - 1, 0), (chunk_x1 + 1) * self.chunk_size + 1),
+                    y_slice=slice(max(chunk_y0 * self.chunk_size - 1, 0), (chunk_y1 + 1) * self.chunk_size + 1))
+        for chunk_x in range(chunk_x0, chunk_x1 + 1):
+            for chunk_y in range(chunk_y0, chunk_y1 + 1):
+                chunk = self.chunks.get((chunk_x, chunk_y))
+                if chunk is None:
+                    chunk = self.render_chunk(terrain=game_map.terrain, constants=constants, chunk_x=chunk_x,
+                                              chunk_y=chunk_y)
+                    self.chunks[(chunk_x, chunk_y)] = chunk
+                    if len(self.chunks) > self.max_chunks:
+                        self.chunks.popitem(last=False)
+                else:
+                    self.chunks.move_to_end((chunk_x, chunk_y))
+                surface.blit(chunk, (origin[0] + chunk_x * span, origin[1] + chunk_y * span))
+    
+    def update(self, terrain, x_slice, y_slice):
+        """
+        Drop the chunks drawn from tiles that have changed since, within an area of the board
+        :param terrain: TerrainGrid of the map
+        :param x_slice: slice of the x coordinates to check
+        :param y_slice: slice of the y coordinates to check
+        :return: None
+        """
+        current = (terrain.elevation, terrain.decoration, terrain.seen)
+        if self.drawn is None or self.drawn[0].shape != terrain.elevation.shape:
+            self.chunks.clear()
+            self.drawn = tuple(array.copy() for array in current)
+            return
+        
+        changed = np.zeros((len(range(*x_slice.indices(terrain.width))),
+                            len(range(*y_slice.indices(terrain.height)))), dtype=bool)
+        for drawn, array in zip(self.drawn, current):
+            changed |= drawn[x_slice, y_slice] != array[x_slice, y_slice]
+        xs, ys = np.nonzero(changed)
+        if len(xs):
+            xs += x_slice.start
+            ys += y_slice.start
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    keys = np.unique(np.stack(((xs + dx) // self.chunk_size, (ys + dy) // self.chunk_size)), axis=1)
+                    for chunk_x, chunk_y in keys.T.tolist():
+                        self.chunks.pop((chunk_x, chunk_y), None)
+            for drawn, array in zip(self.drawn, current):
+                drawn[x_slice, y_slice] = array[x_slice, y_slice]
+    
+    def render_chunk(self, terrain, constants, chunk_x, chunk_y):
+        """
+        :param terrain: TerrainGrid of the map
+        :param constants: dict game constants
+        :param chunk_x: int chunk x coordinate
+        :param chunk_y: int chunk y coordinate
+        :return: Surface of the terrain and decoration icons of the seen tiles of the chunk
+        """
+        tile_size = constants['tile_size']
+        half_tile = constants['half_tile']
+        margin = constants['margin']
+        icons = constants['icons']
+        span = self.chunk_size * tile_size
+        left = chunk_x * span
+        top = chunk_y * span
+        
+        chunk = pygame.Surface((span, span))
+        chunk.fill(constants['colors']['dark_gray'])
+        elevation = terrain.elevation
+        decoration = terrain.decoration
+        seen = terrain.seen
+        # the tiles of the chunk, and the tiles around it whose icons reach into it
+        for x in range(max(chunk_x * self.chunk_size - 1, 0), min((chunk_x + 1) * self.chunk_size + 1, terrain.width)):
+            for y in range(max(chunk_y * self.chunk_size - 1, 0),
+                           min((chunk_y + 1) * self.chunk_size + 1, terrain.height)):
+                if seen[x, y]:
+                    chunk.blit(icons[terrain_icons[elevation[x, y]]],
+                               (x * tile_size - 2 * margin - left,
+                                y * tile_size + x % 2 * half_tile - half_tile - 2 * margin - top))
+                    if decoration[x, y]:
+                        chunk.blit(icons[decorations[decoration[x, y]].icon],
+                                   (x * tile_size - margin - left,
+                                    y * tile_size + x % 2 * half_tile - half_tile - top))
+        return chunk
+
+
+class SpriteCache:
+    def __init__(self):
+        """
+        Entity sprites, already built and rotated to each direction, so drawing a ship or creature is a single blit
+        Ships are kept by (size, masts, current_sails, moving, direction): when a mast or sail changes (or the ship
+        turns, or stops) its sprite is looked up again instead of being built and rotated every frame
+        """
+        self.sprites = {}
+    
+    def get_ship(self, entity, constants):
+        """
+        :param entity: ship Entity (with mast_sail and mobile components)
+        :param constants: dict game constants
+        :return: Surface of the ship's sprite, rotated to the direction it is heading
+        """
+        key = (entity.size.value, entity.mast_sail.masts, entity.mast_sail.current_sails,
+               entity.mobile.current_speed > 0, entity.mobile.direction)
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            sprite = rot_center(image=create_ship_icon(entity=entity, constants=constants),
+                                angle=direction_angle[entity.mobile.direction])
+            self.sprites[key] = sprite
+        return sprite
+    
+    def get_rotated(self, icon, direction, constants):
+        """
+        :param icon: str name of the icon
+        :param direction: int direction (0 - 5) the entity is heading
+        :param constants: dict game constants
+        :return: Surface of the icon rotated to the direction
+        """
+        key = (icon, direction)
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            sprite = rot_center(image=constants['icons'][icon], angle=direction_angle[direction])
+            self.sprites[key] = sprite
+        return sprite
+
+
+def get_status_inputs(player):
+    """
+    Returns the player values shown in the status panel
+    :param player: the player Entity
+    :return: tuple of values
+    """
+    inputs = [player.name]
+    if player.mast_sail:
+        inputs.extend([player.mast_sail.masts, player.mast_sail.current_sails, player.mast_sail.max_sails,
+                       player.mast_sail.sail_hp, player.mast_sail.sail_hp_max,
+                       player.mast_sail.mast_hp, player.mast_sail.mast_hp_max])
+    if player.mobile:
+        inputs.extend([player.mobile.current_momentum, player.mobile.max_momentum,
+                       player.mobile.current_speed, player.mobile.max_speed])
+    if player.fighter:
+        inputs.extend([player.fighter.name, player.fighter.hps, player.fighter.max_hps])
+    if player.crew:
+        inputs.extend([len(player.crew.crew_list), player.crew.max_crew])
+    if player.weapons:
+        inputs.extend([(weapon.location, weapon.name, weapon.current_cd, weapon.hps, weapon.max_hps)
+                       for weapon in player.weapons.weapon_list])
+    return tuple(inputs)
+
+
+def render_display(display, compositor, game_map, player, entities,
                    constants, mouse_x, mouse_y, message_log, game_state, game_time, game_weather):
     """
     Draw the game: Status panel, Mini Map, messages, controls, GameBoard / Cargo Manifest
+    Only panels whose inputs changed are re-rendered, and only changed areas are pushed to the screen
     :param display: The main display window surface
+    :param compositor: PanelCompositor holding the panels from the last frame
     :param game_map: the GameMap object
     :param player: Player entity
     :param entities: other actors
@@ -36,49 +302,70 @@ def render_display(display, game_map, player, entities,
     :param game_weather: current game Weather object
     :return: None
     """
-    display.fill(constants['colors']['black'])
+    # the world only changes when a turn is taken, and every turn advances the clock
+    turn = (game_time.year, game_time.month, game_time.day, game_time.hrs, game_time.mins)
+    
+    if not compositor.panels:
+        display.fill(constants['colors']['black'])
     
     # draw and blit mini-map
-    map_surf = render_map(game_map=game_map,
-                          player=player,
-                          entities=entities,
-                          constants=constants)
-    display.blit(map_surf, (0, 0))
+    compositor.update(display=display, name='map', position=(0, 0),
+                      inputs=(turn, player.x, player.y),
+                      render=lambda: render_map(game_map=game_map,
+                                                player=player,
+                                                entities=entities,
+                                                constants=constants))
     
     # draw and blit status panel
-    status_surf = render_status(player=player,
-                                constants=constants)
-    display.blit(status_surf, (0, constants['map_height'] + constants['control_height']))
+    compositor.update(display=display, name='status',
+                      position=(0, constants['map_height'] + constants['control_height']),
+                      inputs=get_status_inputs(player=player),
+                      render=lambda: render_status(player=player,
+                                                   constants=constants))
     
     # draw and blit available controls
-    control_surf = render_control(game_map=game_map,
-                                  player=player,
-                                  entities=entities,
-                                  constants=constants,
-                                  game_state=game_state)
-    display.blit(control_surf, (0, constants['map_height']))
+    compositor.update(display=display, name='control', position=(0, constants['map_height']),
+                      inputs=(turn, game_state),
+                      render=lambda: render_control(game_map=game_map,
+                                                    player=player,
+                                                    entities=entities,
+                                                    constants=constants,
+                                                    game_state=game_state))
     
     # draw and blit game messages
-    message_surf = render_messages(message_log=message_log,
-                                   constants=constants)
-    display.blit(message_surf, (constants['status_width'], constants['view_height']))
+    compositor.update(display=display, name='messages', position=(constants['status_width'], constants['view_height']),
+                      inputs=(message_log.version,),
+                      render=lambda: render_messages(message_log=message_log,
+                                                     constants=constants))
     
-    # draw and blit cargo manifest
     if game_state == GameStates.CARGO:
-        inventory_surf = render_manifest(cargo=player.cargo,
-                                         constants=constants)
-        display.blit(inventory_surf, (constants['map_width'], 0))
+        # draw and blit cargo manifest
+        board_changed = compositor.update(display=display, name='board', position=(constants['map_width'], 0),
+                                          inputs=(turn, game_state,
+                                                  tuple((item.name, item.quantity) for item in player.cargo.manifest)),
+                                          render=lambda: render_manifest(cargo=player.cargo,
+                                                                         constants=constants))
     else:
         # draw and blit game play area
-        board_surf = render_board(game_map=game_map,
-                                  player=player,
-                                  entities=entities,
-                                  constants=constants,
-                                  game_state=game_state,
-                                  game_time=game_time,
-                                  game_weather=game_weather)
-        display.blit(board_surf, (constants['map_width'], 0))
-        
+        board_changed = compositor.update(display=display, name='board', position=(constants['map_width'], 0),
+                                          inputs=(turn, game_state),
+                                          render=lambda: render_board(game_map=game_map,
+                                                                      player=player,
+                                                                      entities=entities,
+                                                                      constants=constants,
+                                                                      game_state=game_state,
+                                                                      game_time=game_time,
+                                                                      game_weather=game_weather,
+                                                                      terrain_layer=compositor.terrain_layer,
+                                                                      sprite_cache=compositor.sprite_cache))
+    
+    # erase the old overlays (unless the board was just redrawn underneath them)
+    if board_changed:
+        compositor.overlays = {}
+    else:
+        compositor.clear_overlays(display=display, name='board')
+    
+    if game_state != GameStates.CARGO:
         # Draw and blit info under mouse, but now out of bounds
         info_surf = get_info_under_mouse(game_map=game_map,
                                          player=player,
@@ -86,6 +373,8 @@ def render_display(display, game_map, player, entities,
                                          mouse_x=mouse_x,
                                          mouse_y=mouse_y,
                                          constants=constants)
+        location_x = None
+        location_y = None
         if info_surf:
             location_x = mouse_x + constants['half_tile']
             location_y = mouse_y + constants['half_tile']
@@ -93,9 +382,50 @@ def render_display(display, game_map, player, entities,
                 location_x = constants['display_width'] - constants['margin'] - info_surf.get_width()
             if location_y + info_surf.get_height() > constants['view_height'] - constants['margin']:
                 location_y = constants['view_height'] - constants['margin'] - info_surf.get_height()
-            display.blit(info_surf, (location_x, location_y))
+        compositor.set_overlay(display=display, name='info', surface=info_surf, position=(location_x, location_y))
     
-    pygame.display.update()
+    # draw and blit phase timings, when profiling
+    if compositor.profiler.enabled:
+        compositor.set_overlay(display=display, name='profiler',
+                               surface=render_profiler(profiler=compositor.profiler, constants=constants),
+                               position=(constants['map_width'] + constants['margin'], constants['margin']))
+    
+    compositor.present()
+
+
+def render_profiler(profiler, constants):
+    """
+    Render the rolling percentiles of each turn phase
+    :param profiler: the TurnProfiler
+    :param constants: constants
+    :return: Surface of the phase timings
+    """
+    font = constants['font']
+    color = constants['colors']['text']
+    margin = constants['margin']
+    tab = constants['tab']
+    rows = [('ms', 'p50', 'p95', 'p99')]
+    # phases in alphabetical order, then the total
+    for name, values in sorted(profiler.get_percentiles(percentiles=(50, 95, 99)).items(),
+                               key=lambda item: (item[0] == 'total', item[0])):
+        rows.append([name] + ['{:.2f}'.format(value) for value in values])
+    rows.append(('text cache', '{:.0%}'.format(font.cache.get_stats()['hit_rate'])))
+    
+    name_width = max(font.size(row[0])[0] for row in rows) + margin
+    profiler_surf = pygame.Surface((name_width + 3 * tab + 2 * margin, len(rows) * font.get_height() + 2 * margin))
+    profiler_surf.fill(constants['colors']['dark_gray'])
+    render_border(panel=profiler_surf, color=color)
+    
+    vertical = margin
+    for row in rows:
+        profiler_surf.blit(font.render(row[0], True, color), (margin, vertical))
+        # right align the timings in columns
+        for column, value in enumerate(row[1:]):
+            value_text = font.render(value, True, color)
+            horizontal = margin + name_width + (column + 1) * tab - value_text.get_width()
+            profiler_surf.blit(value_text, (horizontal, vertical))
+        vertical += font.get_height()
+    return profiler_surf
 
 
 def render_manifest(cargo, constants):
@@ -250,9 +580,11 @@ def render_messages(message_log, constants):
     return border_panel
 
 
-def render_board(game_map, player, entities, constants, game_state, game_time, game_weather):
+def render_board(game_map, player, entities, constants, game_state, game_time, game_weather, terrain_layer=None,
+                 sprite_cache=None):
     """
     Generate the surface containing the play area information
+    The terrain comes from the pre-rendered terrain layer, the shade, fog, highlights and entities are drawn over it
     :param game_map: map information
     :param player: player Entity information (mostly for centering camera)
     :param entities: list of Entity objects to render
@@ -260,11 +592,36 @@ def render_board(game_map, player, entities, constants, game_state, game_time, g
     :param game_state: rendering switches depending on GameState value
     :param game_time: current time of the game
     :param game_weather: current weather in the map
+    :param terrain_layer: TerrainLayer kept between frames (if None the terrain is rendered from scratch)
+    :param sprite_cache: SpriteCache kept between frames (if None the entity sprites are built from scratch)
     :return: bordered Surface to render on main display
     """
-    game_map_surf = pygame.Surface((constants['board_width'] * constants['tile_size'] - 2 * constants['margin'],
-                                    constants['board_height'] * constants['tile_size'] - constants['half_tile']))
-    game_map_surf.fill(constants['colors']['dark_gray'])
+    if terrain_layer is None:
+        terrain_layer = TerrainLayer()
+    if sprite_cache is None:
+        sprite_cache = SpriteCache()
+    tile_size = constants['tile_size']
+    half_tile = constants['half_tile']
+    margin = constants['margin']
+    
+    view_surf = pygame.Surface((constants['view_width'] - 2 * constants['margin'],
+                                constants['view_height'] - 2 * constants['margin']))
+    # pixel location on the view of the board's top left corner, so the player is in the middle
+    origin_x = constants['view_width'] // 2 - tile_size * player.x - half_tile
+    origin_y = constants['view_height'] // 2 + half_tile * ((player.x + 1) % 2) - tile_size * player.y - half_tile \
+        - margin
+    board_rect = pygame.Rect(origin_x, origin_y, constants['board_width'] * tile_size - 2 * margin,
+                             constants['board_height'] * tile_size - half_tile)
+    # (fill does not clip a rect that starts above the surface itself)
+    board_rect = board_rect.clip(view_surf.get_rect())
+    view_surf.fill(constants['colors']['dark_gray'], board_rect)
+    view_surf.set_clip(board_rect)
+    terrain_layer.draw(surface=view_surf, game_map=game_map, constants=constants, origin=(origin_x, origin_y))
+    
+    # the tiles on the view
+    area = view_surf.get_clip().move(-origin_x, -origin_y)
+    x_range = range(max(area.left // tile_size - 1, 0), min(area.right // tile_size + 2, game_map.width))
+    y_range = range(max(area.top // tile_size - 1, 0), min(area.bottom // tile_size + 2, game_map.height))
     
     if game_state == GameStates.TARGETING:
         targeted_hexes = []
@@ -278,87 +635,45 @@ def render_board(game_map, player, entities, constants, game_state, game_time, g
                     or (game_map.terrain[player.x][player.y].decoration
                         and game_map.terrain[player.x][player.y].decoration.name != "Port"):
                 targeted_hexes.extend(get_target_hexes(player))
-    
-    for x in range(player.x - 10, player.x + 11):
-        for y in range(player.y - 10, player.y + 11):
-            if (0 <= x < game_map.width) and (0 <= y < game_map.height) and game_map.terrain[x][y].seen:
-                game_map_surf.blit(constants['icons'][game_map.terrain[x][y].icon],
-                                   (x * constants['tile_size'] - 2 * constants['margin'],
-                                    y * constants['tile_size'] + x % 2 * constants['half_tile']
-                                    - constants['half_tile'] - 2 * constants['margin']))
-                if game_map.terrain[x][y].decoration:
-                    game_map_surf.blit(constants['icons'][game_map.terrain[x][y].decoration.icon],
-                                       (x * constants['tile_size'] - constants['margin'],
-                                        y * constants['tile_size'] + (x % 2) * constants['half_tile']
-                                        - constants['half_tile']))
-                
-                # TODO: move this here eventually ??
-                # if (x, y) not in player.view.fov:
-                #     game_map_surf.blit(constants['icons']['shade'],
-                #                        (x * constants['tile_size'] - 2 * constants['margin'],
-                #                         y * constants['tile_size'] + x % 2 * constants['half_tile']
-                #                         - constants['half_tile'] - 2 * constants['margin']))  # -10 for big tile size
-                
-                if game_state == GameStates.TARGETING:
-                    if (x, y) in targeted_hexes and (x, y) in player.view.fov:
-                        icon = constants['icons']['highlight']
-                        game_map_surf.blit(icon, (x * constants['tile_size'] - 2 * constants['margin'],
-                                                  y * constants['tile_size'] + x % 2 * constants['half_tile']
-                                                  - constants['half_tile'] - 2 * constants['margin']))
+        
+        for (x, y) in sorted(set(targeted_hexes)):
+            if x in x_range and y in y_range and game_map.terrain[x][y].seen and (x, y) in player.view.fov:
+                view_surf.blit(constants['icons']['highlight'],
+                               (origin_x + x * tile_size - 2 * margin,
+                                origin_y + y * tile_size + x % 2 * half_tile - half_tile - 2 * margin))
     
     ordered_entities = sorted(entities, key=lambda e: e.render_order.value)
     for entity in ordered_entities:
         if (0 <= entity.x < game_map.width) \
                 and (0 <= entity.y < game_map.height) \
-                and (entity.x, entity.y) in player.view.fov:
-            if entity.icon:
-                if entity.mast_sail and not game_state == GameStates.PLAYER_DEAD:
-                    icon = create_ship_icon(entity=entity, constants=constants)
+                and (entity.x, entity.y) in player.view.fov \
+                and entity.icon:
+            if entity.mobile and not game_state == GameStates.PLAYER_DEAD:
+                if entity.mast_sail:
+                    icon = sprite_cache.get_ship(entity=entity, constants=constants)
                 else:
-                    icon = constants['icons'][entity.icon]
+                    icon = sprite_cache.get_rotated(icon=entity.icon, direction=entity.mobile.direction,
+                                                    constants=constants)
+            elif entity.mast_sail and not game_state == GameStates.PLAYER_DEAD:
+                icon = create_ship_icon(entity=entity, constants=constants)
             else:
-                icon = None
-            
-            if icon and entity.mobile and not game_state == GameStates.PLAYER_DEAD:
-                game_map_surf.blit(rot_center(image=icon, angle=direction_angle[entity.mobile.direction]),
-                                   (entity.x * constants['tile_size'] - constants['margin'],
-                                    entity.y * constants['tile_size'] + entity.x % 2 * constants['half_tile']
-                                    - constants['half_tile']))
-            elif icon:
-                game_map_surf.blit(icon,
-                                   (entity.x * constants['tile_size'] - constants['margin'],
-                                    entity.y * constants['tile_size'] + entity.x % 2 * constants['half_tile']
-                                    - constants['half_tile']))
-    
-    for x in range(player.x - 10, player.x + 11):
-        for y in range(player.y + 10, player.y - 11, -1):
-            if (0 <= x < game_map.width) \
-                    and (0 <= y < game_map.height) \
-                    and game_map.terrain[x][y].seen \
-                    and (x, y) not in player.view.fov:
-                game_map_surf.blit(constants['icons']['shade'],
-                                   (x * constants['tile_size'] - 2 * constants['margin'],
-                                    y * constants['tile_size'] + x % 2 * constants['half_tile']
-                                    - constants['half_tile'] - 2 * constants['margin']))  # -10 due to larger tile size
-            if (0 <= x < game_map.width) \
-                    and (0 <= y < game_map.height) \
-                    and game_map.terrain[x][y].fog \
-                    and (x, y) in player.view.fov:
-                game_map_surf.blit(constants['icons']['fog'],
-                                   (x * constants['tile_size'] - 2 * constants['margin'],
-                                    y * constants['tile_size'] + x % 2 * constants['half_tile']
-                                    - constants['half_tile'] - 2 * constants['margin']))
-    
-    view_surf = pygame.Surface((constants['view_width'] - 2 * constants['margin'],
-                                constants['view_height'] - 2 * constants['margin']))
-    view_surf.blit(game_map_surf, (constants['view_width'] // 2
-                                   - constants['tile_size'] * player.x
-                                   - constants['half_tile'],
-                                   constants['view_height'] // 2
-                                   + constants['half_tile'] * ((player.x + 1) % 2)
-                                   - constants['tile_size'] * player.y
-                                   - constants['half_tile']
-                                   - constants['margin']))
+                icon = constants['icons'][entity.icon]
+            view_surf.blit(icon, (origin_x + entity.x * tile_size - margin,
+                                  origin_y + entity.y * tile_size + entity.x % 2 * half_tile - half_tile))
+    
+    seen = game_map.terrain.seen
+    fog = game_map.terrain.fog
+    for x in x_range:
+        for y in reversed(y_range):
+            if seen[x, y] and (x, y) not in player.view.fov:
+                view_surf.blit(constants['icons']['shade'],
+                               (origin_x + x * tile_size - 2 * margin,
+                                origin_y + y * tile_size + x % 2 * half_tile - half_tile - 2 * margin))
+            if fog[x, y] and (x, y) in player.view.fov:
+                view_surf.blit(constants['icons']['fog'],
+                               (origin_x + x * tile_size - 2 * margin,
+                                origin_y + y * tile_size + x % 2 * half_tile - half_tile - 2 * margin))
+    view_surf.set_clip(None)
     
     render_time(game_time=game_time, view_surf=view_surf, constants=constants)
     render_weather(game_time=game_time, game_weather=game_weather, view_surf=view_surf, constants=constants)
@@ -0,0 +1,15 @@
+from enum import Enum
+
+
+class RenderOrder(Enum):
+    """
+    Order in which Entities are drawn on the game board (kept free of pygame so the simulation can run headless)
+    """
+    TERRAIN = 0
+    DECORATION = 1
+    CORPSE = 2
+    FLOATING = 3
+    SWIMMING = 4
+    PLAYER = 5
+    FLYING = 6
+    FOG = 7
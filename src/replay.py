@@ -0,0 +1,157 @@
+"""
+Shallow Seas replay
+
+Plays a session recorded by the game (set record in get_constants) again as fast as it will go, without a display,
+and reports the time each turn took and a hash of the final state. The same recording always ends in the same state,
+so a replay is both a check that the game is deterministic and a benchmark of real play that can be compared between
+commits.
+
+usage (from the src directory):
+
+python3 replay.py session.replay
+python3 replay.py session.replay --output replay_results.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+from time import perf_counter
+
+# nothing is drawn, so no window (or audio device) is needed
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import pygame
+
+from loader_functions.initialize_new_game import get_constants, get_game_variables
+from loader_functions.journal import get_checkpoint
+from loader_functions.session_recorder import get_state_hash, read_recording
+from map_objects.map_pipeline import MapPipeline
+from turn_engine import TurnEngine
+from turn_profiler import TurnProfiler, get_percentile
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def replay(header: dict, entries: list, chunk_store: str):
+    """
+    Build the recorded game from its seed and constants, and step the TurnEngine through every recorded action
+    :param header: dict header of the recording (seed and constants)
+    :param entries: list of dicts of 'action' and 'checkpoint'
+    :param chunk_store: str folder for the open sea chunks (so a replay never touches the chunks of a real game)
+    :return: dict of the timings of each turn, the phase percentiles, the turn the replay drifted on, and the hash
+    """
+    constants = get_constants()
+    constants.update(header['constants'])
+    constants['seed'] = header['seed']
+    constants['chunk_store'] = chunk_store
+
+    start = perf_counter()
+    player, entities, game_map, message_log, game_state, game_weather, game_time = get_game_variables(
+        constants=constants)
+    # the same greeting as a new game in engine.main
+    message_log.add_message("Welcome to Shallow Seas!")
+    profiler = TurnProfiler(enabled=True, window=max(len(entries), 1))
+    # the player travels to the same maps as in the recorded game (they are drawn from the seed)
+    map_pipeline = MapPipeline(constants=constants, candidates=0) if not constants['open_sea'] else None
+    turn_engine = TurnEngine(player=player, entities=entities, game_map=game_map, message_log=message_log,
+                             game_state=game_state, game_weather=game_weather, game_time=game_time,
+                             colors=constants['colors'], profiler=profiler, map_pipeline=map_pipeline)
+    setup_time = perf_counter() - start
+
+    timings = []
+    drifted_turn = None
+    for turn, entry in enumerate(entries):
+        start = perf_counter()
+        result = turn_engine.step(action=entry['action'])
+        timings.append(perf_counter() - start)
+        profiler.end_turn(turn_taken=result.turn_taken)
+        if drifted_turn is None and get_checkpoint(rng=turn_engine.game_map.rng) != entry['checkpoint']:
+            drifted_turn = turn
+    if map_pipeline is not None:
+        map_pipeline.shutdown()
+
+    return {
+        'setup_time': setup_time,
+        'timings': timings,
+        'phases_ms': profiler.get_percentiles(),
+        'drifted_turn': drifted_turn,
+        'state_hash': get_state_hash(player=turn_engine.player, entities=turn_engine.entities,
+                                     game_map=turn_engine.game_map, message_log=turn_engine.message_log,
+                                     game_state=turn_engine.game_state, game_weather=turn_engine.game_weather,
+                                     game_time=turn_engine.game_time)
+    }
+
+
+def print_report(result: dict, recorded_hash: str):
+    """
+    :param result: dict from replay
+    :param recorded_hash: str hash of the final state when the session was recorded (None if it did not close)
+    :return: None
+    """
+    timings = result['timings']
+    print('turns: {}'.format(len(timings)))
+    print('setup: {:.1f} ms'.format(result['setup_time'] * 1000))
+    if timings:
+        print('turns total: {:.1f} ms'.format(sum(timings) * 1000))
+        print('turn ms  p50: {:.3f}  p95: {:.3f}  p99: {:.3f}  max: {:.3f}'.format(
+            *[get_percentile(values=timings, percentile=p) * 1000 for p in (50, 95, 99)], max(timings) * 1000))
+        for name, (p50, p95, p99) in sorted(result['phases_ms'].items()):
+            print('    {:<12} p50: {:.3f}  p95: {:.3f}  p99: {:.3f}'.format(name, p50, p95, p99))
+        slowest = sorted(range(len(timings)), key=lambda turn: timings[turn], reverse=True)[:5]
+        print('slowest turns: {}'.format(', '.join('{} ({:.3f} ms)'.format(turn, timings[turn] * 1000)
+                                                   for turn in slowest)))
+    if result['drifted_turn'] is not None:
+        print('replay drifted from the recording at turn {}'.format(result['drifted_turn']))
+    print('state hash: {}'.format(result['state_hash']))
+    if recorded_hash is None:
+        print('the recording has no final state hash (the session did not close)')
+    elif recorded_hash == result['state_hash']:
+        print('matches the recorded state')
+    else:
+        print('does NOT match the recorded state: {}'.format(recorded_hash))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Shallow Seas replay')
+    parser.add_argument('recording', help='recording written by the game (see record in get_constants)')
+    parser.add_argument('--output', default=None, help='JSON file to write the timings of every turn to')
+    args = parser.parse_args()
+    recording_filename = os.path.abspath(args.recording)
+    output_filename = os.path.abspath(args.output) if args.output else None
+
+    try:
+        header, entries, recorded_hash = read_recording(filename=recording_filename)
+    except (OSError, ValueError) as error:
+        print('Replay Error! {}'.format(error), file=sys.stderr)
+        sys.exit(2)
+
+    # icons and fonts are loaded relative to src
+    os.chdir(SRC_DIR)
+    pygame.init()
+    with tempfile.TemporaryDirectory() as chunk_store:
+        result = replay(header=header, entries=entries, chunk_store=chunk_store)
+    pygame.quit()
+
+    print_report(result=result, recorded_hash=recorded_hash)
+    if output_filename:
+        with open(output_filename, 'w') as output_file:
+            json.dump({'recording': recording_filename,
+                       'seed': header['seed'],
+                       'constants': header['constants'],
+                       'setup_ms': result['setup_time'] * 1000,
+                       'turns_ms': [timing * 1000 for timing in result['timings']],
+                       'phases_ms': result['phases_ms'],
+                       'drifted_turn': result['drifted_turn'],
+                       'state_hash': result['state_hash'],
+                       'recorded_hash': recorded_hash}, output_file, indent=4)
+        print('Results written to {}'.format(output_filename), file=sys.stderr)
+
+    # a replay that does not end where the recording did fails, so scripts can check for regressions
+    if result['drifted_turn'] is not None or (recorded_hash is not None and recorded_hash != result['state_hash']):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
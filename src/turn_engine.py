@@ -0,0 +1,575 @@
+import numpy as np
+
+from components.cargo import adjust_quantity
+from game_states import GameStates
+from map_objects.game_map import change_wind, adjust_fog, roll_fog
+from turn_profiler import TurnProfiler
+from weather import change_weather
+
+
+class TurnResult:
+    def __init__(self, game_state, turn_taken=False, changed=False):
+        """
+        Outcome of a single TurnEngine step
+        :param game_state: GameState after the action was applied
+        :param turn_taken: boolean True if the action advanced the simulation by a turn
+        :param changed: boolean True if the action changed the game (took a turn, changed the game state or added a
+                        message), so it has to be journaled or recorded to be replayed
+        """
+        self.game_state = game_state
+        self.turn_taken = turn_taken
+        self.changed = changed or turn_taken
+
+
+class TurnEngine:
+    def __init__(self, player, entities, game_map, message_log, game_state, game_weather, game_time, colors,
+                 profiler=None, map_pipeline=None):
+        """
+        Runs the game simulation one player action at a time, without any rendering or input handling (no pygame)
+        :param player: the player Entity
+        :param entities: list of Entities on the GameMap
+        :param game_map: the current GameMap
+        :param message_log: the MessageLog
+        :param game_state: current GameState
+        :param game_weather: current map Weather
+        :param game_time: current game Time
+        :param colors: dict of color values for the message log
+        :param profiler: TurnProfiler timing each phase of the turn (a disabled one is made if None)
+        :param map_pipeline: MapPipeline the next map is taken from when the player sails off the edge of the board
+                             (if None the player can sail off the board, and stays on it)
+        """
+        self.player = player
+        self.entities = entities
+        self.game_map = game_map
+        self.message_log = message_log
+        self.game_state = game_state
+        self.game_weather = game_weather
+        self.game_time = game_time
+        self.colors = colors
+        self.profiler = profiler if profiler else TurnProfiler()
+        self.map_pipeline = map_pipeline
+
+        for entity in self.entities:
+            if entity.name == 'player':
+                self.player = entity
+        self.update_fov()
+        # the open sea has no edge to sail off
+        if self.map_pipeline is not None and self.game_map.world is None:
+            self.map_pipeline.prepare(game_map=self.game_map)
+
+    def step(self, action: dict):
+        """
+        Apply a player action (as returned from handle_keys) to the game
+        :param action: dict of translated commands
+        :return: TurnResult
+        """
+        player = self.player
+        game_map = self.game_map
+        message_log = self.message_log
+        game_state = self.game_state
+        message_version = message_log.version
+
+        rowing = action.get('rowing')
+        slowing = action.get('slowing')
+        rotate = action.get('rotate')
+        other_action = action.get('other_action')
+        port = action.get('port')
+        repair = action.get('repair')
+
+        sails = action.get('sails')
+        sails_change = action.get('sails_change')
+        if sails_change and player.mast_sail.masts:
+            self.game_state = GameStates.SAILS
+
+        attack = action.get('attack')
+        targeting = action.get('targeting')
+        if targeting:
+            self.game_state = GameStates.TARGETING
+
+        special = action.get('special')
+
+        # TODO: track precious state ? or just mass "cancel"
+        sails_cancel = action.get('sails_cancel')
+        target_cancel = action.get('target_cancel')
+        special_cancel = action.get('special_cancel')
+        inventory_cancel = action.get('inventory_cancel')
+        port_cancel = action.get('port_cancel')
+        repair_cancel = action.get('repair_cancel')
+
+        if sails_cancel or special_cancel or target_cancel or inventory_cancel or port_cancel or repair_cancel:
+            self.game_state = GameStates.CURRENT_TURN
+
+        if special:
+            self.game_state = GameStates.SPECIAL
+            if special == 'inventory':
+                self.game_state = GameStates.CARGO
+            elif special == 'crew':
+                message_log.add_message(special.capitalize() + " not yet implemented")
+                self.game_state = GameStates.CURRENT_TURN
+            elif special == 'ram':
+                message_log.add_message(special.capitalize() + " not yet implemented")
+                self.game_state = GameStates.CURRENT_TURN
+            elif special == 'mines':
+                message_log.add_message(special.capitalize() + " not yet implemented")
+                self.game_state = GameStates.CURRENT_TURN
+
+        if port == "repair":
+            self.game_state = GameStates.REPAIR
+        elif port == "hire":
+            message_log.add_message(port.capitalize() + " not yet implemented")
+            self.game_state = GameStates.CURRENT_TURN
+            # game_state = game_state.HIRE
+        elif port == "trade":
+            message_log.add_message(port.capitalize() + " not yet implemented")
+            self.game_state = GameStates.CURRENT_TURN
+            # game_state = game_state.TRADE
+        elif port == "upgrade":
+            message_log.add_message(port.capitalize() + " not yet implemented")
+            self.game_state = GameStates.CURRENT_TURN
+            # game_state = game_state.UPGRADE
+
+        if other_action \
+                and game_map.in_bounds(player.x, player.y) \
+                and game_map.terrain[player.x][player.y].decoration \
+                and game_map.terrain[player.x][player.y].decoration.name == 'Port':
+            self.game_state = GameStates.PORT
+            message_log.add_message(message='Ahoy! In this port, ye can: trade, repair, or hire crew... ',
+                                    color=self.colors['aqua'])
+
+        # VERIFY PLAYER ACTION ----------------------------------------------------------------------------------------
+        repair = self.verify_repair(repair=repair)
+        attack = self.verify_attack(attack=attack)
+        sails = self.verify_sails(sails=sails)
+
+        # PROCESS ACTION ----------------------------------------------------------------------------------------------
+        if (rowing or slowing or sails or attack or rotate or other_action or repair) \
+                and self.game_state not in (GameStates.PLAYER_DEAD, GameStates.PORT):
+            # reset game state
+            self.game_state = GameStates.CURRENT_TURN
+
+            with self.profiler.phase('ai'):
+                self.take_ai_turns()
+
+            # OTHER ACTIONS -------------------------------------------------------------------------------------------
+            with self.profiler.phase('actions'):
+                self.update_cool_downs()
+                if repair:
+                    self.repair(repair=repair)
+
+                # ATTACKS ---------------------------------------------------------------------------------------------
+                if attack:
+                    self.attack(attack=attack)
+
+            # after attacks made, update fog (not before, due to FOV changes)
+            with self.profiler.phase('fog'):
+                roll_fog(game_map=game_map, game_time=self.game_time, game_weather=self.game_weather)
+
+            if other_action:
+                with self.profiler.phase('actions'):
+                    self.salvage()
+
+            # MOMENTUM CHANGES ----------------------------------------------------------------------------------------
+            if slowing:
+                player.mobile.decrease_momentum(amount=slowing, reason='slowing')
+
+            if rowing:
+                player.mobile.rowing = 1
+
+            with self.profiler.phase('movement'):
+                self.row()
+            with self.profiler.phase('wind'):
+                self.catch_wind()
+            with self.profiler.phase('drag'):
+                self.drag(slowing=slowing)
+            with self.profiler.phase('movement'):
+                self.move()
+
+            # SAILS / ROTATE ------------------------------------------------------------------------------------------
+            if sails:
+                details = player.mast_sail.adjust_sails(amount=sails)
+                message_log.unpack(details=details, color=self.colors['aqua'])
+
+            # rotate boat last
+            if rotate:
+                details = player.mobile.rotate(rotate=rotate)
+                message_log.unpack(details=details, color=self.colors['aqua'])
+
+            # sailing off the edge of the board takes the player to the next map
+            if self.map_pipeline is not None and game_map.world is None \
+                    and not (0 <= player.x < game_map.width and 0 <= player.y < game_map.height):
+                with self.profiler.phase('travel'):
+                    self.travel()
+                game_map = self.game_map
+
+            # on the open sea, slide the map along with the player
+            if game_map.world is not None:
+                with self.profiler.phase('chunks'):
+                    game_map.world.follow(game_map=game_map, entities=self.entities, player=player,
+                                          game_time=self.game_time, game_weather=self.game_weather)
+
+            self.update_environment()
+            with self.profiler.phase('fov'):
+                self.update_fov()
+            message_log.reset_view()
+
+            return TurnResult(game_state=self.game_state, turn_taken=True)
+
+        return TurnResult(game_state=self.game_state,
+                          changed=self.game_state != game_state or message_log.version != message_version)
+
+    def verify_repair(self, repair):
+        """
+        Verify the part is damaged and enough repair materials exist in cargo
+        :param repair: str name of the part to repair
+        :return: repair if valid, else None
+        """
+        player = self.player
+        message_log = self.message_log
+        if repair == "hull":
+            # Verify hull is damaged and enough repair materials (wood and tar) exists in cargo
+            if player.fighter.hps < player.fighter.max_hps:
+                cargo_name_list = [item.name for item in player.cargo.manifest]
+                missing_items = []
+                for item in player.fighter.repair_with:
+                    if item not in cargo_name_list:
+                        missing_items.append(item)
+                if missing_items:
+                    for item in missing_items:
+                        message_log.add_message("Missing {} repair item {} in cargo".format(player.fighter.name,
+                                                                                            item))
+                    repair = None  # repair attempt failed
+            else:
+                message_log.add_message("{} not damaged".format(player.fighter.name))
+                repair = None  # repair attempt failed
+        elif repair == "sail":
+            # Verify sail exists, is damaged and enough repair materials (canvas and rope) exists in cargo
+            if player.mast_sail.max_sails > 0:
+                if player.mast_sail.sail_hp < player.mast_sail.sail_hp_max:
+                    cargo_name_list = [item.name for item in player.cargo.manifest]
+                    missing_items = []
+                    for item in player.mast_sail.sail_repair_with:
+                        if item not in cargo_name_list:
+                            missing_items.append(item)
+                    if missing_items:
+                        for item in missing_items:
+                            message_log.add_message("Missing sail repair item {} in cargo".format(item))
+                        repair = None  # repair attempt failed
+                else:
+                    message_log.add_message("Sails not damaged")
+                    repair = None  # repair attempt failed
+            else:
+                message_log.add_message("No Sails")
+                repair = None  # repair attempt failed
+        elif repair == "mast":
+            # Verify mast exists, is damaged and enough repair materials (wood and rope) exists in cargo
+            if player.mast_sail.masts > 0:
+                if player.mast_sail.mast_hp < player.mast_sail.mast_hp_max:
+                    cargo_name_list = [item.name for item in player.cargo.manifest]
+                    missing_items = []
+                    for item in player.mast_sail.mast_repair_with:
+                        if item not in cargo_name_list:
+                            missing_items.append(item)
+                    if missing_items:
+                        for item in missing_items:
+                            message_log.add_message("Missing mast repair item {} in cargo".format(item))
+                        repair = None  # repair attempt failed
+                else:
+                    message_log.add_message("Masts not damaged")
+                    repair = None  # repair attempt failed
+            else:
+                message_log.add_message("No Masts")
+                repair = None  # repair attempt failed
+        elif repair == "weapon":
+            # Verify weapon exists, is damaged and enough repair materials (wood and leather) exists in cargo
+            message_log.add_message(repair.capitalize() + " repair not yet implemented")
+            repair = None  # repair attempt failed
+            self.game_state = GameStates.CURRENT_TURN
+        return repair
+
+    def verify_attack(self, attack):
+        """
+        Make sure there is a valid target for the attack
+        :param attack: str location of the attack
+        :return: attack if valid, else None
+        """
+        player = self.player
+        game_map = self.game_map
+        if attack:
+            target = False
+            if game_map.in_bounds(x=player.x, y=player.y, margin=-1):
+                if game_map.terrain[player.x][player.y].decoration \
+                        and game_map.terrain[player.x][player.y].decoration.name == 'Port':
+                    target = False
+                elif attack == 'Arrows' and player.crew.verify_arrow_target(entities=self.entities):
+                    target = True
+                elif player.weapons.verify_target_at_location(attack=attack, entities=self.entities):
+                    target = True
+                else:
+                    target = None
+            if not target:
+                attack = None
+        return attack
+
+    def verify_sails(self, sails):
+        """
+        Make sure sails can be raised / lowered
+        :param sails: int amount to adjust sails
+        :return: sails if valid, else None
+        """
+        player = self.player
+        if sails:
+            if (sails > 0 and player.mast_sail.current_sails == player.mast_sail.max_sails) \
+                    or (sails < 0 and player.mast_sail.current_sails == 0):
+                sails = None
+        return sails
+
+    def take_ai_turns(self):
+        """
+        Each Entity with an AI takes its turn
+        :return: None
+        """
+        for entity in self.entities:
+            if entity.ai:
+                result = entity.ai.take_turn(game_map=self.game_map,
+                                             target=self.player,
+                                             message_log=self.message_log,
+                                             colors=self.colors)
+                if result:
+                    self.game_state = GameStates.PLAYER_DEAD
+
+    def update_cool_downs(self):
+        """
+        Update weapon cool downs - and other things later?
+        :return: None
+        """
+        for entity in self.entities:
+            if entity.weapons and entity.weapons.weapon_list:
+                for weapon in entity.weapons.weapon_list:
+                    if weapon.current_cd > 0:
+                        weapon.current_cd -= 1
+
+    def repair(self, repair):
+        """
+        Repair a part of the player's ship, using up repair materials
+        :param repair: str name of the part to repair
+        :return: None
+        """
+        player = self.player
+        message_log = self.message_log
+        if repair == "hull":
+            results = player.fighter.heal_damage(1)
+            for result in results:
+                message_log.add_message(message=result, color=self.colors['aqua'])
+            for item in player.cargo.manifest:
+                if item.name in player.fighter.repair_with:
+                    adjust_quantity(cargo=player.cargo,
+                                    item=item,
+                                    amount=-1,
+                                    message_log=message_log)
+        elif repair == "sail":
+            results = player.mast_sail.repair_sails(1)
+            for result in results:
+                message_log.add_message(message=result, color=self.colors['aqua'])
+            for item in player.cargo.manifest:
+                if item.name in player.mast_sail.sail_repair_with:
+                    adjust_quantity(cargo=player.cargo,
+                                    item=item,
+                                    amount=-1,
+                                    message_log=message_log)
+        elif repair == "sail":
+            results = player.mast_sail.repair_masts(1)
+            for result in results:
+                message_log.add_message(message=result, color=self.colors['aqua'])
+            for item in player.cargo.manifest:
+                if item.name in player.mast_sail.mast_repair_with:
+                    adjust_quantity(cargo=player.cargo,
+                                    item=item,
+                                    amount=-1,
+                                    message_log=message_log)
+        elif repair == "weapon":
+            results = player.weapons.repair(1)
+            for result in results:
+                message_log.add_message(message=result, color=self.colors['aqua'])
+            for item in player.cargo.manifest:
+                if item.name in player.weapon.repair_with:
+                    adjust_quantity(cargo=player.cargo,
+                                    item=item,
+                                    amount=-1,
+                                    message_log=message_log)
+        self.game_state = GameStates.CURRENT_TURN
+
+    def attack(self, attack):
+        """
+        Player attacks with arrows or the weapons at a location
+        :param attack: str location of the attack
+        :return: None
+        """
+        player = self.player
+        if attack == 'Arrows':
+            self.message_log.add_message(message='Player attacks with {}!'.format(attack),
+                                         color=self.colors['aqua'])
+            player.crew.arrow_attack(terrain=self.game_map.terrain,
+                                     entities=self.entities,
+                                     message_log=self.message_log,
+                                     icons=None,
+                                     colors=self.colors)
+        else:
+            self.message_log.add_message(message='Player attacks to the {}!'.format(attack),
+                                         color=self.colors['aqua'])
+            player.weapons.attack(terrain=self.game_map.terrain,
+                                  entities=self.entities,
+                                  location=attack,
+                                  message_log=self.message_log,
+                                  icons=None,
+                                  colors=self.colors)
+
+    def salvage(self):
+        """
+        Player salvages the cargo of any non-AI Entity on the same tile
+        :return: None
+        """
+        player = self.player
+        for entity in self.entities:
+            if not entity.ai and entity.name not in ['player', ''] and \
+                    (entity.x, entity.y) == (player.x, player.y):
+                self.message_log.add_message(message='You salvage the {}'.format(entity.name),
+                                             color=self.colors['aqua'])
+                if entity.cargo:
+                    for cargo in entity.cargo.manifest:
+                        player.cargo.add_item_to_manifest(item=cargo, message_log=self.message_log)
+
+                entity.name = ''
+                entity.icon = None
+                entity.cargo = None
+
+    def row(self):
+        """
+        Change momentum due to rowing
+        :return: None
+        """
+        for entity in self.entities:
+            if entity.mobile and entity.mobile.rowing:
+                if entity.mast_sail:
+                    reason = 'rowing'
+                else:
+                    reason = 'swimming'
+                details = entity.mobile.increase_momentum(amount=entity.mobile.rowing, reason=reason)
+                if (entity.x, entity.y) in self.player.view.fov:
+                    self.message_log.unpack(details=details)
+
+    def catch_wind(self):
+        """
+        Adjust speed for wind for each entity with a sail up if there is wind
+        :return: None
+        """
+        if self.game_map.wind_direction is not None:
+            for entity in self.entities:
+                if entity.mast_sail and entity.mast_sail.current_sails > 0:
+                    details = entity.mast_sail.momentum_due_to_wind(wind_direction=self.game_map.wind_direction,
+                                                                    message_log=self.message_log,
+                                                                    color=self.colors['aqua'])
+                    for detail in details:
+                        if (entity.x, entity.y) in self.player.view.fov:
+                            self.message_log.add_message(detail)
+                elif entity.wings and entity.wings.current_wing_power > 0:
+                    details = entity.wings.momentum_due_to_wind(wind_direction=self.game_map.wind_direction,
+                                                                message_log=self.message_log,
+                                                                color=self.colors['aqua'])
+                    for detail in details:
+                        if (entity.x, entity.y) in self.player.view.fov:
+                            self.message_log.add_message(detail)
+
+    def drag(self, slowing):
+        """
+        Change momentum due to drag if not rowing or catching wind
+        :param slowing: player is dragging this turn
+        :return: None
+        """
+        for entity in self.entities:
+            drag = - 1
+            if entity.mast_sail and entity.mast_sail.catching_wind:
+                drag = 0
+            if entity.mobile and entity.mobile.rowing:
+                drag = 0
+            if slowing:
+                drag = - 1
+            if entity.mobile:
+                details = entity.mobile.decrease_momentum(amount=drag, reason='drag')
+                for detail in details:
+                    if (entity.x, entity.y) in self.player.view.fov:
+                        self.message_log.add_message(detail)
+            # reset action after drag applied
+            if entity.mast_sail:
+                entity.mast_sail.catching_wind = False
+            if entity.mobile:
+                entity.mobile.rowing = 0
+
+    def move(self):
+        """
+        Move each mobile Entity by its current speed
+        :return: None
+        """
+        for entity in self.entities:
+            if entity.mobile:
+                details, state = entity.mobile.move(game_map=self.game_map, player=self.player)
+                for detail in details:
+                    if (entity.x, entity.y) in self.player.view.fov:
+                        self.message_log.add_message(message=detail, color=self.colors['aqua'])
+                if state:
+                    self.game_state = state
+
+    def travel(self):
+        """
+        Move the player onto the next map from the map pipeline, entering across from the edge they sailed off
+        (on the nearest water, if that tile is land), the entities of the old map are left behind
+        :return: None
+        """
+        player = self.player
+        old_map = self.game_map
+        game_map, entities = self.map_pipeline.travel(game_map=old_map)
+
+        x = min(max(player.x, 0), game_map.width - 1)
+        y = min(max(player.y, 0), game_map.height - 1)
+        if player.x < 0 or player.x >= old_map.width:
+            x = game_map.width - 1 - x
+        if player.y < 0 or player.y >= old_map.height:
+            y = game_map.height - 1 - y
+        if not game_map.analysis.water[x, y]:
+            tiles = game_map.analysis.get_ocean_tiles()
+            tile = int(tiles[np.argmin((tiles // game_map.height - x) ** 2 + (tiles % game_map.height - y) ** 2)])
+            x, y = tile // game_map.height, tile % game_map.height
+        player.x = x
+        player.y = y
+
+        self.game_map = game_map
+        self.entities[:] = [player] + entities
+        self.message_log.add_message(message='Ye sail off the chart into uncharted waters (voyage {})'.format(
+            game_map.travels), color=self.colors['aqua'])
+
+    def update_environment(self):
+        """
+        Advance wind, time, weather, and fog
+        :return: None
+        """
+        with self.profiler.phase('wind'):
+            change_wind(game_map=self.game_map, message_log=self.message_log, color=self.colors['yellow'])
+        with self.profiler.phase('weather'):
+            self.game_time.roll_min()
+            change_weather(weather=self.game_weather, message_log=self.message_log, color=self.colors['yellow'],
+                           rng=self.game_map.rng)
+        with self.profiler.phase('fog'):
+            adjust_fog(terrain=self.game_map.terrain,
+                       width=self.game_map.width,
+                       height=self.game_map.height,
+                       game_time=self.game_time,
+                       weather=self.game_weather,
+                       rng=self.game_map.rng)
+
+    def update_fov(self):
+        """
+        Recalculate the field of view of every Entity that can see
+        :return: None
+        """
+        for entity in self.entities:
+            if entity.view is not None:
+                entity.view.set_fov(game_map=self.game_map, game_time=self.game_time, game_weather=self.game_weather)
@@ -0,0 +1,149 @@
+import json
+import math
+from collections import deque
+from time import perf_counter
+
+
+class PhaseTimer:
+    __slots__ = ['profiler', 'name', 'start']
+
+    def __init__(self, profiler, name: str):
+        """
+        Context manager that adds the time spent inside it to a phase of the current turn
+        :param profiler: TurnProfiler to report to
+        :param name: str name of the phase
+        """
+        self.profiler = profiler
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profiler.add_time(name=self.name, seconds=perf_counter() - self.start)
+        return False
+
+
+class NullTimer:
+    __slots__ = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+# a disabled profiler hands out this shared do-nothing timer, so instrumented code costs one call and one attribute
+null_timer = NullTimer()
+
+
+class TurnProfiler:
+    def __init__(self, enabled: bool = False, window: int = 100, trace_filename: str = None):
+        """
+        Times each phase of a turn (AI, wind, movement, fog, FOV, render, etc.), keeping the last few turns of timings
+        for percentiles, and optionally writing every turn to a JSON lines trace file
+        :param enabled: boolean True to start timing now
+        :param window: int number of recent turns kept for percentiles
+        :param trace_filename: str name of the JSON lines trace file, or None for no trace
+        """
+        self.enabled = enabled
+        self.window = window
+        self.trace_filename = trace_filename
+        self.trace_file = None
+        self.turn_count = 0
+        self.current = {}
+        self.history = {}
+        self.totals = deque(maxlen=window)
+
+    def phase(self, name: str):
+        """
+        Time a phase of the current turn:  with profiler.phase('ai'): ...
+        :param name: str name of the phase (timings for a phase entered more than once in a turn are added together)
+        :return: context manager
+        """
+        if not self.enabled:
+            return null_timer
+        return PhaseTimer(profiler=self, name=name)
+
+    def add_time(self, name: str, seconds: float):
+        """
+        Add time to a phase of the current turn
+        :param name: str name of the phase
+        :param seconds: float seconds spent in the phase
+        :return: None
+        """
+        self.current[name] = self.current.get(name, 0) + seconds
+
+    def toggle(self):
+        """
+        Turn timing on or off, closing the trace file when turned off
+        :return: None
+        """
+        self.enabled = not self.enabled
+        self.current = {}
+        if not self.enabled:
+            self.close()
+
+    def end_turn(self, turn_taken: bool):
+        """
+        Finish the current turn (or frame, if no turn was taken): store its timings and write it to the trace
+        Frames where nothing was timed (ex: the mouse moved, but no panel changed) are skipped
+        :param turn_taken: boolean True if the simulation advanced this turn
+        :return: None
+        """
+        if turn_taken:
+            self.turn_count += 1
+        if not self.enabled or not self.current:
+            return
+        for name, seconds in self.current.items():
+            if name not in self.history:
+                self.history[name] = deque(maxlen=self.window)
+            self.history[name].append(seconds)
+        total = sum(self.current.values())
+        self.totals.append(total)
+
+        if self.trace_filename:
+            if self.trace_file is None:
+                self.trace_file = open(self.trace_filename, 'a')
+            self.trace_file.write(json.dumps({'turn': self.turn_count,
+                                              'turn_taken': turn_taken,
+                                              'total_ms': round(total * 1000, 3),
+                                              'phases_ms': {name: round(seconds * 1000, 3)
+                                                            for name, seconds in self.current.items()}}) + '\n')
+        self.current = {}
+
+    def get_percentiles(self, percentiles=(50, 95, 99)):
+        """
+        Rolling percentiles of each phase over the last few turns
+        :param percentiles: tuple of int percentiles to report
+        :return: dict of phase name to list of milliseconds (one per percentile), including 'total'
+        """
+        stats = {name: [get_percentile(values=timings, percentile=p) * 1000 for p in percentiles]
+                 for name, timings in self.history.items()}
+        if self.totals:
+            stats['total'] = [get_percentile(values=self.totals, percentile=p) * 1000 for p in percentiles]
+        return stats
+
+    def close(self):
+        """
+        Close the trace file
+        :return: None
+        """
+        if self.trace_file is not None:
+            self.trace_file.close()
+            self.trace_file = None
+
+
+def get_percentile(values, percentile):
+    """
+    Nearest-rank percentile of a list of values
+    :param values: iterable of numbers
+    :param percentile: int percentile (0 - 100)
+    :return: the value at that percentile
+    """
+    ordered = sorted(values)
+    rank = max(math.ceil(percentile * len(ordered) / 100) - 1, 0)
+    return ordered[rank]
@@ -1,5 +1,4 @@
 from enum import Enum
-from random import randint
 
 
 class Weather:
@@ -105,21 +104,22 @@ class Weather:
             return weather_effects[Conditions.STORMY]
 
 
-def change_weather(weather, message_log, color):
+def change_weather(weather, message_log, color, rng):
     """
     Determine change in weather
     :param weather: current game weather
     :param message_log: MessageLog
     :param color: tuple color of text to add
+    :param rng: WorldRandom stream of the map
     :return: None
     """
     delay = 10  # leave weather for at least this many turns
-    change_chance = randint(0, weather.max_turn_count)
+    change_chance = rng.randint(0, weather.max_turn_count)
     if change_chance + delay < weather.turn_count:
         # change weather 0: calmer
         #                1: stays
         #                2: rougher
-        change = randint(0, 8)
+        change = rng.randint(0, 8)
         if change in [0, 1, 2]:
             weather.calms(message_log, color)
         elif change in [3, 4, 5]: